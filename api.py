@@ -0,0 +1,427 @@
+# api.py — Servicio HTTP sin interfaz (ASGI) sobre el núcleo de procesado
+#
+# Arranque:  uvicorn api:app --host 0.0.0.0 --port 8081   (o bien: python api.py)
+#
+# - Cuerpos en streaming: la subida se vuelca a un temporal en disco según
+#   llega y la respuesta se sirve desde otro temporal, a trozos.
+# - El trabajo de CPU corre en un pool de procesos acotado (PRINTPDF_API_WORKERS).
+# - Contrapresión: como mucho PRINTPDF_API_QUEUE peticiones esperan turno;
+#   a partir de ahí se responde 503 + Retry-After antes de leer el cuerpo.
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+from starlette.requests import ClientDisconnect, Request
+from starlette.responses import FileResponse, JSONResponse, Response
+from starlette.routing import Route
+
+import nucleo
+from metricas import REGISTRY, add_gauges, prometheus_text, trace
+from conversion import convert_image, output_name
+from ficheros import PdfSource
+from paginas import MergeStream, extract_pages, parse_ranges, split_groups
+from salida import first_page_bytes
+
+# ============== Configuración ==============
+API_WORKERS = int(os.environ.get("PRINTPDF_API_WORKERS", os.cpu_count() or 1))
+API_QUEUE = int(os.environ.get("PRINTPDF_API_QUEUE", 2 * API_WORKERS))
+API_MAX_MB = int(os.environ.get("PRINTPDF_API_MAX_MB", "200"))
+# Directorio de los temporales de entrada/salida (por defecto, el del sistema).
+API_TMP_DIR = os.environ.get("PRINTPDF_API_TMP") or None
+CHUNK_SIZE = 64 * 1024
+RETRY_AFTER = "5"
+
+PDF = "application/pdf"
+ZIP = "application/zip"
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# ============== Trabajos (se ejecutan en los procesos del pool) ==============
+# Reciben rutas de ficheros (primero la de salida), no bytes: así la entrada y
+# la salida no viajan por la tubería entre procesos ni se quedan en la memoria
+# del servidor. Los PDF de entrada se abren por nombre (ficheros.PdfSource).
+# Devuelven el tipo, el nombre y las cabeceras de la respuesta.
+def _read(path: str) -> bytes:
+    with open(path, "rb") as fh:
+        return fh.read()
+
+
+def _write(path: str, data: bytes) -> None:
+    with open(path, "wb") as fh:
+        fh.write(data)
+
+
+def job_compress(dst: str, src: str, quality: int, linearize: bool = False) -> Dict[str, object]:
+    pdf = PdfSource.from_path(src)
+    out, report = nucleo.compress_pdf(pdf, quality, linearize=linearize)
+    _write(dst, out)
+    return {"media_type": PDF, "filename": "compressed.pdf",
+            "headers": {"X-Size-Before": pdf.size, "X-Size-After": len(out),
+                        "X-First-Page-Bytes": first_page_bytes(out),
+                        "X-Image-Report": json.dumps(report, separators=(",", ":"))}}
+
+
+def _pages(pdf: PdfSource, ranges: str) -> Optional[List[int]]:
+    """Páginas (0-based) de `ranges`; None si viene vacío (todas)."""
+    if not ranges.strip():
+        return None
+    with pdf.open() as doc:
+        pages = parse_ranges(ranges, doc.page_count)
+    if not pages:
+        raise ValueError("pages no selecciona ninguna página")
+    return pages
+
+
+def job_compress_pages(dst: str, src: str, dpi: int, quality: int, linearize: bool = False,
+                       ranges: str = "") -> Dict[str, object]:
+    pdf = PdfSource.from_path(src)
+    out, report = nucleo.pdf_compress(pdf, dpi=dpi, quality=quality, linearize=linearize, pages=_pages(pdf, ranges))
+    _write(dst, out)
+    raster = sum(1 for d in report if d["strategy"] == "raster")
+    duplicates = sum(1 for d in report if d["duplicate_of"] is not None)
+    return {"media_type": PDF, "filename": "compressed.pdf",
+            "headers": {"X-Size-Before": pdf.size, "X-Size-After": len(out),
+                        "X-First-Page-Bytes": first_page_bytes(out),
+                        "X-Pages": len(report), "X-Pages-Rasterized": raster,
+                        "X-Pages-Duplicated": duplicates}}
+
+
+def job_merge(dst: str, srcs: List[str]) -> Dict[str, object]:
+    merger = MergeStream()
+    for src in srcs:
+        merger.add(PdfSource.from_path(src))
+    with open(dst, "wb") as fh:
+        merger.finish(fh)
+    return {"media_type": PDF, "filename": "merged.pdf", "headers": {"X-Inputs": len(srcs)}}
+
+
+def job_split(dst: str, src: str, spec: str) -> Dict[str, object]:
+    with fitz.open(src) as doc:
+        groups = split_groups(spec, doc.page_count)
+        if not groups:
+            raise ValueError("ranges no selecciona ninguna página")
+        if len(groups) == 1:
+            _write(dst, extract_pages(doc, groups[0]))
+            return {"media_type": PDF, "filename": "split.pdf", "headers": {"X-Parts": 1}}
+        parts = ((f"split_{k}.pdf", extract_pages(doc, g)) for k, g in enumerate(groups, start=1))
+        with open(dst, "wb") as fh:
+            nucleo.write_zip(parts, out=fh)
+    return {"media_type": ZIP, "filename": "split.zip", "headers": {"X-Parts": len(groups)}}
+
+
+def job_to_images(dst: str, src: str, fmt: str, dpi: int, ranges: str, quality: int = 90) -> Dict[str, object]:
+    pdf = PdfSource.from_path(src)
+    pages = _pages(pdf, ranges)
+    with open(dst, "wb") as fh:
+        nucleo.write_zip(nucleo.iter_pdf_images(pdf, fmt, dpi, pages, quality=quality), out=fh)
+    return {"media_type": ZIP, "filename": "pages.zip", "headers": {}}
+
+
+def job_convert(dst: str, srcs: List[Tuple[str, str]], fmt: str, quality: int) -> Dict[str, object]:
+    items = ((output_name(name, fmt), convert_image(_read(src), fmt, quality)) for name, src in srcs)
+    with open(dst, "wb") as fh:
+        nucleo.write_zip(items, out=fh)
+    return {"media_type": ZIP, "filename": "converted.zip", "headers": {"X-Inputs": len(srcs)}}
+
+
+def run_job(job: Callable, dst: str, *args) -> Dict[str, object]:
+    """Ejecuta `job` con traza por etapas. Las métricas del proceso worker
+    vuelven con el resultado para que /metrics las agregue (ver REGISTRY.merge)."""
+    with trace(job.__name__[len("job_"):]) as tr:
+        meta = job(dst, *args)
+    stages = {row["stage"]: row["seconds"] for row in tr.summary()}
+    meta["headers"]["X-Stage-Seconds"] = json.dumps(stages, separators=(",", ":"))
+    meta["metrics"] = REGISTRY.drain()
+    return meta
+
+
+# ============== Admisión y contrapresión ==============
+class Admission:
+    """
+    `running` trabajos a la vez en el pool y como mucho `waiting` en cola.
+    Se decide antes de leer el cuerpo: si no hay sitio, la subida ni empieza.
+    """
+
+    def __init__(self, running: int, waiting: int):
+        self.limit = running + waiting
+        self.admitted = 0
+        self.running = 0
+        self._slots = asyncio.Semaphore(running)
+
+    def try_enter(self) -> bool:
+        if self.admitted >= self.limit:
+            return False
+        self.admitted += 1
+        return True
+
+    def leave(self) -> None:
+        self.admitted -= 1
+
+    async def run(self, pool: ProcessPoolExecutor, fn: Callable, *args):
+        async with self._slots:
+            self.running += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+            finally:
+                self.running -= 1
+
+
+# ============== Entrada/salida en streaming ==============
+def _tmp_path(suffix: str) -> str:
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="printpdf_", dir=API_TMP_DIR)
+    os.close(fd)
+    return path
+
+
+def _remove(paths: List[str]) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _check_length(request: Request) -> None:
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > API_MAX_MB * 1024 * 1024:
+        raise HTTPError(413, f"máximo {API_MAX_MB} MB")
+
+
+async def _limited_stream(request: Request) -> AsyncIterator[bytes]:
+    """El cuerpo según llega, cortando al pasar de API_MAX_MB: sin
+    Content-Length (subida chunked) es la única comprobación que hay."""
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > API_MAX_MB * 1024 * 1024:
+            raise HTTPError(413, f"máximo {API_MAX_MB} MB")
+        yield chunk
+
+
+def _copy_to(src: BinaryIO, path: str) -> None:
+    src.seek(0)
+    with open(path, "wb") as fh:
+        shutil.copyfileobj(src, fh, CHUNK_SIZE)
+
+
+async def _body_to_file(request: Request, suffix: str) -> str:
+    """Vuelca el cuerpo a disco según llega. La escritura va al threadpool:
+    un disco lento no bloquea el bucle de eventos."""
+    _check_length(request)
+    path = _tmp_path(suffix)
+    size = 0
+    try:
+        fh = await run_in_threadpool(open, path, "wb")
+        try:
+            async for chunk in _limited_stream(request):
+                size += len(chunk)
+                await run_in_threadpool(fh.write, chunk)
+        finally:
+            await run_in_threadpool(fh.close)
+    except BaseException:
+        _remove([path])
+        raise
+    if size == 0:
+        _remove([path])
+        raise HTTPError(400, "cuerpo vacío")
+    return path
+
+
+async def _form_files(request: Request, paths: List[str]) -> List[Tuple[str, str]]:
+    """Ficheros de un multipart (campo "files", en orden) copiados a temporales.
+    El parser lee de _limited_stream, así API_MAX_MB se aplica mientras llega."""
+    _check_length(request)
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPError(400, "no se recibió ningún fichero en el campo 'files'")
+    try:
+        form = await MultiPartParser(request.headers, _limited_stream(request)).parse()
+    except MultiPartException as e:
+        raise HTTPError(400, e.message)
+    files = []
+    try:
+        for upload in form.getlist("files"):
+            if not isinstance(upload, UploadFile):
+                continue
+            path = _tmp_path(os.path.splitext(upload.filename or "")[1])
+            paths.append(path)
+            await run_in_threadpool(_copy_to, upload.file, path)
+            files.append((upload.filename or f"file_{len(files) + 1}", path))
+    finally:
+        await form.close()
+    if not files:
+        raise HTTPError(400, "no se recibió ningún fichero en el campo 'files'")
+    return files
+
+
+def _int_param(request: Request, name: str, default: int, lo: int, hi: int) -> int:
+    raw = request.query_params.get(name)
+    try:
+        value = default if raw is None else int(raw)
+    except ValueError:
+        raise HTTPError(400, f"{name} debe ser un entero")
+    if not lo <= value <= hi:
+        raise HTTPError(400, f"{name} debe estar entre {lo} y {hi}")
+    return value
+
+
+def _format_param(request: Request, default: str) -> str:
+    fmt = request.query_params.get("format", default).upper()
+    if fmt not in ("PNG", "JPG", "JPEG", "WEBP"):
+        raise HTTPError(400, "format debe ser PNG, JPG o WEBP")
+    return fmt
+
+
+def _error(status: int, message: str) -> JSONResponse:
+    headers = {"Retry-After": RETRY_AFTER} if status == 503 else None
+    return JSONResponse({"error": message}, status_code=status, headers=headers)
+
+
+def endpoint(handler: Callable) -> Callable:
+    """
+    Envuelve un handler `(request, paths) -> (job, args)`: admisión, ejecución
+    en el pool, respuesta en streaming desde el temporal de salida y limpieza
+    de todos los temporales (también si el cliente corta o el trabajo falla).
+    """
+    async def wrapped(request: Request) -> Response:
+        state = request.app.state
+        if not state.admission.try_enter():
+            return _error(503, "servidor ocupado, reintenta más tarde")
+        paths: List[str] = []
+        try:
+            job, args = await handler(request, paths)
+            dst = _tmp_path(".out")
+            paths.append(dst)
+            meta = await state.admission.run(state.pool, run_job, job, dst, *args)
+            REGISTRY.merge(meta.pop("metrics"))
+        except HTTPError as e:
+            _remove(paths)
+            return _error(e.status, e.message)
+        except ClientDisconnect:
+            _remove(paths)
+            return Response(status_code=499)
+        except ValueError as e:
+            _remove(paths)
+            return _error(400, str(e))
+        except Exception as e:
+            _remove(paths)
+            return _error(422, f"no se pudo procesar: {e}")
+        finally:
+            state.admission.leave()
+        headers = {k: str(v) for k, v in meta["headers"].items()}
+        return FileResponse(dst, media_type=meta["media_type"], filename=meta["filename"],
+                            headers=headers, background=BackgroundTask(_remove, paths))
+    return wrapped
+
+
+# ============== Rutas ==============
+@endpoint
+async def compress(request: Request, paths: List[str]):
+    quality = _int_param(request, "quality", 60, 10, 100)
+    linearize = bool(_int_param(request, "linearize", 0, 0, 1))
+    paths.append(await _body_to_file(request, ".pdf"))
+    return job_compress, (paths[-1], quality, linearize)
+
+
+@endpoint
+async def compress_pages(request: Request, paths: List[str]):
+    dpi = _int_param(request, "dpi", 150, 72, 300)
+    quality = _int_param(request, "quality", 85, 10, 95)
+    linearize = bool(_int_param(request, "linearize", 0, 0, 1))
+    paths.append(await _body_to_file(request, ".pdf"))
+    return job_compress_pages, (paths[-1], dpi, quality, linearize, request.query_params.get("pages", ""))
+
+
+@endpoint
+async def merge(request: Request, paths: List[str]):
+    files = await _form_files(request, paths)
+    return job_merge, ([path for _, path in files],)
+
+
+@endpoint
+async def split(request: Request, paths: List[str]):
+    spec = request.query_params.get("ranges", "").strip()
+    if not spec:
+        raise HTTPError(400, "falta ranges (p.ej. 1-3;4-)")
+    paths.append(await _body_to_file(request, ".pdf"))
+    return job_split, (paths[-1], spec)
+
+
+@endpoint
+async def to_images(request: Request, paths: List[str]):
+    fmt = _format_param(request, "PNG")
+    dpi = _int_param(request, "dpi", 144, 36, 600)
+    quality = _int_param(request, "quality", 90, 10, 100)
+    paths.append(await _body_to_file(request, ".pdf"))
+    return job_to_images, (paths[-1], fmt, dpi, request.query_params.get("pages", ""), quality)
+
+
+@endpoint
+async def convert(request: Request, paths: List[str]):
+    fmt = _format_param(request, "JPG")
+    quality = _int_param(request, "quality", 90, 10, 100)
+    files = await _form_files(request, paths)
+    return job_convert, (files, fmt, quality)
+
+
+async def metrics(request: Request) -> Response:
+    return Response(prometheus_text(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+async def health(request: Request) -> Response:
+    admission = request.app.state.admission
+    return JSONResponse({"status": "ok", "workers": API_WORKERS, "queue": API_QUEUE,
+                         "admitted": admission.admitted, "running": admission.running})
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    # "spawn", como en compresion.py: MuPDF no es seguro tras un fork con hilos vivos.
+    ctx = multiprocessing.get_context("spawn")
+    app.state.pool = ProcessPoolExecutor(max_workers=API_WORKERS, mp_context=ctx)
+    app.state.admission = Admission(API_WORKERS, API_QUEUE)
+    add_gauges("printpdf_api", lambda: {"admitted": app.state.admission.admitted,
+                                        "running": app.state.admission.running})
+    try:
+        yield
+    finally:
+        app.state.pool.shutdown(cancel_futures=True)
+
+
+app = Starlette(
+    routes=[
+        Route("/health", health, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+        Route("/pdf/compress", compress, methods=["POST"]),
+        Route("/pdf/compress-pages", compress_pages, methods=["POST"]),
+        Route("/pdf/merge", merge, methods=["POST"]),
+        Route("/pdf/split", split, methods=["POST"]),
+        Route("/pdf/to-images", to_images, methods=["POST"]),
+        Route("/images/convert", convert, methods=["POST"]),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=os.environ.get("PRINTPDF_API_HOST", "0.0.0.0"),
+                port=int(os.environ.get("PRINTPDF_API_PORT", "8081")))
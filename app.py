@@ -1,12 +1,16 @@
 # app.py — UI estilo Canva + PDF en memoria (sin guardar archivos)
-import io
-import time
-import traceback
 import streamlit as st
-import fitz # PyMuPDF
+
+from arranque import start_warm_up
+from metricas import run_traced, serve_metrics
+from salida import LINEARIZE_AVAILABLE, MOBILE_KBPS, first_page_report
+from sesion import job_progress, job_wait, session_files, session_owner
+from trabajos import CANCELLED, DONE, FINISHED, JOBS
 
 # ============== Config básica ==============
 st.set_page_config(page_title="PrintPDF", page_icon="🖨️", layout="wide")
+# PyMuPDF/Pillow se importan y calientan en segundo plano (ver arranque.py)
+start_warm_up()
 
 # Ocultar menús de Streamlit (look más “app”)
 st.markdown("""
@@ -174,6 +178,21 @@ TXT = {
     "success": {"es":"¡Listo! Tu PDF está optimizado 🎉", "en":"Done! Your PDF is optimized 🎉", "fr":"C’est fait ! Votre PDF est optimisé 🎉", "de":"Fertig! Dein PDF ist optimiert 🎉", "it":"Fatto! Il tuo PDF è ottimizzato 🎉", "pt":"Pronto! Seu PDF está otimizado 🎉"},
     "download":{"es":"Descargar PDF", "en":"Download PDF", "fr":"Télécharger le PDF", "de":"PDF herunterladen", "it":"Scarica PDF", "pt":"Baixar PDF"},
     "info": {"es":"Sube un PDF para comenzar.", "en":"Upload a PDF to get started.", "fr":"Téléversez un PDF pour commencer.", "de":"Lade ein PDF hoch, um zu starten.", "it":"Carica un PDF per iniziare.", "pt":"Envie um PDF para começar."},
+    "thumbs": {"es":"Ver miniaturas", "en":"Show thumbnails", "fr":"Voir les miniatures", "de":"Miniaturen anzeigen", "it":"Mostra miniature", "pt":"Ver miniaturas"},
+    "queued": {"es":"En cola…", "en":"Queued…", "fr":"En file d’attente…", "de":"In der Warteschlange…", "it":"In coda…", "pt":"Na fila…"},
+    "pages_done": {"es":"páginas", "en":"pages", "fr":"pages", "de":"Seiten", "it":"pagine", "pt":"páginas"},
+    "cancel": {"es":"Cancelar", "en":"Cancel", "fr":"Annuler", "de":"Abbrechen", "it":"Annulla", "pt":"Cancelar"},
+    "cancelled": {"es":"Proceso cancelado.", "en":"Processing cancelled.", "fr":"Traitement annulé.", "de":"Verarbeitung abgebrochen.", "it":"Elaborazione annullata.", "pt":"Processamento cancelado."},
+    "more_thumbs": {"es":"Más páginas", "en":"More pages", "fr":"Plus de pages", "de":"Weitere Seiten", "it":"Altre pagine", "pt":"Mais páginas"},
+    "mode_manual": {"es":"Manual", "en":"Manual", "fr":"Manuel", "de":"Manuell", "it":"Manuale", "pt":"Manual"},
+    "mode_auto": {"es":"Tamaño objetivo", "en":"Target size", "fr":"Taille cible", "de":"Zielgröße", "it":"Dimensione obiettivo", "pt":"Tamanho alvo"},
+    "target_mb": {"es":"Tamaño máximo (MB)", "en":"Maximum size (MB)", "fr":"Taille maximale (Mo)", "de":"Maximale Größe (MB)", "it":"Dimensione massima (MB)", "pt":"Tamanho máximo (MB)"},
+    "estimate": {"es":"Estimado", "en":"Estimated", "fr":"Estimé", "de":"Geschätzt", "it":"Stimato", "pt":"Estimado"},
+    "estimating": {"es":"Calculando la previsión…", "en":"Estimating…", "fr":"Estimation en cours…", "de":"Schätzung läuft…", "it":"Stima in corso…", "pt":"Calculando a previsão…"},
+    "auto_pick": {"es":"Calidad elegida", "en":"Chosen quality", "fr":"Qualité choisie", "de":"Gewählte Qualität", "it":"Qualità scelta", "pt":"Qualidade escolhida"},
+    "unreachable": {"es":"Ni con la calidad mínima se llega a ese tamaño; se usará la mínima.", "en":"Even the lowest quality won’t reach that size; the lowest will be used.", "fr":"Même la qualité minimale n’atteint pas cette taille ; la minimale sera utilisée.", "de":"Selbst die niedrigste Qualität erreicht diese Größe nicht; es wird die niedrigste verwendet.", "it":"Nemmeno la qualità minima raggiunge questa dimensione; verrà usata la minima.", "pt":"Nem a qualidade mínima atinge esse tamanho; será usada a mínima."},
+    "fast_web": {"es":"Optimizar para web (primera página antes)", "en":"Optimize for web (first page sooner)", "fr":"Optimiser pour le web (première page plus tôt)", "de":"Für das Web optimieren (erste Seite früher)", "it":"Ottimizza per il web (prima pagina prima)", "pt":"Otimizar para web (primeira página antes)"},
+    "first_page": {"es":"Primera página", "en":"First page", "fr":"Première page", "de":"Erste Seite", "it":"Prima pagina", "pt":"Primeira página"},
     "error": {"es":"Ocurrió un error. Inténtalo de nuevo.", "en":"Something went wrong. Please try again.", "fr":"Une erreur s’est produite. Réessayez.", "de":"Etwas ist schiefgelaufen. Bitte erneut versuchen.", "it":"Qualcosa è andato storto. Riprova.", "pt":"Algo deu errado. Tente novamente."},
 }
 
@@ -194,7 +213,15 @@ with left:
 
     # Controles “visibles” siempre
     st.markdown('<div class="h2" style="margin-top:10px;">⚙️ ' + TXT["quality"][lang] + '</div>', unsafe_allow_html=True)
-    quality = st.slider("", min_value=10, max_value=100, value=60, step=5, help="Calidad objetivo al recomprimir imágenes embebidas (menor = más compresión).")
+    mode = st.radio("", ["manual", "auto"], format_func=lambda m: TXT["mode_" + m][lang], horizontal=True, label_visibility="collapsed")
+    if mode == "auto":
+        # La calidad se elige tras subir el PDF, con la previsión (ver compress_plan).
+        target_mb = st.number_input(TXT["target_mb"][lang], min_value=0.05, value=1.0, step=0.1, format="%.2f")
+        quality = None
+    else:
+        quality = st.slider("", min_value=10, max_value=100, value=60, step=5, help="Calidad objetivo al recomprimir imágenes embebidas (menor = más compresión).")
+    estimate_container = st.container()
+    fast_web = st.checkbox(TXT["fast_web"][lang]) if LINEARIZE_AVAILABLE else False
 
     st.markdown('<div class="chips"><div class="chip">Sin guardar en servidor</div><div class="chip">Procesado en memoria</div><div class="chip">Vista previa</div></div>', unsafe_allow_html=True)
 
@@ -207,33 +234,57 @@ with right:
     meta_container = st.empty()
 
 # ============== Lógica (todo en memoria) ==============
-def preview_pdf_first_page(pdf_bytes: bytes):
+# Los módulos pesados (PyMuPDF, Pillow) se importan aquí, tras pintar cabecera y
+# controles: la primera pantalla no los espera y start_warm_up ya los está cargando.
+from ficheros import PdfSource  # noqa: E402
+from nucleo import compress_pdf, compress_plan  # noqa: E402
+
+PREVIEW_LOW_DPI = 40   # primer pintado rápido
+PREVIEW_DPI = 130      # versión definitiva
+THUMB_DPI = 30
+THUMBS_PER_BATCH = 8
+
+def preview_pdf_first_page(pdf: PdfSource, dpi: int = PREVIEW_DPI):
     """Renderiza la primera página a PNG en memoria para previsualizar."""
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        doc = pdf.open()
         if doc.page_count == 0:
             return None
         page = doc.load_page(0)
-        pix = page.get_pixmap(dpi=130, alpha=False)
+        pix = page.get_pixmap(dpi=dpi, alpha=False)
         img_bytes = pix.tobytes("png")
         doc.close()
         return img_bytes
     except Exception:
         return None
 
-def compress_pdf(pdf_bytes: bytes, quality_hint: int) -> bytes:
+def render_thumbnails(pdf: PdfSource, pages, dpi: int = THUMB_DPI):
+    """Miniaturas PNG de las páginas pedidas (0-based), abriendo el PDF una vez.
+    Devuelve (nº de páginas, {página: png})."""
+    thumbs = {}
+    try:
+        doc = pdf.open()
+        page_count = doc.page_count
+        for p in pages:
+            if 0 <= p < page_count:
+                thumbs[p] = doc.load_page(p).get_pixmap(dpi=dpi, alpha=False).tobytes("png")
+        doc.close()
+    except Exception:
+        return 0, thumbs
+    return page_count, thumbs
+
+def preview_state(pdf: PdfSource) -> dict:
     """
-    Reescribe el PDF en memoria. Usamos saver con opciones de compresión.
-    Nota: PyMuPDF no tiene 'calidad' directa; el slider guía flags generales.
+    Estado de la vista previa en session_state, por hash del contenido:
+    mover un control o cambiar de idioma no vuelve a abrir ni renderizar el PDF.
+    Sólo se guarda el del PDF actual; subir otro descarta el anterior.
     """
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    out = io.BytesIO()
-    # Flags de compresión razonables
-    # garbage=4 → limpieza profunda; deflate=True → comprimir streams; compress=True → recomprime imágenes/objetos.
-    doc.save(out, garbage=4, deflate=True, compress=True, incremental=False)
-    doc.close()
-    out.seek(0)
-    return out.read()
+    key = pdf.digest
+    state = st.session_state.get("preview")
+    if state is None or state["key"] != key:
+        state = {"key": key, "thumbs": {}, "thumbs_shown": 0, "page_count": None}
+        st.session_state["preview"] = state
+    return state
 
 def human_size(num_bytes: int) -> str:
     for unit in ["B","KB","MB","GB"]:
@@ -242,60 +293,175 @@ def human_size(num_bytes: int) -> str:
         num_bytes /= 1024.0
     return f"{num_bytes:.1f} TB"
 
+# ============== Trabajo en segundo plano ==============
+# Sesión, subidas y seguimiento del trabajo: ver sesion.py.
+# /metrics en PRINTPDF_METRICS_PORT (si está definido); una vez por proceso.
+serve_metrics()
+
+def compression_plan(pdf: PdfSource):
+    """
+    Previsión de compress_plan para el PDF actual. Cuesta ~una compresión, así
+    que se calcula como trabajo en la cola y no en el hilo del script; mientras
+    tanto devuelve None. Se guarda en la sesión: mover el slider no la repite
+    aunque la caché de resultados haya caducado.
+    """
+    state = st.session_state.get("plan")
+    if state is None or state["key"] != pdf.digest:
+        if state is not None:
+            JOBS.forget(state["job"])
+        job_id = JOBS.submit(session_owner(), compress_plan, pdf, on_finish=session_files().pin([pdf]))
+        state = {"key": pdf.digest, "job": job_id, "plan": None, "failed": False}
+        st.session_state["plan"] = state
+    if state["plan"] is None and not state["failed"]:
+        job = JOBS.get(state["job"])
+        if job is not None and job.status == DONE:
+            state["plan"] = job.result
+        elif job is None or job.status in FINISHED:
+            state["failed"] = True  # sin previsión: se comprime igual, sin estimado
+        if job is None or job.status in FINISHED:
+            JOBS.forget(state["job"])
+    return state["plan"]
+
+
 # Mostrar preview inmediata si hay archivo
 if uploaded is None:
     st.info("ℹ️ " + TXT["info"][lang])
 else:
-    # Leer a memoria
-    original_bytes = uploaded.read()
-    # Preview
-    img = preview_pdf_first_page(original_bytes)
-    if img:
-        with right:
-            with st.container():
-                st.markdown('<div class="preview">', unsafe_allow_html=True)
-                st.image(img, caption="Primera página (preview)", use_container_width=True)
-                st.markdown('</div>', unsafe_allow_html=True)
+    # En memoria o, si es grande, en un temporal (sin más copias en cada rerun)
+    source = session_files().source(uploaded)
+    # Preview (cacheada en la sesión; progresiva: baja resolución y luego definitiva)
+    pv = preview_state(source)
+    with right:
+        with st.container():
+            st.markdown('<div class="preview">', unsafe_allow_html=True)
+            if "high" not in pv:
+                if "low" not in pv:
+                    pv["low"] = preview_pdf_first_page(source, dpi=PREVIEW_LOW_DPI)
+                if pv["low"]:
+                    preview_container.image(pv["low"], caption="Primera página (preview)", use_container_width=True)
+                pv["high"] = preview_pdf_first_page(source, dpi=PREVIEW_DPI)
+            if pv["high"]:
+                preview_container.image(pv["high"], caption="Primera página (preview)", use_container_width=True)
+            st.markdown('</div>', unsafe_allow_html=True)
     # Metadatos base
     with right:
         meta_container.markdown(f"""
         <div class="small">
           <b>Nombre:</b> {uploaded.name}<br/>
-          <b>Tamaño original:</b> {human_size(len(original_bytes))}
+          <b>Tamaño original:</b> {human_size(source.size)}
         </div>
         """, unsafe_allow_html=True)
 
-    # Procesar bajo demanda
-    if process_clicked:
-        try:
-            with st.spinner("⏳ Procesando en memoria..."):
-                t0 = time.time()
-                result_bytes = compress_pdf(original_bytes, quality)
-                dt = time.time() - t0
-
-            # Info tamaños
-            before = len(original_bytes)
-            after = len(result_bytes)
-            ratio = (1 - (after / before)) * 100 if before > 0 else 0
-
-            st.success(TXT["success"][lang])
-            st.markdown(f"**⏱️ Tiempo:** {dt:.2f}s • **🔻 Reducción:** {ratio:.1f}% • **📦 Nuevo tamaño:** {human_size(after)}")
-
-            # Botón de descarga (en memoria)
-            st.markdown('<div class="dl">', unsafe_allow_html=True)
-            st.download_button(
-                label="⬇️ " + TXT["download"][lang],
-                data=result_bytes,
-                file_name=f"printpdf_{uploaded.name}",
-                mime="application/pdf",
-                use_container_width=True
-            )
-            st.markdown('</div>', unsafe_allow_html=True)
-
-        except Exception:
-            st.error("❌ " + TXT["error"][lang])
-            with st.expander("Detalles técnicos (oculto al usuario final)"):
-                st.code(traceback.format_exc())
+    # Previsión de tamaño/tiempo para todo el slider (en segundo plano): moverlo no recomprime nada
+    plan = compression_plan(source)
+    est_bytes = None
+    if plan is not None:
+        if mode == "auto":
+            quality = plan.auto_quality(int(target_mb * 1024 * 1024))
+            if quality is None:
+                quality = 10
+                estimate_container.warning(TXT["unreachable"][lang])
+        est_bytes, est_seconds = plan.estimate(quality)
+        label = f"{TXT['auto_pick'][lang]}: {quality} • " if mode == "auto" else ""
+        estimate_container.caption(f"📏 {label}{TXT['estimate'][lang]}: ≈ {human_size(est_bytes)} • ~{est_seconds:.1f}s")
+    elif not st.session_state["plan"]["failed"]:
+        estimate_container.caption("📏 " + TXT["estimating"][lang])
+        with estimate_container:
+            job_wait(st.session_state["plan"]["job"])  # sin bloquear; al terminar se muestra
+    elif mode == "auto":
+        quality = 60  # la previsión falló: sin ella, la calidad por defecto del slider
+
+    # Tira de miniaturas: sólo se renderiza si se pide, por lotes
+    with right:
+        if st.toggle(TXT["thumbs"][lang]):
+            if pv["thumbs_shown"] == 0:
+                pv["thumbs_shown"] = THUMBS_PER_BATCH
+            limit = pv["thumbs_shown"] if pv["page_count"] is None else min(pv["thumbs_shown"], pv["page_count"])
+            missing = [p for p in range(limit) if p not in pv["thumbs"]]
+            if missing:
+                pv["page_count"], thumbs = render_thumbnails(source, missing)
+                pv["thumbs"].update(thumbs)
+            cols = st.columns(4)
+            for p in sorted(pv["thumbs"]):
+                if p < pv["thumbs_shown"]:
+                    cols[p % 4].image(pv["thumbs"][p], caption=str(p + 1), use_container_width=True)
+            if pv["page_count"] and pv["thumbs_shown"] < pv["page_count"]:
+                if st.button(TXT["more_thumbs"][lang]):
+                    pv["thumbs_shown"] += THUMBS_PER_BATCH
+                    st.rerun()
+
+    # Procesar bajo demanda: se encola y se sigue por id (ver job_progress)
+    if process_clicked and quality is None:
+        # Modo tamaño objetivo sin previsión todavía: la calidad aún no se conoce.
+        st.warning(TXT["estimating"][lang])
+    elif process_clicked:
+        JOBS.forget(st.session_state.get("job", {}).get("id"))
+        # ?profile=1 en la URL → cProfile + tracemalloc para esta petición.
+        profiling = st.query_params.get("profile") == "1"
+        st.session_state["job"] = {
+            "id": JOBS.submit(session_owner(), run_traced, "compress_pdf", compress_pdf, source, quality,
+                              linearize=fast_web, profile=profiling, memory=profiling,
+                              on_finish=session_files().pin([source])),
+            "name": uploaded.name,
+            "before": source.size,
+            "estimate": est_bytes,
+        }
+
+    job_info = st.session_state.get("job")
+    job = JOBS.get(job_info["id"]) if job_info else None
+    if job is not None and job.status not in FINISHED:
+        job_progress(job.id, {"queued": TXT["queued"][lang], "pages": TXT["pages_done"][lang],
+                              "cancel": TXT["cancel"][lang]})
+    elif job is not None and job.status == DONE:
+        (result_bytes, image_report), trace = job.result
+
+        # Info tamaños
+        before = job_info["before"]
+        after = len(result_bytes)
+        ratio = (1 - (after / before)) * 100 if before > 0 else 0
+
+        st.success(TXT["success"][lang])
+        st.markdown(f"**⏱️ Tiempo:** {job.seconds:.2f}s • **🔻 Reducción:** {ratio:.1f}% • **📦 Nuevo tamaño:** {human_size(after)}"
+                    + (f" ({TXT['estimate'][lang].lower()}: {human_size(job_info['estimate'])})" if job_info["estimate"] else ""))
+        fp = first_page_report(result_bytes)
+        if fp["seconds_saved"] > 0:
+            st.caption(f"📱 {TXT['first_page'][lang]}: {human_size(fp['bytes_first_page'])} / {human_size(fp['bytes_total'])} • "
+                       f"~{fp['seconds_first_page']}s / ~{fp['seconds_total']}s @ {MOBILE_KBPS / 1000:g} Mbit/s")
+        if image_report:
+            with st.expander("🖼️ Imágenes recomprimidas"):
+                for img_class, s in image_report.items():
+                    st.markdown(f"**{img_class}** • {s['recompressed']}/{s['images']} imágenes • "
+                                f"{human_size(s['bytes_before'])} → {human_size(s['bytes_after'])} "
+                                f"(ahorro {human_size(s['saved'])})")
+        with st.expander("⏱️ Etapas"):
+            stages = trace.summary()
+            if stages:
+                st.dataframe(stages, use_container_width=True)
+            else:
+                st.caption("Resultado servido desde la caché.")
+            if trace.memory_peak is not None:
+                st.markdown(f"**Pico de memoria (Python, todo el proceso):** {human_size(trace.memory_peak)}")
+                st.code("\n".join(trace.memory_top))
+            if trace.profile:
+                st.code(trace.profile)
+
+        # Botón de descarga (en memoria). El resultado sigue en la cola para poder
+        # volver a descargarlo; se libera al procesar otro PDF o al caducar (JOB_TTL).
+        st.markdown('<div class="dl">', unsafe_allow_html=True)
+        st.download_button(
+            label="⬇️ " + TXT["download"][lang],
+            data=result_bytes,
+            file_name=f"printpdf_{job_info['name']}",
+            mime="application/pdf",
+            use_container_width=True,
+        )
+        st.markdown('</div>', unsafe_allow_html=True)
+    elif job is not None and job.status == CANCELLED:
+        st.info(TXT["cancelled"][lang])
+    elif job is not None:
+        st.error("❌ " + TXT["error"][lang])
+        with st.expander("Detalles técnicos (oculto al usuario final)"):
+            st.code(job.error)
 
 # Cierre del contenedor principal
 st.markdown('</div>', unsafe_allow_html=True)
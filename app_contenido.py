@@ -1,11 +1,11 @@
-import io
-import base64
-from typing import List, Tuple
+from typing import Iterator, Optional
 
 import streamlit as st
-from PIL import Image, ImageOps
-from PyPDF2 import PdfReader, PdfWriter
-import fitz # PyMuPDF
+
+from arranque import start_warm_up
+from metricas import run_traced, serve_metrics
+from sesion import job_progress, session_files, session_owner
+from trabajos import CANCELLED, DONE, FINISHED, JOBS, job_cpu_share
 
 # ==========================================
 # CONFIGURACIÓN DE IDIOMAS Y TEXTOS
@@ -36,12 +36,29 @@ LANGS = {
         "convert": "Convertir",
         "download": "Descargar",
         "pages_range": "Rangos de páginas (p.ej. 1-3,6,8-9)",
+        "pages_range_opt": "Páginas (vacío = todas; p.ej. 1-3,6,8-9)",
+        "split_ranges": "Rangos de páginas (p.ej. 1-3,6 · separa con ; para varios PDFs: 1-3;4-10;11-)",
         "compress": "Comprimir",
         "dpi": "DPI destino (recomendado 120-200)",
+        "dpi_img": "Resolución (DPI)",
         "img_preview": "Vista previa",
         "ok": "Listo ✔️",
         "nothing": "Nada que procesar.",
         "pdf_quality_note": "Nota: la compresión re-muestrea imágenes internas y re-graba el PDF.",
+        "pages_report": "Decisión por página",
+        "failed": "No se pudieron convertir",
+        "timings": "Tiempos por archivo",
+        "page_size": "Tamaño de página",
+        "max_dpi": "DPI máximo de las imágenes (0 = sin reducir)",
+        "target_kb": "Peso máximo por imagen (KB)",
+        "queued": "En cola…",
+        "pages": "páginas",
+        "cancel": "Cancelar",
+        "cancelled": "Proceso cancelado.",
+        "job_error": "No se pudo procesar el PDF.",
+        "stages": "Tiempo por etapa",
+        "fast_web": "Optimizar para web (primera página antes)",
+        "first_page": "Primera página",
     },
     "en": {
         "title": "🗂️ File & Image Toolkit",
@@ -68,12 +85,29 @@ LANGS = {
         "convert": "Convert",
         "download": "Download",
         "pages_range": "Page ranges (e.g. 1-3,6,8-9)",
+        "pages_range_opt": "Pages (empty = all; e.g. 1-3,6,8-9)",
+        "split_ranges": "Page ranges (e.g. 1-3,6 · use ; for several PDFs: 1-3;4-10;11-)",
         "compress": "Compress",
         "dpi": "Target DPI (recommended 120-200)",
+        "dpi_img": "Resolution (DPI)",
         "img_preview": "Preview",
         "ok": "Done ✔️",
         "nothing": "Nothing to process.",
         "pdf_quality_note": "Note: compression resamples inner images and rewrites the PDF.",
+        "pages_report": "Per-page decision",
+        "failed": "Could not convert",
+        "timings": "Per-file timings",
+        "page_size": "Page size",
+        "max_dpi": "Max image DPI (0 = keep)",
+        "target_kb": "Max size per image (KB)",
+        "queued": "Queued…",
+        "pages": "pages",
+        "cancel": "Cancel",
+        "cancelled": "Processing cancelled.",
+        "job_error": "Could not process the PDF.",
+        "stages": "Time per stage",
+        "fast_web": "Optimize for web (first page sooner)",
+        "first_page": "First page",
     },
 }
 
@@ -83,100 +117,71 @@ FLAG = {
 }
 
 st.set_page_config(page_title="Toolkit Archivos", page_icon="🗂️", layout="centered")
+# PyMuPDF/Pillow se importan y calientan en segundo plano (ver arranque.py)
+start_warm_up()
 
 # Idioma
 lang_key = st.sidebar.radio("🌍 Idioma / Language", list(FLAG.keys()), format_func=lambda k: FLAG[k], index=0)
 T = LANGS[lang_key]
 
+# /metrics en PRINTPDF_METRICS_PORT (si está definido); una vez por proceso.
+serve_metrics()
+
 st.title(T["title"])
 st.caption(T["about"])
 
 # ==========================================
 # FUNCIONES
 # ==========================================
+# Los módulos pesados (PyMuPDF, Pillow) se importan tras pintar título e idioma:
+# la primera pantalla no los espera y start_warm_up ya los está cargando.
+import fitz  # noqa: E402 (PyMuPDF)
 
-def pil_to_bytes(img: Image.Image, fmt: str, quality: int = 90) -> bytes:
-    out = io.BytesIO()
-    f = fmt.upper()
-    params = {}
-    if f in ("JPG", "JPEG"):
-        f = "JPEG"
-        params = {"quality": quality, "optimize": True}
-    elif f == "PNG":
-        params = {"optimize": True}
-    elif f == "WEBP":
-        params = {"quality": quality, "method": 6}
-    img.save(out, format=f, **params)
-    return out.getvalue()
+from compresion import RASTER_WORKERS  # noqa: E402
+from conversion import PAGE_SIZES, compress_batch, convert_batch, images_to_pdf, resize_batch  # noqa: E402
+from ficheros import PdfSource  # noqa: E402
+from nucleo import iter_pdf_images, pdf_compress, pdf_merge, write_zip  # noqa: E402
+from paginas import extract_pages, parse_ranges, split_groups  # noqa: E402
+from salida import LINEARIZE_AVAILABLE, MOBILE_KBPS, first_page_report  # noqa: E402
 
 def download_button_bytes(label: str, data: bytes, file_name: str, mime: str):
     st.download_button(label, data=data, file_name=file_name, mime=mime, use_container_width=True)
     st.session_state["processed"] = True
 
-def parse_ranges(s: str, max_page: int) -> List[int]:
-    pages = set()
-    s = s.replace(" ", "")
-    if not s:
-        return []
-    for part in s.split(","):
-        if "-" in part:
-            a, b = part.split("-")
-            for p in range(int(a), int(b) + 1):
-                if 1 <= p <= max_page:
-                    pages.add(p - 1)
-        else:
-            p = int(part)
-            if 1 <= p <= max_page:
-                pages.add(p - 1)
-    return sorted(pages)
+def batch_download(results: Iterator[dict], total: int, zip_name: str):
+    # Vuelca un lote (ver conversion.process_batch) a un único ZIP descargable,
+    # con barra de progreso, informe de fallos y tiempos por archivo.
+    bar = st.progress(0.0)
+    report = []
 
-def pdf_merge(files: List[io.BytesIO]) -> bytes:
-    writer = PdfWriter()
-    for f in files:
-        reader = PdfReader(f)
-        for page in reader.pages:
-            writer.add_page(page)
-    out = io.BytesIO()
-    writer.write(out)
-    out.seek(0)
-    return out.getvalue()
+    def succeeded():
+        for r in results:
+            report.append({"archivo": r["source"], "salida": r["name"], "segundos": r["seconds"],
+                           "error": r["error"], **r["info"]})
+            bar.progress(len(report) / total, text=f"{len(report)}/{total}")
+            if r["data"] is not None:
+                yield r["name"], r["data"]
 
-def pdf_split(file: io.BytesIO, pages_0based: List[int]) -> bytes:
-    reader = PdfReader(file)
-    writer = PdfWriter()
-    for p in pages_0based:
-        if 0 <= p < len(reader.pages):
-            writer.add_page(reader.pages[p])
-    out = io.BytesIO()
-    writer.write(out)
-    out.seek(0)
-    return out.getvalue()
+    with write_zip(succeeded()) as spool:
+        download_button_bytes(f"⬇️ {T['download']} ZIP", spool.read(), zip_name, "application/zip")
+    failed = [r for r in report if r["error"]]
+    if failed:
+        st.warning(f"{T['failed']}: " + ", ".join(r["archivo"] for r in failed))
+    with st.expander(T["timings"]):
+        st.dataframe(report, use_container_width=True)
 
-def pdf_to_images(file: io.BytesIO, out_format: str = "PNG", dpi: int = 144) -> List[Tuple[str, bytes]]:
-    out = []
-    doc = fitz.open(stream=file.getvalue(), filetype="pdf")
-    for i, page in enumerate(doc):
-        mat = fitz.Matrix(dpi / 72, dpi / 72)
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        img_bytes = pil_to_bytes(img, out_format, quality=90)
-        out.append((f"page_{i+1}.{out_format.lower()}", img_bytes))
-    return out
+def pdf_source(file) -> PdfSource:
+    return session_files().source(file)
 
-def pdf_compress(file: io.BytesIO, dpi: int = 150, quality: int = 85) -> bytes:
-    doc = fitz.open(stream=file.getvalue(), filetype="pdf")
-    for page in doc:
-        mat = fitz.Matrix(dpi / 72, dpi / 72)
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        page.clean_contents()
-        img_b = pil_to_bytes(img, "JPEG", quality=quality)
-        rect = page.rect
-        page.insert_image(rect, stream=img_b)
-    out = io.BytesIO()
-    doc.save(out, deflate=True)
-    out.seek(0)
-    return out.getvalue()
+def session_pdf(file) -> Optional[fitz.Document]:
+    # Un único fitz.Document por sesión y subida (ver SessionFiles.document):
+    # contar páginas, validar rangos y extraer reutilizan el mismo documento.
+    # Sin subida se cierra el anterior; si no, se cierra con la sesión.
+    if file is None:
+        if "files" in st.session_state:
+            session_files().close_document()
+        return None
+    return session_files().document(file)
 
 # ==========================================
 # INTERFAZ PRINCIPAL
@@ -193,6 +198,8 @@ tool = st.sidebar.radio(
 
 if "processed" not in st.session_state:
     st.session_state["processed"] = False
+if tool != "pdf_split":
+    session_pdf(None)  # el documento abierto de "dividir" ya no hace falta
 
 # ==========================================
 # FUNCIONES DE LA APP
@@ -202,21 +209,81 @@ if tool == "img_convert":
     up = st.file_uploader(T["upload_imgs"], type=["jpg", "jpeg", "png", "webp"], accept_multiple_files=True)
     fmt = st.selectbox(T["format"], ["JPG", "PNG", "WEBP", "PDF"])
     quality = st.slider(f"{T['quality']} (JPG/WEBP)", 10, 100, 90)
+    if fmt == "PDF":
+        col1, col2 = st.columns(2)
+        with col1:
+            page_size = st.selectbox(T["page_size"], PAGE_SIZES)
+        with col2:
+            max_dpi = st.number_input(T["max_dpi"], 0, 600, 0, step=50, disabled=page_size == "auto")
     if st.button(T["convert"], use_container_width=True):
         if not up:
             st.warning(T["nothing"])
         else:
             if fmt == "PDF":
-                images = [Image.open(f).convert("RGB") for f in up]
-                buf = io.BytesIO()
-                images[0].save(buf, format="PDF", save_all=True, append_images=images[1:])
-                download_button_bytes(f"📄 {T['download']} PDF", buf.getvalue(), "images.pdf", "application/pdf")
+                data = images_to_pdf(((f.name, f.getvalue()) for f in up), page_size, int(max_dpi), quality)
+                download_button_bytes(f"📄 {T['download']} PDF", data, "images.pdf", "application/pdf")
             else:
-                for f in up:
-                    img = Image.open(f).convert("RGB")
-                    data = pil_to_bytes(img, fmt, quality)
-                    ext = fmt.lower() if fmt != "JPG" else "jpg"
-                    download_button_bytes(f"⬇️ {T['download']} {f.name}.{ext}", data, f"{f.name.rsplit('.',1)[0]}.{ext}", f"image/{ext}")
+                # Conversión en paralelo; los resultados van directos a un único ZIP.
+                batch_download(convert_batch(((f.name, f.getvalue()) for f in up), fmt, quality), len(up), "images.zip")
+
+elif tool == "img_resize":
+    up = st.file_uploader(T["upload_imgs"], type=["jpg", "jpeg", "png", "webp"], accept_multiple_files=True)
+    col1, col2 = st.columns(2)
+    with col1:
+        width = st.number_input(T["width"], 0, 20000, 1280, step=10)
+    with col2:
+        height = st.number_input(T["height"], 0, 20000, 0, step=10)
+    keep = st.checkbox(T["keep_ratio"], value=True)
+    if st.button(T["convert"], use_container_width=True):
+        if not up or not (width or height):
+            st.warning(T["nothing"])
+        else:
+            files = ((f.name, f.getvalue()) for f in up)
+            batch_download(resize_batch(files, int(width), int(height), keep), len(up), "resized.zip")
+
+elif tool == "img_compress":
+    up = st.file_uploader(T["upload_imgs"], type=["jpg", "jpeg", "png", "webp"], accept_multiple_files=True)
+    col1, col2 = st.columns(2)
+    with col1:
+        target_kb = st.number_input(T["target_kb"], 10, 20000, 200, step=10)
+    with col2:
+        fmt = st.selectbox(T["format"], ["JPG", "WEBP"])
+    if st.button(T["compress"], use_container_width=True):
+        if not up:
+            st.warning(T["nothing"])
+        else:
+            files = ((f.name, f.getvalue()) for f in up)
+            batch_download(compress_batch(files, int(target_kb), fmt), len(up), "compressed.zip")
+
+elif tool == "pdf_to_img":
+    up = st.file_uploader(T["upload_pdf"], type=["pdf"])
+    col1, col2 = st.columns(2)
+    with col1:
+        fmt = st.selectbox(T["format"], ["PNG", "JPG", "WEBP"])
+    with col2:
+        dpi = st.slider(T["dpi_img"], 72, 300, 144)
+    # PNG no tiene calidad; cambiarla sólo vuelve a codificar (las páginas quedan en la caché de render).
+    img_q = st.slider(T["quality"], 10, 95, 90) if fmt != "PNG" else 90
+    ranges = st.text_input(T["pages_range_opt"], "")
+    if st.button(T["convert"], use_container_width=True):
+        if not up:
+            st.warning(T["nothing"])
+        else:
+            src = pdf_source(up)
+            with src.open() as doc:
+                page_count = doc.page_count
+            try:
+                pages = parse_ranges(ranges, page_count) if ranges.strip() else list(range(page_count))
+            except ValueError:  # rango mal escrito ("1--3", "a")
+                pages = []
+            if not pages:
+                st.warning(T["nothing"])
+            else:
+                bar = st.progress(0.0)
+                spool = write_zip(iter_pdf_images(src, fmt, dpi, pages, quality=img_q),
+                                      on_progress=lambda n: bar.progress(n / len(pages), text=f"{n}/{len(pages)}"))
+                with spool:
+                    download_button_bytes(f"⬇️ {T['download']} ZIP", spool.read(), "pages.zip", "application/zip")
 
 elif tool == "pdf_merge":
     ups = st.file_uploader(T["upload_pdfs"], type=["pdf"], accept_multiple_files=True)
@@ -224,28 +291,32 @@ elif tool == "pdf_merge":
         if not ups:
             st.warning(T["nothing"])
         else:
-            data = pdf_merge([io.BytesIO(f.read()) for f in ups])
+            data = pdf_merge(session_files().sources(ups))
             download_button_bytes(f"⬇️ {T['download']} PDF", data, "merged.pdf", "application/pdf")
 
 elif tool == "pdf_split":
     up = st.file_uploader(T["upload_pdf"], type=["pdf"])
-    if up:
-        reader = PdfReader(up)
-        st.info(f"📄 {len(reader.pages)} páginas")
-        up.seek(0)
-    ranges = st.text_input(T["pages_range"], "1-3")
+    doc = session_pdf(up)
+    if doc is not None:
+        st.info(f"📄 {doc.page_count} páginas")
+    ranges = st.text_input(T["split_ranges"], "1-3")
     if st.button(T["convert"], use_container_width=True):
-        if not up:
+        if doc is None:
             st.warning(T["nothing"])
         else:
-            reader = PdfReader(up)
-            pages = parse_ranges(ranges, len(reader.pages))
-            if not pages:
+            try:
+                groups = split_groups(ranges, doc.page_count)
+            except ValueError:  # rango mal escrito ("1--3", "a")
+                groups = []
+            if not groups:
                 st.warning(T["nothing"])
-            else:
-                up.seek(0)
-                data = pdf_split(up, pages)
+            elif len(groups) == 1:
+                data = extract_pages(doc, groups[0])
                 download_button_bytes(f"⬇️ {T['download']} PDF", data, "split.pdf", "application/pdf")
+            else:
+                parts = ((f"split_{k}.pdf", extract_pages(doc, g)) for k, g in enumerate(groups, start=1))
+                with write_zip(parts) as spool:
+                    download_button_bytes(f"⬇️ {T['download']} ZIP", spool.read(), "split.zip", "application/zip")
 
 elif tool == "pdf_compress":
     st.caption(T["pdf_quality_note"])
@@ -255,12 +326,57 @@ elif tool == "pdf_compress":
         dpi = st.slider(T["dpi"], 72, 240, 150)
     with col2:
         q = st.slider(T["quality"], 10, 95, 85)
+    ranges = st.text_input(T["pages_range_opt"], "")
+    fast_web = st.checkbox(T["fast_web"]) if LINEARIZE_AVAILABLE else False
     if st.button(T["compress"], use_container_width=True):
-        if not up:
+        src = pdf_source(up) if up else None
+        pages = None
+        if src is not None and ranges.strip():
+            with src.open() as doc:
+                try:
+                    pages = parse_ranges(ranges, doc.page_count)
+                except ValueError:  # rango mal escrito ("1--3", "a")
+                    pages = []
+        if src is None or pages == []:
             st.warning(T["nothing"])
         else:
-            data = pdf_compress(up, dpi=dpi, quality=q)
-            download_button_bytes(f"⬇️ {T['download']} PDF", data, "compressed.pdf", "application/pdf")
+            # Se encola y se sigue por id: mover un slider no pierde el trabajo.
+            JOBS.forget(st.session_state.get("pdf_job"))
+            # ?profile=1 en la URL → cProfile + tracemalloc para esta petición.
+            profiling = st.query_params.get("profile") == "1"
+            st.session_state["pdf_job"] = JOBS.submit(session_owner(), run_traced, "pdf_compress", pdf_compress,
+                                                      src, dpi=dpi, quality=q, workers=job_cpu_share(RASTER_WORKERS),
+                                                      linearize=fast_web, pages=pages,
+                                                      profile=profiling, memory=profiling,
+                                                      on_finish=session_files().pin([src]))
+    job = JOBS.get(st.session_state.get("pdf_job"))
+    if job is not None and job.status not in FINISHED:
+        job_progress(job.id, {"queued": T["queued"], "pages": T["pages"], "cancel": T["cancel"]})  # ver sesion.py
+    elif job is not None and job.status == DONE:
+        (data, report), trace = job.result
+        # El resultado sigue en la cola (se puede volver a descargar) hasta que
+        # otro trabajo lo sustituye o caduca.
+        st.download_button(f"⬇️ {T['download']} PDF", data=data, file_name="compressed.pdf", mime="application/pdf",
+                           use_container_width=True)
+        st.session_state["processed"] = True
+        fp = first_page_report(data)
+        if fp["seconds_saved"] > 0:
+            st.caption(f"📱 {T['first_page']}: {fp['bytes_first_page'] // 1024} / {fp['bytes_total'] // 1024} KB • "
+                       f"~{fp['seconds_first_page']}s / ~{fp['seconds_total']}s @ {MOBILE_KBPS / 1000:g} Mbit/s")
+        with st.expander(T["pages_report"]):
+            st.dataframe(report, use_container_width=True)
+        with st.expander(T["stages"]):
+            st.dataframe(trace.summary(), use_container_width=True)
+            if trace.memory_top:
+                st.code("\n".join(trace.memory_top))
+            if trace.profile:
+                st.code(trace.profile)
+    elif job is not None and job.status == CANCELLED:
+        st.info(T["cancelled"])
+    elif job is not None:
+        st.error(T["job_error"])
+        with st.expander("Traceback"):
+            st.code(job.error)
 
 # ✅ Muestra "Listo" solo si hubo proceso
 if "processed" in st.session_state and st.session_state["processed"]:
@@ -0,0 +1,94 @@
+# arranque.py — Arranque en frío: importar y calentar el motor de render fuera del camino de la petición
+#
+# La primera petición de un proceso paga la importación de PyMuPDF/Pillow, la
+# carga de fuentes de MuPDF y la de los plugins de Pillow (JPEG, PNG, WEBP).
+# start_warm_up() hace todo eso una vez por proceso en un hilo aparte con un
+# documento sintético diminuto, mientras la app pinta su primera pantalla.
+#
+# Uso:  python arranque.py   → tiempos del calentamiento en este entorno
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from metricas import add_gauges, trace
+
+# ============== Configuración ==============
+# PRINTPDF_WARMUP=0 desactiva el calentamiento (p.ej. para medir con benchmarks/bench_arranque.py).
+WARMUP = os.environ.get("PRINTPDF_WARMUP", "1") != "0"
+
+# Segundos de cada fase del calentamiento de este proceso (vacío hasta que termina).
+WARMUP_SECONDS: Dict[str, float] = {}
+
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    Importa el núcleo y pasa un PDF de una página por abrir, renderizar,
+    codificar (JPEG, PNG y WEBP, todos por Pillow) y guardar.
+    Las etapas quedan en las métricas bajo la operación "warmup".
+    """
+    phases: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    import fitz  # PyMuPDF
+    import nucleo
+    phases["import"] = time.perf_counter() - t0
+
+    with trace("warmup"):
+        t0 = time.perf_counter()
+        doc = fitz.open()
+        page = doc.new_page(width=144, height=144)
+        page.insert_text((12, 72), "PrintPDF", fontsize=12)
+        page.draw_rect(fitz.Rect(8, 8, 136, 136), color=(0.2, 0.3, 0.8))
+        data = doc.tobytes(garbage=3, deflate=True)
+        doc.close()
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            pix = doc[0].get_pixmap(dpi=72, alpha=False)
+        phases["render"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for fmt in ("PNG", "JPEG", "WEBP"):
+            nucleo.pixmap_to_bytes(pix, fmt, quality=80)
+        phases["codecs"] = time.perf_counter() - t0
+    return phases
+
+
+def _run() -> None:
+    try:
+        WARMUP_SECONDS.update(warm_up())
+    except Exception:
+        # Calentar es una optimización: si falla, la primera petición pagará el coste.
+        pass
+
+
+def start_warm_up() -> None:
+    """
+    Lanza warm_up() en un hilo daemon, una sola vez por proceso (las apps
+    de Streamlit lo llaman en cada rerun; sólo el primero hace algo).
+    """
+    global _thread
+    if not WARMUP:
+        return
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name="printpdf-warmup", daemon=True)
+            _thread.start()
+
+
+def wait_warm_up(timeout: Optional[float] = None) -> bool:
+    """Espera a que termine el calentamiento; False si no ha terminado (o no se lanzó)."""
+    thread = _thread
+    if thread is None:
+        return False
+    thread.join(timeout)
+    return not thread.is_alive()
+
+
+add_gauges("printpdf_warmup_seconds", lambda: dict(WARMUP_SECONDS))
+
+
+if __name__ == "__main__":
+    for phase, seconds in warm_up().items():
+        print(f"{phase:<8}{seconds * 1000:>9.1f} ms")
@@ -0,0 +1,115 @@
+# bench_arranque.py — Arranque en frío: importaciones, primera pantalla y primera petición
+#
+# Uso:  python benchmarks/bench_arranque.py [--repeat 5] [--output arranque.json]
+#
+# Cada medición es un proceso nuevo (nada importado ni calentado), como una
+# instancia recién creada en Cloud Run. Se comparan dos modos:
+#   frío     → PRINTPDF_WARMUP=0: la primera petición importa y calienta todo.
+#   caliente → arranque.start_warm_up() al cargar la app, como hacen app.py y
+#              app_contenido.py; la petición llega cuando el calentamiento acabó.
+# "primera pantalla" son las importaciones que la app necesita antes de pintar
+# cabecera y controles; "todo arriba" es lo que costaban cuando las pesadas
+# (PyMuPDF, Pillow, núcleo) estaban al principio del script.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Lo que las apps importan antes de pintar y lo que importan después.
+LIGHT_MODULES = ("streamlit", "arranque", "metricas", "trabajos")
+HEAVY_MODULES = ("fitz", "ficheros", "nucleo", "conversion", "paginas")
+
+
+def _import(names) -> float:
+    t0 = time.perf_counter()
+    for name in names:
+        __import__(name)
+    return time.perf_counter() - t0
+
+
+def _request(path: str) -> float:
+    """Una petición típica: comprimir un PDF pequeño y sacar la miniatura de su primera página."""
+    import nucleo
+    with open(path, "rb") as fh:
+        data = fh.read()
+    t0 = time.perf_counter()
+    nucleo.compress_pdf.__wrapped__(data, 60)
+    for _ in nucleo.iter_pdf_images(data, "JPG", 72, [0]):
+        pass
+    return time.perf_counter() - t0
+
+
+def run_child(mode: str, path: str) -> dict:
+    t_start = time.perf_counter()
+    light = _import(LIGHT_MODULES)
+    warmup = 0.0
+    if mode == "caliente":
+        import arranque
+        t0 = time.perf_counter()
+        arranque.start_warm_up()
+        arranque.wait_warm_up()
+        warmup = time.perf_counter() - t0
+    heavy = _import(HEAVY_MODULES)
+    first = _request(path)
+    second = _request(path)
+    return {
+        "mode": mode,
+        "first_paint_imports": round(light, 4),
+        "all_imports": round(light + heavy + (warmup if mode == "caliente" else 0.0), 4),
+        "warmup": round(warmup, 4),
+        "first_request": round(first, 4),
+        "second_request": round(second, 4),
+        "process_total": round(time.perf_counter() - t_start, 4),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark del arranque en frío.")
+    parser.add_argument("--repeat", type=int, default=5, help="procesos por modo (se guarda la mediana)")
+    parser.add_argument("--output", help="fichero JSON de resultados")
+    parser.add_argument("--child", nargs=2, metavar=("MODO", "PDF"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(*args.child)))
+        return
+
+    # Una página con texto y una foto pequeña: lo que se mide es el arranque, no el trabajo.
+    import corpus
+    import fitz  # PyMuPDF
+    doc = fitz.open()
+    page = corpus._text_page(doc, 1)
+    page.insert_image(fitz.Rect(56, 420, 356, 645), stream=corpus._jpeg(corpus.photo(400, 300, corpus.SEED)))
+    fd, path = tempfile.mkstemp(suffix=".pdf", prefix="printpdf_arranque_")
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(doc.tobytes(garbage=3, deflate=True))
+    results = []
+    try:
+        for mode in ("frío", "caliente"):
+            env = dict(os.environ, PRINTPDF_WARMUP="0" if mode == "frío" else "1")
+            runs = []
+            for _ in range(max(1, args.repeat)):
+                out = subprocess.run([sys.executable, __file__, "--child", mode, path], env=env,
+                                     check=True, capture_output=True, text=True).stdout
+                runs.append(json.loads(out.strip().splitlines()[-1]))
+            results.append({k: statistics.median(r[k] for r in runs) if k != "mode" else mode for k in runs[0]})
+    finally:
+        os.remove(path)
+
+    print(f"{'modo':<10}{'1ª pantalla':>13}{'todo arriba':>13}{'calentar':>10}{'1ª petición':>13}{'2ª petición':>13}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['first_paint_imports']:>12.3f}s{r['all_imports']:>12.3f}s{r['warmup']:>9.3f}s"
+              f"{r['first_request']:>12.3f}s{r['second_request']:>12.3f}s")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump({"repeat": args.repeat, "results": results}, fh, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# bench_codificacion.py — Pixmap → bytes: camino antiguo (frombytes + PIL) vs. pixmap_to_bytes
+#
+# Uso:  python benchmarks/bench_codificacion.py [--pages 20] [--dpi 240] [--formats JPG,PNG,WEBP]
+#
+# Cada combinación (modo, formato) se mide en un proceso hijo aparte para que
+# el pico de RSS (ru_maxrss) sea el de ese camino y no el acumulado.
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from codificacion import pil_to_bytes, pixmap_to_bytes
+
+
+def make_sample_pdf(pages: int) -> bytes:
+    """PDF sintético: texto, vectores y una imagen con degradado por página."""
+    img = Image.linear_gradient("L").resize((1200, 900)).convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Página {i + 1} " * 8, fontsize=11)
+        page.draw_rect(fitz.Rect(72, 100, 520, 300), color=(0.2, 0.3, 0.8), fill=(0.9, 0.9, 1))
+        page.insert_image(fitz.Rect(72, 320, 520, 660), stream=buf.getvalue())
+    return doc.tobytes()
+
+
+def encode_old(pix: fitz.Pixmap, fmt: str) -> bytes:
+    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    return pil_to_bytes(img, fmt, quality=90)
+
+
+def encode_new(pix: fitz.Pixmap, fmt: str) -> bytes:
+    return pixmap_to_bytes(pix, fmt, quality=90)
+
+
+def run_child(mode: str, fmt: str, pages: int, dpi: int) -> dict:
+    pdf = make_sample_pdf(pages)
+    encode = encode_old if mode == "old" else encode_new
+    doc = fitz.open(stream=pdf, filetype="pdf")
+    mat = fitz.Matrix(dpi / 72, dpi / 72)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    out_bytes = 0
+    t0 = time.perf_counter()
+    for page in doc:
+        pix = page.get_pixmap(matrix=mat, alpha=False)
+        out_bytes += len(encode(pix, fmt))
+        del pix
+    dt = time.perf_counter() - t0
+    # ru_maxrss está en KB en Linux.
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "mode": mode,
+        "format": fmt,
+        "pages": pages,
+        "dpi": dpi,
+        "seconds": round(dt, 3),
+        "pages_per_sec": round(pages / dt, 2),
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+        "rss_growth_mb": round((peak_kb - rss_before) / 1024, 1),
+        "output_mb": round(out_bytes / 1024 / 1024, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--dpi", type=int, default=240)
+    parser.add_argument("--formats", default="JPG,PNG,WEBP")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "FORMAT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child[0], args.child[1], args.pages, args.dpi)))
+        return
+
+    results = []
+    for fmt in args.formats.split(","):
+        for mode in ("old", "new"):
+            cmd = [sys.executable, __file__, "--pages", str(args.pages), "--dpi", str(args.dpi), "--child", mode, fmt]
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"{'formato':<8}{'modo':<6}{'pág/s':>9}{'pico RSS MB':>13}{'Δ RSS MB':>10}{'salida MB':>11}")
+    for r in results:
+        print(f"{r['format']:<8}{r['mode']:<6}{r['pages_per_sec']:>9}{r['peak_rss_mb']:>13}{r['rss_growth_mb']:>10}{r['output_mb']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+# bench_operaciones.py — Benchmark de todas las operaciones PDF/imagen sobre el corpus sintético
+#
+# Uso:  python benchmarks/bench_operaciones.py [--quick] [--only compress_pdf,pdf_merge]
+#                                              [--output resultados.json] [--baseline base.json]
+#                                              [--repeat 3] [--tolerance 0.10]
+#
+# Cada caso (operación, corpus, parámetros) se mide en un proceso hijo aparte,
+# como en bench_codificacion.py: el pico de RSS es el de ese caso y no hay
+# caché de resultados caliente. Con --baseline se compara contra un JSON previo
+# y el código de salida es 1 si algún caso empeora más de --tolerance.
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # PyMuPDF
+import PIL
+from PIL import Image
+
+import corpus
+import nucleo
+from codificacion import pil_to_bytes
+from paginas import split_groups
+
+
+# ============== Operaciones ==============
+# Cada una recibe (ruta del corpus, parámetros) y devuelve (bytes de salida, páginas/imágenes).
+# Las funciones cacheadas se llaman por __wrapped__: se mide el trabajo, no la caché.
+def _read(path: str) -> bytes:
+    with open(path, "rb") as fh:
+        return fh.read()
+
+
+def _pages(data: bytes) -> int:
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return doc.page_count
+
+
+def op_compress_pdf(path: str, params: dict) -> Tuple[int, int]:
+    data = _read(path)
+    out, _ = nucleo.compress_pdf.__wrapped__(data, params["quality"])
+    return len(out), _pages(data)
+
+
+def op_compress_plan(path: str, params: dict) -> Tuple[int, int]:
+    data = _read(path)
+    plan = nucleo.compress_plan.__wrapped__(data)
+    return plan.estimate(params["quality"])[0], _pages(data)
+
+
+def op_pdf_compress(path: str, params: dict) -> Tuple[int, int]:
+    data = _read(path)
+    out, report = nucleo.pdf_compress.__wrapped__(io.BytesIO(data), **params)
+    return len(out), len(report)
+
+
+def op_pdf_compress_sweep(path: str, params: dict) -> Tuple[int, int]:
+    # Ajuste iterativo: la misma subida con varias calidades seguidas; desde
+    # la segunda sólo se codifica (caché de render), no se renderiza.
+    src = io.BytesIO(_read(path))
+    size = pages = 0
+    for quality in params["qualities"]:
+        out, report = nucleo.pdf_compress.__wrapped__(src, dpi=params["dpi"], quality=quality)
+        size += len(out)
+        pages += len(report)
+    return size, pages
+
+
+def op_pdf_to_images(path: str, params: dict) -> Tuple[int, int]:
+    size = pages = 0
+    for _, img in nucleo.iter_pdf_images(io.BytesIO(_read(path)), params["format"], params["dpi"]):
+        size += len(img)
+        pages += 1
+    return size, pages
+
+
+def op_pdf_merge(paths: List[str], params: dict) -> Tuple[int, int]:
+    out = nucleo.pdf_merge.__wrapped__([io.BytesIO(_read(p)) for p in paths])
+    return len(out), _pages(out)
+
+
+def op_pdf_split(path: str, params: dict) -> Tuple[int, int]:
+    data = _read(path)
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        groups = split_groups(params["ranges"], doc.page_count)
+        size = sum(len(nucleo.extract_pages(doc, g)) for g in groups)
+    return size, sum(len(g) for g in groups)
+
+
+def op_pil_to_bytes(path: str, params: dict) -> Tuple[int, int]:
+    size = count = 0
+    for name in sorted(os.listdir(path)):
+        with Image.open(os.path.join(path, name)) as img:
+            size += len(pil_to_bytes(img.convert("RGB"), params["format"], params["quality"]))
+        count += 1
+    return size, count
+
+
+OPERATIONS: Dict[str, Callable[..., Tuple[int, int]]] = {
+    "compress_pdf": op_compress_pdf,
+    "compress_plan": op_compress_plan,
+    "pdf_compress": op_pdf_compress,
+    "pdf_compress_sweep": op_pdf_compress_sweep,
+    "pdf_to_images": op_pdf_to_images,
+    "pdf_merge": op_pdf_merge,
+    "pdf_split": op_pdf_split,
+    "pil_to_bytes": op_pil_to_bytes,
+}
+
+# (operación, corpus, parámetros). Para pdf_merge el corpus es una lista separada por "+".
+CASES: List[Tuple[str, str, dict]] = (
+    [("compress_pdf", c, {"quality": q}) for c in ("text", "scanned", "mixed", "large_image") for q in (30, 60, 90)]
+    + [("compress_plan", c, {"quality": 60}) for c in ("scanned", "mixed", "large_image")]
+    + [("pdf_compress", c, {"dpi": d, "quality": 85}) for c in ("scanned", "mixed") for d in (100, 150)]
+    + [("pdf_compress_sweep", "scanned", {"dpi": 150, "qualities": [85, 70, 55]})]
+    + [("pdf_to_images", c, {"format": f, "dpi": 144}) for c in ("text", "mixed") for f in ("PNG", "JPG")]
+    + [("pdf_merge", "text+mixed+scanned", {}), ("pdf_merge", "many_pages+many_pages", {})]
+    + [("pdf_split", "many_pages", {"ranges": r}) for r in ("1-", "1-10;11-20;21-30", "-5;6-")]
+    + [("pil_to_bytes", "photos", {"format": f, "quality": 85}) for f in ("JPEG", "PNG", "WEBP")]
+)
+
+
+# Por debajo de este tiempo la diferencia entre ejecuciones es ruido, no regresión.
+NOISE_FLOOR_SECONDS = 0.05
+
+
+def case_key(op: str, corpus_name: str, params: dict) -> str:
+    return f"{op}|{corpus_name}|{json.dumps(params, sort_keys=True)}"
+
+
+# ============== Medición (proceso hijo) ==============
+def run_case(paths: Dict[str, str], op: str, corpus_name: str, params: dict) -> dict:
+    names = corpus_name.split("+")
+    target = [paths[n] for n in names] if op == "pdf_merge" else paths[corpus_name]
+    inputs = [target] if isinstance(target, str) else target
+    input_bytes = sum(
+        sum(os.path.getsize(os.path.join(p, f)) for f in os.listdir(p)) if os.path.isdir(p) else os.path.getsize(p)
+        for p in inputs
+    )
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    output_bytes, units = OPERATIONS[op](target, params)
+    dt = time.perf_counter() - t0
+    # ru_maxrss está en KB en Linux.
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "op": op,
+        "corpus": corpus_name,
+        "params": params,
+        "seconds": round(dt, 4),
+        "pages": units,
+        "pages_per_sec": round(units / dt, 2) if dt else None,
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+        "rss_growth_mb": round((peak_kb - rss_before) / 1024, 1),
+        "input_bytes": input_bytes,
+        "output_bytes": output_bytes,
+        "size_ratio": round(output_bytes / input_bytes, 4) if input_bytes else None,
+    }
+
+
+# ============== Comparación con una línea base ==============
+def compare(results: List[dict], baseline: dict, tolerance: float) -> List[str]:
+    """Imprime Δ tiempo / Δ tamaño por caso y devuelve los casos que empeoran."""
+    base = {case_key(r["op"], r["corpus"], r["params"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'caso':<58}{'Δ tiempo':>10}{'Δ salida':>10}{'Δ RSS':>9}")
+    for r in results:
+        key = case_key(r["op"], r["corpus"], r["params"])
+        b = base.get(key)
+        if b is None:
+            print(f"{key:<58}{'nuevo':>10}")
+            continue
+        d_time = r["seconds"] / b["seconds"] - 1 if b["seconds"] else 0.0
+        d_size = r["output_bytes"] / b["output_bytes"] - 1 if b["output_bytes"] else 0.0
+        d_rss = r["rss_growth_mb"] - b["rss_growth_mb"]
+        flag = ""
+        slow = d_time > tolerance and max(r["seconds"], b["seconds"]) >= NOISE_FLOOR_SECONDS
+        if slow or d_size > tolerance:
+            flag = "  ← peor"
+            regressions.append(key)
+        print(f"{key:<58}{d_time:>+10.1%}{d_size:>+10.1%}{d_rss:>+8.0f}M{flag}")
+    return regressions
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "pymupdf": fitz.VersionBind,
+        "pillow": PIL.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de las operaciones PDF/imagen.")
+    parser.add_argument("--quick", action="store_true", help="corpus reducido")
+    parser.add_argument("--only", default="", help="operaciones separadas por comas")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "printpdf_corpus"))
+    parser.add_argument("--output", help="fichero JSON de resultados")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior con el que comparar")
+    parser.add_argument("--repeat", type=int, default=1, help="ejecuciones por caso (se guarda la más rápida)")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="empeoramiento admitido (0.10 = 10%%)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    paths = corpus.build(args.corpus_dir, args.quick)
+    if args.child:
+        op, corpus_name, params = json.loads(args.child)
+        print(json.dumps(run_case(paths, op, corpus_name, params)))
+        return
+
+    only = {o for o in args.only.split(",") if o}
+    cases = [c for c in CASES if not only or c[0] in only]
+    results = []
+    print(f"{'operación':<20}{'corpus':<22}{'parámetros':<34}{'s':>8}{'pág/s':>9}{'pico MB':>9}{'ratio':>8}")
+    for op, corpus_name, params in cases:
+        cmd = [sys.executable, __file__, "--corpus-dir", args.corpus_dir, "--child", json.dumps([op, corpus_name, params])]
+        if args.quick:
+            cmd.append("--quick")
+        runs = []
+        for _ in range(max(1, args.repeat)):
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            runs.append(json.loads(out.strip().splitlines()[-1]))
+        r = min(runs, key=lambda x: x["seconds"])
+        results.append(r)
+        print(f"{op:<20}{corpus_name:<22}{json.dumps(params):<34}{r['seconds']:>8.2f}{r['pages_per_sec'] or 0:>9.1f}"
+              f"{r['peak_rss_mb']:>9.0f}{r['size_ratio'] or 0:>8.3f}")
+
+    report = {"environment": environment(), "quick": args.quick, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        if baseline.get("quick") != args.quick:
+            print("\naviso: la línea base usa otro tamaño de corpus (--quick); los tiempos no son comparables")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} caso(s) empeoran más de un {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# corpus.py — Corpus sintético para los benchmarks (PDFs e imágenes generados en local)
+#
+# Uso:  python benchmarks/corpus.py --out /tmp/corpus [--quick]
+#
+# Todo es determinista (semilla fija): dos ejecuciones generan el mismo
+# contenido, así los resultados de distintas versiones son comparables.
+import argparse
+import io
+import os
+import random
+import sys
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageDraw, ImageFilter
+
+SEED = 1234
+LOREM = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod "
+         "tempor incididunt ut labore et dolore magna aliqua. ")
+
+
+def photo(width: int, height: int, seed: int) -> Image.Image:
+    """Imagen tipo foto: degradado de color, formas suaves y ruido (no comprime trivialmente)."""
+    rnd = random.Random(seed)
+    base = Image.merge("RGB", [Image.linear_gradient("L").rotate(rnd.choice((0, 90, 180, 270))).resize((width, height))
+                               for _ in range(3)])
+    draw = ImageDraw.Draw(base)
+    for _ in range(12):
+        x, y = rnd.randrange(width), rnd.randrange(height)
+        r = rnd.randrange(min(width, height) // 10, min(width, height) // 3)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rnd.randrange(256) for _ in range(3)))
+    base = base.filter(ImageFilter.GaussianBlur(3))
+    noise = Image.frombytes("L", (width, height), rnd.randbytes(width * height)).convert("RGB")
+    return Image.blend(base, noise, 0.12)
+
+
+def _png(img: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
+
+
+def _jpeg(img: Image.Image, quality: int = 92) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def _text_page(doc: fitz.Document, n: int) -> fitz.Page:
+    page = doc.new_page()
+    page.insert_textbox(fitz.Rect(56, 56, 540, 780), f"Página {n}\n" + LOREM * 30, fontsize=10)
+    return page
+
+
+def text_pdf(pages: int) -> bytes:
+    """Sólo texto y algún vector: lo que la compresión debería dejar intacto."""
+    doc = fitz.open()
+    for i in range(pages):
+        page = _text_page(doc, i + 1)
+        page.draw_rect(fitz.Rect(56, 40, 540, 48), color=(0.2, 0.3, 0.8), fill=(0.2, 0.3, 0.8))
+    return doc.tobytes(garbage=3, deflate=True)
+
+
+def scanned_pdf(pages: int, dpi: int = 200) -> bytes:
+    """Cada página es una imagen a página completa (escaneo), sin texto."""
+    doc = fitz.open()
+    w, h = int(8.27 * dpi), int(11.69 * dpi)
+    for i in range(pages):
+        page = doc.new_page()
+        # Imagen sin comprimir con pérdida: es el caso típico de un escáner en PNG/Flate.
+        page.insert_image(page.rect, stream=_png(photo(w, h, SEED + i)))
+    return doc.tobytes(garbage=3, deflate=True)
+
+
+def mixed_pdf(pages: int) -> bytes:
+    """Texto con una foto por página; una misma foto se repite cada 3 páginas."""
+    doc = fitz.open()
+    photos = [_jpeg(photo(1600, 1200, SEED + k), 95) for k in range(3)]
+    for i in range(pages):
+        page = _text_page(doc, i + 1)
+        page.insert_image(fitz.Rect(56, 420, 540, 780), stream=photos[i % 3])
+    return doc.tobytes(garbage=3, deflate=True)
+
+
+def large_image_pdf() -> bytes:
+    """Una sola página con una imagen enorme (≈ 24 MP) mostrada a tamaño carta."""
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_image(page.rect, stream=_png(photo(6000, 4000, SEED)))
+    return doc.tobytes(garbage=3, deflate=True)
+
+
+def photo_batch(count: int) -> List[Tuple[str, bytes]]:
+    """Lote de fotos JPEG de tamaños variados (entrada de las herramientas de imagen)."""
+    sizes = [(4000, 3000), (3000, 2000), (1920, 1080), (1200, 1600)]
+    return [(f"foto_{k + 1}.jpg", _jpeg(photo(*sizes[k % len(sizes)], SEED + 100 + k)))
+            for k in range(count)]
+
+
+# Nombre → (generador, tamaño normal, tamaño --quick)
+PDF_CORPORA: Dict[str, Tuple[Callable[..., bytes], tuple, tuple]] = {
+    "text": (text_pdf, (40,), (8,)),
+    "scanned": (scanned_pdf, (12,), (3,)),
+    "mixed": (mixed_pdf, (30,), (6,)),
+    "many_pages": (text_pdf, (600,), (120,)),
+    "large_image": (large_image_pdf, (), ()),
+}
+PHOTO_BATCH = {"normal": 12, "quick": 4}
+
+
+def build(out_dir: str, quick: bool = False) -> Dict[str, str]:
+    """
+    Genera el corpus en `out_dir` (si un fichero ya existe, se reutiliza) y
+    devuelve {nombre: ruta}. El lote de fotos es un directorio.
+    """
+    suffix = "_quick" if quick else ""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    for name, (gen, normal, small) in PDF_CORPORA.items():
+        path = os.path.join(out_dir, f"{name}{suffix}.pdf")
+        if not os.path.exists(path):
+            data = gen(*(small if quick else normal))
+            with open(path + ".tmp", "wb") as fh:
+                fh.write(data)
+            os.replace(path + ".tmp", path)
+        paths[name] = path
+    photos_dir = os.path.join(out_dir, f"photos{suffix}")
+    if not os.path.isdir(photos_dir):
+        os.makedirs(photos_dir + ".tmp", exist_ok=True)
+        for name, data in photo_batch(PHOTO_BATCH["quick" if quick else "normal"]):
+            with open(os.path.join(photos_dir + ".tmp", name), "wb") as fh:
+                fh.write(data)
+        os.replace(photos_dir + ".tmp", photos_dir)
+    paths["photos"] = photos_dir
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Genera el corpus sintético de los benchmarks.")
+    parser.add_argument("--out", required=True, help="directorio de salida")
+    parser.add_argument("--quick", action="store_true", help="corpus reducido (segundos, no minutos)")
+    args = parser.parse_args()
+    for name, path in build(args.out, args.quick).items():
+        size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) if os.path.isdir(path) else os.path.getsize(path)
+        print(f"{name:<12}{size / 1024 / 1024:>9.1f} MB  {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+# cache_resultados.py — Caché de resultados por hash de contenido (memoria + disco opcional)
+import functools
+import hashlib
+import inspect
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metricas import add_gauges
+
+# ============== Configuración ==============
+# Presupuesto de memoria (MB) y vida máxima de cada resultado (segundos).
+CACHE_MAX_MB = int(os.environ.get("PRINTPDF_CACHE_MB", "256"))
+CACHE_TTL = int(os.environ.get("PRINTPDF_CACHE_TTL", "600"))
+# Directorio del nivel en disco; si no se define, sólo se cachea en memoria.
+CACHE_DIR = os.environ.get("PRINTPDF_CACHE_DIR") or None
+# Cada cuánto (segundos) se descartan los resultados caducados (memoria y disco).
+PURGE_SECONDS = 60
+# Caché de páginas renderizadas (ver compresion.render_page): presupuesto (MB,
+# 0 = desactivada) y nivel zlib de los rásteres (0 = sin comprimir; comprimir
+# suele costar más que volver a renderizar, sólo compensa con poca memoria).
+RENDER_CACHE_MB = int(os.environ.get("PRINTPDF_RENDER_CACHE_MB", "128"))
+RENDER_CACHE_ZLIB = int(os.environ.get("PRINTPDF_RENDER_CACHE_ZLIB", "0"))
+
+
+def _sizeof(value: Any) -> int:
+    """Tamaño aproximado de un resultado: cuenta los bytes que contiene."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return 64 + sum(_sizeof(v) for v in value)
+    if isinstance(value, dict):
+        return 64 + sum(_sizeof(k) + _sizeof(v) for k, v in value.items())
+    return 64
+
+
+def _feed(h: "hashlib._Hash", value: Any) -> None:
+    """Alimenta el hash con el contenido (no la identidad) de un argumento."""
+    if isinstance(value, io.BytesIO):
+        value = value.getbuffer()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        h.update(b"b%d:" % len(value))
+        h.update(value)
+    elif isinstance(value, (list, tuple)):
+        h.update(b"l%d:" % len(value))
+        for v in value:
+            _feed(h, v)
+    else:
+        h.update(repr(value).encode("utf-8"))
+    h.update(b";")
+
+
+def content_hash(data: Any) -> str:
+    """Hash del contenido de unos bytes/BytesIO (identifica una subida)."""
+    h = hashlib.blake2b(digest_size=20)
+    _feed(h, data)
+    return h.hexdigest()
+
+
+class _NotStorable(Exception):
+    """El resultado no se puede guardar en disco (sólo se cachea en memoria)."""
+
+
+def _encode(value: Any, blobs: List[bytes]) -> Any:
+    """
+    Resultado → estructura JSON; los bytes van aparte, concatenados en `blobs`
+    (sin pickle: el fichero nunca ejecuta código al leerse). Tipos admitidos:
+    bytes, str, números, bool, None, listas, tuplas y dicts con claves str.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        blobs.append(bytes(value))
+        return {"$b": len(blobs) - 1}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, tuple):
+        return {"$t": [_encode(v, blobs) for v in value]}
+    if isinstance(value, list):
+        return [_encode(v, blobs) for v in value]
+    if isinstance(value, dict) and all(isinstance(k, str) and not k.startswith("$") for k in value):
+        return {k: _encode(v, blobs) for k, v in value.items()}
+    raise _NotStorable(type(value).__name__)
+
+
+def _decode(node: Any, blobs: List[bytes]) -> Any:
+    if isinstance(node, list):
+        return [_decode(v, blobs) for v in node]
+    if isinstance(node, dict):
+        if "$b" in node:
+            return blobs[node["$b"]]
+        if "$t" in node:
+            return tuple(_decode(v, blobs) for v in node["$t"])
+        return {k: _decode(v, blobs) for k, v in node.items()}
+    return node
+
+
+def make_key(op: str, params: Dict[str, Any]) -> str:
+    """Clave = hash(operación, bytes de entrada, parámetros)."""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(op.encode("utf-8") + b"|")
+    for name in sorted(params):
+        h.update(name.encode("utf-8") + b"=")
+        _feed(h, params[name])
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    Caché LRU acotada por bytes, con TTL y un nivel opcional en disco.
+    Es compartida por todas las sesiones del proceso, así que es thread-safe.
+
+    En disco cada resultado son dos ficheros: <clave>.bin con los bytes y
+    <clave>.json con el resto (ver _encode); lo que no se puede codificar
+    (p.ej. un CompressionPlan) se queda sólo en memoria.
+    Los caducados se descartan cada PURGE_SECONDS desde un hilo que arranca
+    con el primer put (los procesos de rasterizado que sólo importan el
+    módulo no lo crean), y los del disco también al arrancar.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float, disk_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self._purging = False
+        self._mem: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        self._mem_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._purge_disk()  # restos de un arranque anterior
+
+    # ---------- memoria ----------
+    def _evict(self) -> None:
+        while self._mem_bytes > self.max_bytes and self._mem:
+            _, (_, size, _) = self._mem.popitem(last=False)
+            self._mem_bytes -= size
+            self.evictions += 1
+
+    def _mem_put(self, key: str, value: Any, created: float) -> None:
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+        old = self._mem.pop(key, None)
+        if old:
+            self._mem_bytes -= old[1]
+        self._mem[key] = (created, size, value)
+        self._mem_bytes += size
+        self._evict()
+
+    def _purge_mem(self) -> None:
+        """Descarta los resultados caducados aunque nadie vuelva a pedirlos."""
+        now = time.time()
+        with self._lock:
+            for key in [k for k, (created, _, _) in self._mem.items() if now - created > self.ttl]:
+                self._mem_bytes -= self._mem.pop(key)[1]
+
+    # ---------- disco ----------
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.disk_dir, key + ext)
+
+    def _start_purge(self) -> None:
+        """Hilo daemon que purga memoria y disco cada PURGE_SECONDS (llamar con el lock)."""
+        if self._purging:
+            return
+        self._purging = True
+        ref = weakref.ref(self)
+
+        def loop() -> None:
+            while True:
+                time.sleep(PURGE_SECONDS)
+                cache = ref()
+                if cache is None:
+                    return
+                cache._purge_mem()
+                if cache.disk_dir:
+                    cache._purge_disk()
+                del cache
+        threading.Thread(target=loop, name="printpdf-cache-purge", daemon=True).start()
+
+    def _purge_disk(self) -> None:
+        """Borra los ficheros caducados (también .tmp a medias o de formatos anteriores)."""
+        now = time.time()
+        try:
+            names = os.listdir(self.disk_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.disk_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, Any]]:
+        """(creado, valor) desde <clave>.json y <clave>.bin, o None. El .json
+        se escribe el último, así que su fecha es la del resultado."""
+        meta_path, blob_path = self._path(key, ".json"), self._path(key, ".bin")
+        try:
+            created = os.path.getmtime(meta_path)
+            if now - created > self.ttl:
+                return None
+            with open(meta_path, "r", encoding="utf-8") as fh:
+                meta = json.load(fh)
+            with open(blob_path, "rb") as fh:
+                data = fh.read()
+        except (OSError, ValueError):
+            return None
+        sizes = meta.get("blobs", [])
+        if sum(sizes) != len(data):
+            return None
+        blobs, start = [], 0
+        for size in sizes:
+            blobs.append(data[start:start + size])
+            start += size
+        return created, _decode(meta.get("value"), blobs)
+
+    def _disk_put(self, key: str, value: Any) -> None:
+        blobs: List[bytes] = []
+        try:
+            meta = {"value": _encode(value, blobs), "blobs": [len(b) for b in blobs]}
+        except _NotStorable:
+            return
+        # Escritura atómica: otro proceso/hilo nunca lee un fichero a medias.
+        for ext, payload in ((".bin", blobs), (".json", [json.dumps(meta).encode("utf-8")])):
+            fd, tmp = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as fh:
+                    for chunk in payload:
+                        fh.write(chunk)
+                os.replace(tmp, self._path(key, ext))
+            except OSError:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                return
+
+    # ---------- API ----------
+    def get(self, key: str) -> Tuple[bool, Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[2]
+                self._mem.pop(key)
+                self._mem_bytes -= entry[1]
+            if self.disk_dir:
+                stored = self._disk_get(key, now)
+                if stored is not None:
+                    created, value = stored
+                    self._mem_put(key, value, created)
+                    self.disk_hits += 1
+                    return True, value
+            self.misses += 1
+            return False, None
+
+    def put(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self._mem_put(key, value, now)
+            self._start_purge()
+        if self.disk_dir:
+            self._disk_put(key, value)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._mem),
+                "bytes": self._mem_bytes,
+            }
+
+
+RESULT_CACHE = ResultCache(CACHE_MAX_MB * 1024 * 1024, CACHE_TTL, CACHE_DIR)
+add_gauges("printpdf_cache", RESULT_CACHE.stats)
+# Rásteres por (hash del PDF, página, DPI): sólo en memoria, son grandes y baratos de rehacer.
+RENDER_CACHE = ResultCache(RENDER_CACHE_MB * 1024 * 1024, CACHE_TTL)
+add_gauges("printpdf_render_cache", RENDER_CACHE.stats)
+
+
+def cached_result(op: str, cache: ResultCache = RESULT_CACHE, ignore: Tuple[str, ...] = ()) -> Callable:
+    """
+    Decorador: cachea el resultado de `op` por hash del contenido de los
+    argumentos (bytes, BytesIO o listas de ellos) y del resto de parámetros.
+    Los parámetros de `ignore` (p.ej. un callback de progreso) no forman
+    parte de la clave. El resultado cacheado se comparte: no debe mutarse.
+    """
+    def decorator(fn: Callable) -> Callable:
+        sig = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = make_key(op, {k: v for k, v in bound.arguments.items() if k not in ignore})
+            found, value = cache.get(key)
+            if found:
+                return value
+            value = fn(*args, **kwargs)
+            cache.put(key, value)
+            return value
+        return wrapper
+    return decorator
@@ -0,0 +1,581 @@
+# compresion.py — Motor de recompresión de imágenes embebidas (todo en memoria)
+import hashlib
+import os
+import re
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+import fitz  # PyMuPDF
+
+from cache_resultados import RENDER_CACHE, RENDER_CACHE_ZLIB, make_key
+from codificacion import pixmap_to_bytes
+from metricas import Span, record, stage, trace
+
+# ============== Parámetros ==============
+# Rango de DPI objetivo que recorre el slider de calidad (10 → 100).
+MIN_TARGET_DPI = 72
+MAX_TARGET_DPI = 300
+# Sólo se re-muestrea si la imagen supera el DPI objetivo en este factor
+# (evita re-muestrear imágenes que ya están casi en su tamaño final).
+DPI_TOLERANCE = 1.2
+# Imágenes muy pequeñas (iconos, logos) no compensan el trabajo.
+MIN_IMAGE_PIXELS = 64 * 64
+
+# Procesos para rasterizar páginas (PRINTPDF_WORKERS=1 fuerza el camino serie).
+RASTER_WORKERS = int(os.environ.get("PRINTPDF_WORKERS", os.cpu_count() or 1))
+# Por debajo de este nº de páginas arrancar procesos cuesta más de lo que ahorra.
+MIN_PAGES_PER_WORKER = 4
+
+
+def target_dpi_for_quality(quality_hint: int) -> int:
+    """Traduce el slider (10-100) a un DPI objetivo para las imágenes."""
+    q = max(10, min(100, int(quality_hint)))
+    return int(MIN_TARGET_DPI + (MAX_TARGET_DPI - MIN_TARGET_DPI) * q / 100)
+
+
+def jpeg_quality_for_hint(quality_hint: int) -> int:
+    """Calidad JPEG efectiva: por encima de 95 el JPEG crece sin ganar nitidez."""
+    return max(10, min(95, int(quality_hint)))
+
+
+def _image_class(doc: fitz.Document, xref: int) -> str:
+    """Clasifica la imagen por el filtro de su stream (para el informe)."""
+    kind, value = doc.xref_get_key(xref, "Filter")
+    if kind == "array":
+        value = value.strip("[]").split()[-1] if value.strip("[]") else ""
+    return {
+        "/DCTDecode": "jpeg",
+        "/JPXDecode": "jpx",
+        "/FlateDecode": "flate",
+        "/JBIG2Decode": "jbig2",
+        "/CCITTFaxDecode": "ccitt",
+    }.get(value, "raw" if kind == "null" else "otros")
+
+
+def _is_recompressible(doc: fitz.Document, xref: int, img_class: str) -> bool:
+    """Descarta máscaras, imágenes bitonales y casos que JPEG empeoraría."""
+    if img_class in ("jbig2", "ccitt"):
+        return False
+    if doc.xref_get_key(xref, "ImageMask")[1] == "true":
+        return False
+    if doc.xref_get_key(xref, "BitsPerComponent")[1] == "1":
+        return False
+    # Un /Decode invertido cambiaría los colores al re-codificar.
+    if doc.xref_get_key(xref, "Decode")[0] != "null":
+        return False
+    # /Mask como array es una máscara por clave de color: transparenta los
+    # píxeles de valor exacto, y JPEG movería esos valores.
+    if doc.xref_get_key(xref, "Mask")[0] == "array":
+        return False
+    return True
+
+
+def collect_placements(doc: fitz.Document) -> Dict[int, float]:
+    """
+    Recorre las páginas y devuelve {xref: mayor ancho mostrado en pulgadas}.
+    Cada imagen aparece una sola vez aunque se repita en varias páginas.
+    Un ancho 0 significa "sin colocación visible" (p.ej. dentro de un patrón):
+    no conocemos su DPI real y no se re-muestrea.
+    """
+    placements: Dict[int, float] = {}
+    smasks = set()
+    for page in doc:
+        for info in page.get_images(full=True):
+            xref, smask = info[0], info[1]
+            if smask:
+                # Las máscaras de transparencia se quedan como están.
+                smasks.add(smask)
+            widest = max((r.width / 72 for r in page.get_image_rects(xref)), default=0.0)
+            placements[xref] = max(placements.get(xref, 0.0), widest)
+    return {x: w for x, w in placements.items() if x not in smasks}
+
+
+def _load_pixmap(doc: fitz.Document, xref: int) -> Optional[fitz.Pixmap]:
+    """Decodifica la imagen a un pixmap gris/RGB sin alfa; None si no se puede
+    o si es demasiado pequeña para compensar."""
+    try:
+        pix = fitz.Pixmap(doc, xref)
+    except Exception:
+        return None
+    if pix.width * pix.height < MIN_IMAGE_PIXELS:
+        return None
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.colorspace is None or pix.colorspace.n not in (1, 3):
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    return pix
+
+
+def _resampled_size(width: int, height: int, widest_in: float, target_dpi: int) -> Tuple[int, int]:
+    """Tamaño tras re-muestrear según el DPI efectivo de la colocación más grande."""
+    if widest_in > 0:
+        effective_dpi = width / widest_in
+        if effective_dpi > target_dpi * DPI_TOLERANCE:
+            scale = target_dpi / effective_dpi
+            return max(1, int(width * scale)), max(1, int(height * scale))
+    return width, height
+
+
+def recompress_image(doc: fitz.Document, xref: int, widest_in: float, target_dpi: int, jpg_quality: int) -> Tuple[str, int, int]:
+    """
+    Re-muestrea y re-codifica a JPEG, en el sitio, la imagen `xref`.
+    Sólo se reemplaza si el resultado es más pequeño.
+    Devuelve (clase de imagen, bytes antes, bytes después).
+    """
+    img_class = _image_class(doc, xref)
+    raw = doc.xref_stream_raw(xref) or b""
+    unchanged = (img_class, len(raw), len(raw))
+    if not _is_recompressible(doc, xref, img_class):
+        return unchanged
+
+    with stage("render", bytes_in=len(raw)):
+        pix = _load_pixmap(doc, xref)
+        if pix is None:
+            return unchanged
+        size = _resampled_size(pix.width, pix.height, widest_in, target_dpi)
+        if size != (pix.width, pix.height):
+            pix = fitz.Pixmap(pix, size[0], size[1], None)
+
+    with stage("encode") as span:
+        new_bytes = pix.tobytes("jpeg", jpg_quality=jpg_quality)
+        span.bytes_out = len(new_bytes)
+    if len(new_bytes) >= len(raw):
+        return unchanged
+
+    # Sustitución en el sitio: mismo xref, así todas las páginas que la
+    # usan apuntan a la versión nueva sin tocar sus content streams.
+    with stage("insert", bytes_in=len(new_bytes)):
+        doc.update_stream(xref, new_bytes, compress=0)
+        doc.xref_set_key(xref, "Filter", "/DCTDecode")
+        doc.xref_set_key(xref, "DecodeParms", "null")
+        doc.xref_set_key(xref, "Width", str(pix.width))
+        doc.xref_set_key(xref, "Height", str(pix.height))
+        doc.xref_set_key(xref, "BitsPerComponent", "8")
+        doc.xref_set_key(xref, "ColorSpace", "/DeviceGray" if pix.n == 1 else "/DeviceRGB")
+    return img_class, len(raw), len(new_bytes)
+
+
+def recompress_images(doc: fitz.Document, quality_hint: int,
+                      progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Dict[str, int]]:
+    """
+    Recomprime todas las imágenes embebidas del documento (ver recompress_image).
+
+    - Deduplica por xref: una imagen compartida por varias páginas se procesa una vez.
+    - Baja a `target_dpi_for_quality(quality_hint)` lo que supere ese DPI.
+    - No toca texto ni vectores: sólo se sustituye el stream de la imagen.
+    - Recorre página a página y llama a progress(página, total) tras cada una.
+
+    Devuelve un informe por clase de imagen:
+    {"jpeg": {"images": n, "recompressed": n, "bytes_before": b, "bytes_after": b, "saved": b}, ...}
+    """
+    target_dpi = target_dpi_for_quality(quality_hint)
+    jpg_quality = jpeg_quality_for_hint(quality_hint)
+    report: Dict[str, Dict[str, int]] = {}
+
+    # Cargar páginas y recorrer sus recursos también es parte del parseo.
+    with stage("parse", pages=doc.page_count):
+        placements = collect_placements(doc)
+    done = set()
+    for page in doc:
+        for info in page.get_images(full=True):
+            xref = info[0]
+            if xref in done or xref not in placements:
+                continue
+            done.add(xref)
+            img_class, before, after = recompress_image(doc, xref, placements[xref], target_dpi, jpg_quality)
+            stats = report.setdefault(img_class, {"images": 0, "recompressed": 0, "bytes_before": 0, "bytes_after": 0, "saved": 0})
+            stats["images"] += 1
+            stats["recompressed"] += int(after < before)
+            stats["bytes_before"] += before
+            stats["bytes_after"] += after
+            stats["saved"] += before - after
+        if progress:
+            progress(page.number + 1, doc.page_count)
+
+    return report
+
+
+# ============== Planificador: tamaño y tiempo previstos antes de comprimir ==============
+# Valores del slider que se miden de verdad; entre dos de ellos se interpola.
+PLAN_LEVELS = (10, 25, 40, 55, 70, 85, 100)
+# Imágenes de muestra, repartidas entre la más pesada y la más ligera.
+PLAN_SAMPLE_IMAGES = 3
+# De cada muestra sólo se codifica un recorte central de este lado (en píxeles
+# ya re-muestreados): los bytes por píxel se parecen a los de la imagen entera.
+PLAN_CROP = 512
+
+
+class CompressionPlan:
+    """
+    Previsión de recompress_images + guardado para cualquier valor del slider
+    (ver plan_compression). Guarda, por nivel medido, bytes y segundos por
+    píxel de salida, y las dimensiones de cada imagen candidata: el tamaño
+    tras re-muestrear se calcula exacto y sólo se interpolan las tasas.
+    """
+
+    def __init__(self, size_before: int, parse_seconds: float, rates: Dict[int, Tuple[float, float]],
+                 images: List[Tuple[int, int, int, float]], sampled: int):
+        self.size_before = size_before
+        self.parse_seconds = parse_seconds
+        self.rates = rates      # {nivel: (bytes/píxel, segundos/píxel)}
+        self.images = images    # [(bytes, ancho, alto, ancho mostrado)]
+        self.sampled = sampled
+
+    def estimate(self, quality_hint: int) -> Tuple[int, float]:
+        """(bytes, segundos) previstos con ese valor del slider."""
+        if not self.rates:
+            return self.size_before, self.parse_seconds
+        q = max(PLAN_LEVELS[0], min(PLAN_LEVELS[-1], int(quality_hint)))
+        lo = max(level for level in PLAN_LEVELS if level <= q)
+        hi = min(level for level in PLAN_LEVELS if level >= q)
+        f = (q - lo) / (hi - lo) if hi != lo else 0.0
+        (bpp_lo, spp_lo), (bpp_hi, spp_hi) = self.rates[lo], self.rates[hi]
+        bpp, spp = bpp_lo + (bpp_hi - bpp_lo) * f, spp_lo + (spp_hi - spp_lo) * f
+        target_dpi = target_dpi_for_quality(q)
+        size, seconds = self.size_before, self.parse_seconds
+        for raw, width, height, widest_in in self.images:
+            w, h = _resampled_size(width, height, widest_in, target_dpi)
+            # Como recompress_image: si no sale más pequeña, se queda igual.
+            size += min(raw, int(w * h * bpp)) - raw
+            seconds += w * h * spp
+        return size, seconds
+
+    def auto_quality(self, target_bytes: int, step: int = 5) -> Optional[int]:
+        """Valor más alto del slider (menos pérdida) cuyo tamaño previsto cabe
+        en target_bytes; None si ni con el mínimo se llega."""
+        for q in range(PLAN_LEVELS[-1], PLAN_LEVELS[0] - 1, -step):
+            if self.estimate(q)[0] <= target_bytes:
+                return q
+        return None
+
+
+def _plan_candidates(doc: fitz.Document, placements: Dict[int, float]) -> List[Tuple[int, int, int, int, float]]:
+    """Imágenes que recompress_image intentaría: (xref, bytes, ancho, alto, ancho mostrado)."""
+    candidates = []
+    for xref, widest_in in placements.items():
+        if not _is_recompressible(doc, xref, _image_class(doc, xref)):
+            continue
+        try:
+            width = int(doc.xref_get_key(xref, "Width")[1])
+            height = int(doc.xref_get_key(xref, "Height")[1])
+        except ValueError:
+            continue
+        if width * height < MIN_IMAGE_PIXELS:
+            continue
+        candidates.append((xref, len(doc.xref_stream_raw(xref) or b""), width, height, widest_in))
+    return candidates
+
+
+def plan_compression(doc: fitz.Document, size_before: int) -> CompressionPlan:
+    """
+    Mide lo necesario para estimar, sin reescribir el documento, el tamaño
+    final y el tiempo de recompress_images con cualquier valor del slider:
+
+    - De PLAN_SAMPLE_IMAGES imágenes (repartidas por peso) se codifica un
+      recorte a cada nivel de PLAN_LEVELS → bytes y segundos por píxel.
+    - El resto se extrapola con esas tasas (ver CompressionPlan.estimate).
+    - Lo que no son imágenes candidatas se supone igual que en el original.
+    """
+    t0 = time.perf_counter()
+    with stage("parse", pages=doc.page_count):
+        placements = collect_placements(doc)
+    parse_seconds = time.perf_counter() - t0
+    candidates = _plan_candidates(doc, placements)
+
+    by_size = sorted(candidates, key=lambda c: c[1], reverse=True)
+    k = min(PLAN_SAMPLE_IMAGES, len(by_size))
+    picks = sorted({round(i * (len(by_size) - 1) / (k - 1)) for i in range(k)}) if k > 1 else list(range(k))
+    measured = {level: [0, 0, 0.0] for level in PLAN_LEVELS}  # bytes, píxeles, segundos
+    sampled = 0
+    with stage("plan", pages=doc.page_count):
+        for xref, _, _, _, widest_in in (by_size[i] for i in picks):
+            pix = _load_pixmap(doc, xref)
+            if pix is None:
+                continue
+            sampled += 1
+            for level in PLAN_LEVELS:
+                w, h = _resampled_size(pix.width, pix.height, widest_in, target_dpi_for_quality(level))
+                cw, ch = min(PLAN_CROP, w), min(PLAN_CROP, h)
+                x0, y0 = (w - cw) // 2, (h - ch) // 2
+                t0 = time.perf_counter()
+                crop = fitz.Pixmap(pix, w, h, fitz.IRect(x0, y0, x0 + cw, y0 + ch))
+                encoded = len(crop.tobytes("jpeg", jpg_quality=jpeg_quality_for_hint(level)))
+                m = measured[level]
+                m[0] += encoded
+                m[1] += cw * ch
+                m[2] += time.perf_counter() - t0
+
+    rates = {level: (encoded / pixels, seconds / pixels)
+             for level, (encoded, pixels, seconds) in measured.items() if pixels}
+    images = [c[1:] for c in candidates] if rates else []
+    return CompressionPlan(size_before, parse_seconds, rates, images, sampled)
+
+
+# ============== Rasterizado por páginas (serie o en paralelo) ==============
+# Los rásteres se guardan en RENDER_CACHE por (hash del PDF, página, DPI):
+# al repetir con otra calidad o formato, o con otro rango que comparta
+# páginas, sólo se vuelve a codificar.
+def _render_key(doc_key: str, page_no: int, dpi: int) -> str:
+    return make_key("render", {"doc": doc_key, "page": page_no, "dpi": dpi})
+
+
+def _pack_pixmap(pix: fitz.Pixmap) -> Tuple[int, int, int, int, bytes]:
+    # (ancho, alto, componentes, nivel zlib, muestras); sin alpha no hay relleno por fila.
+    samples = pix.samples_mv
+    data = zlib.compress(samples, RENDER_CACHE_ZLIB) if RENDER_CACHE_ZLIB else bytes(samples)
+    return pix.width, pix.height, pix.n, RENDER_CACHE_ZLIB, data
+
+
+def _unpack_pixmap(entry: Tuple[int, int, int, int, bytes]) -> fitz.Pixmap:
+    width, height, n, level, data = entry
+    with stage("cache", pages=1):
+        if level:
+            data = zlib.decompress(data)
+        return fitz.Pixmap(fitz.csGRAY if n == 1 else fitz.csRGB, width, height, data, 0)
+
+
+def render_page(page: fitz.Page, dpi: int, doc_key: Optional[str] = None) -> fitz.Pixmap:
+    """
+    Renderiza una página (sin alpha). Con `doc_key` (hash del PDF, ver
+    ficheros.input_digest) el ráster se busca y se guarda en RENDER_CACHE.
+    """
+    key = _render_key(doc_key, page.number, dpi) if doc_key and RENDER_CACHE.max_bytes else None
+    if key is not None:
+        found, entry = RENDER_CACHE.get(key)
+        if found:
+            return _unpack_pixmap(entry)
+    mat = fitz.Matrix(dpi / 72, dpi / 72)
+    with stage("render", pages=1):
+        pix = page.get_pixmap(matrix=mat, alpha=False)
+    if key is not None:
+        RENDER_CACHE.put(key, _pack_pixmap(pix))
+    return pix
+
+
+def render_page_jpeg(page: fitz.Page, dpi: int, quality: int, doc_key: Optional[str] = None) -> bytes:
+    """Renderiza una página a JPEG. Es el único camino de codificación, así
+    que el modo serie y el paralelo producen exactamente los mismos bytes."""
+    return pixmap_to_bytes(render_page(page, dpi, doc_key), "JPEG", quality=quality)
+
+
+# Documento abierto una sola vez por proceso worker (ver _init_worker).
+_worker_doc: Optional[fitz.Document] = None
+
+
+def _open_source(pdf: Union[bytes, str]) -> fitz.Document:
+    # Una ruta (subida volcada a disco, ver ficheros.py) se abre por nombre.
+    if isinstance(pdf, str):
+        return fitz.open(pdf, filetype="pdf")
+    return fitz.open(stream=pdf, filetype="pdf")
+
+
+def _init_worker(pdf: Union[bytes, str]) -> None:
+    global _worker_doc
+    _worker_doc = _open_source(pdf)
+
+
+def _render_pages(indices: List[int], dpi: int, quality: int,
+                  keep: Set[int]) -> Tuple[List[Tuple[bytes, Optional[tuple]]], List[Span]]:
+    # Las etapas medidas en el worker viajan con el resultado (ver metricas.record);
+    # las páginas de `keep` también el ráster, para la caché del proceso principal.
+    with trace("-") as tr:
+        results = []
+        for i in indices:
+            pix = render_page(_worker_doc[i], dpi)
+            results.append((pixmap_to_bytes(pix, "JPEG", quality=quality), _pack_pixmap(pix) if i in keep else None))
+    return results, tr.spans
+
+
+def _pages_to_keep(doc: fitz.Document, indices: Sequence[int], dpi: int) -> Set[int]:
+    """
+    Páginas cuyo ráster se guarda en RENDER_CACHE: en orden, mientras su
+    tamaño estimado (RGB sin comprimir) quepa en el presupuesto. Más allá sólo
+    se expulsarían unas a otras, y en paralelo además viajarían por la tubería.
+    """
+    budget = RENDER_CACHE.max_bytes
+    keep: Set[int] = set()
+    for i in indices:
+        rect = doc[i].rect
+        size = (int(rect.width * dpi / 72) + 1) * (int(rect.height * dpi / 72) + 1) * 3
+        if size > budget:
+            break
+        budget -= size
+        keep.add(i)
+    return keep
+
+
+def _page_chunks(indices: Sequence[int], workers: int) -> List[List[int]]:
+    """Trozos contiguos y disjuntos; ~4 por worker para repartir bien la carga."""
+    size = max(1, -(-len(indices) // (workers * 4)))
+    return [list(indices[a:a + size]) for a in range(0, len(indices), size)]
+
+
+def _chunk_results(futures: list) -> Iterator[Tuple[bytes, Optional[tuple]]]:
+    for fut in futures:
+        results, spans = fut.result()
+        record(spans)
+        yield from results
+
+
+def rasterize_pages(pdf: Union[bytes, str], dpi: int, quality: int, workers: int = 1,
+                    pages: Optional[Sequence[int]] = None, doc_key: Optional[str] = None) -> Iterator[bytes]:
+    """
+    Devuelve, en orden, el JPEG de cada página del PDF (o sólo de `pages`, 0-based).
+    `pdf` son los bytes o la ruta del fichero; con una ruta los workers no
+    reciben una copia del PDF, lo abren ellos.
+    Con workers > 1 cada proceso abre el PDF una vez y renderiza trozos
+    disjuntos; el llamador recibe los resultados según se completan, en orden.
+    Con `doc_key` las páginas que ya están en RENDER_CACHE a ese DPI sólo se
+    codifican, y sólo las demás se reparten entre los workers.
+    """
+    doc = _open_source(pdf)
+    indices = list(range(doc.page_count)) if pages is None else list(pages)
+    use_cache = bool(doc_key) and RENDER_CACHE.max_bytes > 0
+    cached: Dict[int, tuple] = {}
+    if use_cache:
+        for i in indices:
+            found, entry = RENDER_CACHE.get(_render_key(doc_key, i, dpi))
+            if found:
+                cached[i] = entry
+    pending = [i for i in indices if i not in cached]
+    keep = _pages_to_keep(doc, pending, dpi) if use_cache else set()
+    workers = max(1, min(int(workers), len(pending) // MIN_PAGES_PER_WORKER))
+    if workers == 1:
+        try:
+            for i in indices:
+                if i in cached:
+                    pix = _unpack_pixmap(cached.pop(i))
+                else:
+                    pix = render_page(doc[i], dpi)
+                    if i in keep:
+                        RENDER_CACHE.put(_render_key(doc_key, i, dpi), _pack_pixmap(pix))
+                yield pixmap_to_bytes(pix, "JPEG", quality=quality)
+        finally:
+            doc.close()
+        return
+    doc.close()
+
+    # "spawn": el proceso de Streamlit tiene hilos vivos y fork no es seguro con MuPDF.
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(pdf,)) as pool:
+        futures = [pool.submit(_render_pages, chunk, dpi, quality, keep.intersection(chunk))
+                   for chunk in _page_chunks(pending, workers)]
+        try:
+            rendered = _chunk_results(futures)
+            for i in indices:
+                if i in cached:
+                    yield pixmap_to_bytes(_unpack_pixmap(cached.pop(i)), "JPEG", quality=quality)
+                    continue
+                img, entry = next(rendered)
+                if entry is not None:
+                    RENDER_CACHE.put(_render_key(doc_key, i, dpi), entry)
+                yield img
+        finally:
+            # Si el llamador deja de consumir (p.ej. trabajo cancelado), los
+            # trozos que aún no han empezado no llegan a renderizarse.
+            for fut in futures:
+                fut.cancel()
+
+
+def replace_page_with_image(doc: fitz.Document, page: fitz.Page, img_bytes: Optional[bytes], xref: int = 0) -> int:
+    """Sustituye el contenido de la página por una imagen a página completa.
+    La página recibe un stream de contenido nuevo y vacío y recursos propios
+    vacíos, así el guardado con garbage descarta los originales (si no, la
+    imagen se sumaría al contenido previo). Los streams viejos no se tocan:
+    otras páginas pueden compartirlos. Con `xref` se reutiliza una imagen ya
+    insertada (páginas duplicadas). Devuelve el xref de la imagen."""
+    with stage("insert", bytes_in=len(img_bytes or b""), pages=1):
+        contents = doc.get_new_xref()
+        doc.update_object(contents, "<<>>")
+        doc.update_stream(contents, b"")
+        page.set_contents(contents)
+        doc.xref_set_key(page.xref, "Resources", "<<>>")
+        if xref:
+            return page.insert_image(page.rect, xref=xref)
+        return page.insert_image(page.rect, stream=img_bytes)
+
+
+# ============== Estrategia híbrida por página ==============
+# Una página es "escaneo" si las imágenes cubren casi toda la página y apenas
+# hay texto o vectores encima; sólo esas se rasterizan.
+SCAN_MIN_COVERAGE = 0.85
+SCAN_MAX_TEXT_CHARS = 20
+SCAN_MAX_DRAWINGS = 10
+
+
+def classify_page(page: fitz.Page) -> Dict[str, object]:
+    """
+    Decide la estrategia de una página a partir de imágenes, texto y dibujos:
+    - "keep":   sin imágenes → texto/vectores se dejan tal cual.
+    - "raster": escaneo → se sustituye por un JPEG a página completa.
+    - "images": mixta → sólo se recomprimen sus imágenes embebidas.
+    """
+    images = page.get_images(full=True)
+    text_chars = len(page.get_text("text").strip())
+    drawings = len(page.get_cdrawings())
+    page_area = abs(page.rect) or 1.0
+    covered = 0.0
+    for info in images:
+        for rect in page.get_image_rects(info[0]):
+            covered += abs(rect & page.rect)
+    coverage = min(1.0, covered / page_area)
+
+    if not images:
+        strategy = "keep"
+    elif coverage >= SCAN_MIN_COVERAGE and text_chars <= SCAN_MAX_TEXT_CHARS and drawings <= SCAN_MAX_DRAWINGS:
+        strategy = "raster"
+    else:
+        strategy = "images"
+    return {
+        "page": page.number + 1,
+        "strategy": strategy,
+        "images": len(images),
+        "text_chars": text_chars,
+        "drawings": drawings,
+        "coverage": round(coverage, 2),
+    }
+
+
+def page_fingerprint(page: fitz.Page) -> str:
+    """
+    Huella de lo que se ve en la página: tamaño, rotación, content streams y
+    el contenido de sus imágenes, formularios y fuentes. Dos páginas con la
+    misma huella se renderizan igual (p.ej. en blanco o sólo con membrete).
+    """
+    doc = page.parent
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{tuple(page.rect)}|{page.rotation};".encode())
+    h.update(page.read_contents())
+    for info in page.get_images(full=True):
+        h.update(f";{info[7]}:".encode())
+        h.update(doc.xref_stream_raw(info[0]) or b"")
+        if info[1]:
+            h.update(doc.xref_stream_raw(info[1]) or b"")
+    for info in page.get_xobjects():
+        h.update(f";{info[1]}:".encode())
+        h.update(doc.xref_stream_raw(info[0]) or b"")
+    for info in page.get_fonts(full=True):
+        h.update(f";{info[4]}:{doc.xref_object(info[0], compressed=True)}".encode())
+    # Anotaciones y campos de formulario: get_pixmap los pinta en el ráster, así
+    # que dos páginas iguales con distinta anotación no son duplicadas.
+    for annot in [*page.annots(), *page.widgets()]:
+        _feed_annot(h, doc, annot.xref)
+    return h.hexdigest()
+
+
+# Referencias a otros objetos (/P, /Parent, /Popup...): cambian de una página a
+# otra aunque la anotación sea la misma, no forman parte de lo que se ve.
+_OBJ_REF = re.compile(r"\d+ \d+ R")
+
+
+def _feed_annot(h: "hashlib._Hash", doc: fitz.Document, xref: int) -> None:
+    h.update(b";annot:")
+    h.update(_OBJ_REF.sub("R", doc.xref_object(xref, compressed=True)).encode())
+    # Apariencia normal (/AP /N): es lo que se renderiza.
+    kind, value = doc.xref_get_key(xref, "AP/N")
+    if kind == "xref":
+        h.update(doc.xref_stream_raw(int(value.split()[0])) or b"")
@@ -0,0 +1,310 @@
+# conversion.py — Conversión de imágenes por lotes (todo en memoria)
+import io
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageOps
+
+from codificacion import pil_to_bytes
+from metricas import stage
+
+# Hilos para convertir imágenes. Los códecs de Pillow sueltan el GIL al
+# decodificar/codificar, así que los hilos sí aprovechan varios núcleos.
+IMAGE_THREADS = int(os.environ.get("PRINTPDF_IMAGE_THREADS", min(8, (os.cpu_count() or 1) + 2)))
+
+
+def output_name(name: str, fmt: str) -> str:
+    ext = "jpg" if fmt.upper() in ("JPG", "JPEG") else fmt.lower()
+    return f"{name.rsplit('.', 1)[0]}.{ext}"
+
+
+def convert_image(data: bytes, fmt: str, quality: int = 90) -> bytes:
+    with Image.open(io.BytesIO(data)) as img:
+        return pil_to_bytes(img.convert("RGB"), fmt, quality)
+
+
+def _run_one(func: Callable[[str, bytes], Tuple[str, bytes, Dict[str, object]]],
+             source: str, name: str, data: bytes) -> Dict[str, object]:
+    t0 = time.perf_counter()
+    result: Dict[str, object] = {"source": source, "name": name, "data": None, "error": None, "info": {}}
+    try:
+        result["name"], result["data"], result["info"] = func(name, data)
+    except Exception as exc:  # un archivo roto no aborta el lote
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    result["seconds"] = round(time.perf_counter() - t0, 3)
+    return result
+
+
+def process_batch(files: Iterable[Tuple[str, bytes]],
+                  func: Callable[[str, bytes], Tuple[str, bytes, Dict[str, object]]],
+                  workers: Optional[int] = None) -> Iterator[Dict[str, object]]:
+    """
+    Aplica `func(nombre, bytes) -> (nombre_salida, bytes, info)` en paralelo y
+    entrega cada resultado en cuanto termina:
+    {"source", "name", "data", "info", "seconds", "error"}. Como mucho hay
+    2×workers tareas en vuelo, para no tener todo el lote decodificado a la vez.
+    Los nombres repetidos se desambiguan con un sufijo _2, _3... en el orden
+    del lote (no en el de terminación), y cada nombre de salida se comprueba
+    contra los ya entregados: a.png, a.png, a_2.png no chocan.
+    """
+    workers = max(1, workers or IMAGE_THREADS)
+    inputs: Set[str] = set()
+    outputs: Set[str] = set()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for name, data in files:
+            pending.add(pool.submit(_run_one, func, name, _unique_name(name, inputs), data))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield _dedupe(fut.result(), outputs)
+        for fut in wait(pending).done:
+            yield _dedupe(fut.result(), outputs)
+
+
+def convert_batch(files: Iterable[Tuple[str, bytes]], fmt: str, quality: int = 90,
+                  workers: Optional[int] = None) -> Iterator[Dict[str, object]]:
+    """Convierte un lote de imágenes a `fmt` (ver process_batch)."""
+    return process_batch(files, lambda name, data: (output_name(name, fmt), convert_image(data, fmt, quality), {}), workers)
+
+
+def _unique_name(name: str, used: Set[str]) -> str:
+    """`name`, o el primer name_2, name_3... que no esté en `used`; lo apunta en `used`."""
+    stem, dot, ext = name.rpartition(".")
+    if not dot:
+        stem, ext = name, ""
+    candidate, n = name, 1
+    while candidate in used:
+        n += 1
+        candidate = f"{stem}_{n}{dot}{ext}"
+    used.add(candidate)
+    return candidate
+
+
+def _dedupe(result: Dict[str, object], used: Set[str]) -> Dict[str, object]:
+    # Entradas distintas pueden dar la misma salida (a.png y a.webp → a.jpg).
+    result["name"] = _unique_name(str(result["name"]), used)
+    return result
+
+
+# ============== Imágenes → PDF (una imagen en memoria cada vez) ==============
+PAGE_SIZES = ("auto", "A4", "Letter")
+# Orientación EXIF → giro (antihorario) que aplica insert_image sin re-codificar.
+_EXIF_ROTATE = {1: 0, 3: 180, 6: 270, 8: 90}
+
+
+def _fit(w: float, h: float, page: fitz.Rect) -> fitz.Rect:
+    """Rectángulo centrado en `page` con la proporción w:h."""
+    s = min(page.width / w, page.height / h)
+    x0 = page.x0 + (page.width - w * s) / 2
+    y0 = page.y0 + (page.height - h * s) / 2
+    return fitz.Rect(x0, y0, x0 + w * s, y0 + h * s)
+
+
+def add_image_page(doc: fitz.Document, data: bytes, page_size: str = "auto", dpi: int = 0, quality: int = 90) -> None:
+    """
+    Añade una página con la imagen. Con page_size "auto" la página mide lo
+    que la imagen a 72 DPI (como el PDF de Pillow); con "A4"/"Letter" la
+    imagen se encaja centrada y `dpi` (>0) limita su resolución efectiva.
+    Los JPEG/PNG que no hay que reducir se insertan tal cual, sin re-codificar.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        w, h = img.size
+        orientation = img.getexif().get(0x0112, 1)
+        if orientation in (5, 6, 7, 8):
+            w, h = h, w
+        if page_size == "auto":
+            page_rect = fitz.Rect(0, 0, w, h)
+        else:
+            page_rect = fitz.paper_rect(page_size.lower())
+            if (w > h) != (page_rect.width > page_rect.height):
+                page_rect = fitz.Rect(0, 0, page_rect.height, page_rect.width)
+        target = _fit(w, h, page_rect)
+        scale = 1.0
+        if dpi and page_size != "auto":
+            max_w = target.width / 72 * dpi
+            if w > max_w:
+                scale = max_w / w
+
+        rotate = _EXIF_ROTATE.get(orientation)
+        passthrough = (scale == 1.0 and rotate is not None and
+                       (img.format == "PNG" or (img.format == "JPEG" and img.mode in ("RGB", "L"))))
+        if passthrough:
+            stream = data
+        else:
+            size = (max(1, round(w * scale)), max(1, round(h * scale)))
+            if img.format == "JPEG" and scale < 1:
+                # Reducción en el dominio DCT (potencias de 2): decodifica mucho menos.
+                img.draft("RGB", size if orientation not in (5, 6, 7, 8) else size[::-1])
+            im = ImageOps.exif_transpose(img)
+            if im.mode not in ("RGB", "L"):
+                im = im.convert("RGB")
+            if im.size != size:
+                im = im.resize(size, Image.LANCZOS)
+            stream = pil_to_bytes(im, "PNG" if img.format == "PNG" else "JPEG", quality)
+            rotate = 0
+            del im
+
+    with stage("insert", bytes_in=len(stream), pages=1):
+        page = doc.new_page(width=page_rect.width, height=page_rect.height)
+        page.insert_image(target, stream=stream, rotate=rotate)
+
+
+def images_to_pdf(files: Iterable[Tuple[str, bytes]], page_size: str = "auto", dpi: int = 0, quality: int = 90) -> bytes:
+    """Construye el PDF imagen a imagen: el pico de memoria es ~una imagen."""
+    doc = fitz.open()
+    for _, data in files:
+        add_image_page(doc, data, page_size, dpi, quality)
+    out = io.BytesIO()
+    with stage("save", pages=doc.page_count) as span:
+        doc.save(out, garbage=3, deflate=True)
+        span.bytes_out = out.tell()
+    doc.close()
+    return out.getvalue()
+
+
+# ============== Redimensionar ==============
+def _encode_format(src_format: Optional[str]) -> str:
+    """Formato de salida por defecto: el mismo del original (si se sabe escribir)."""
+    return src_format if src_format in ("JPEG", "PNG", "WEBP") else "PNG"
+
+
+def _target_size(w: int, h: int, width: int, height: int, keep_ratio: bool) -> Tuple[int, int]:
+    """Tamaño final; con keep_ratio se encaja en width×height (0 = libre)."""
+    if not keep_ratio:
+        return max(1, width or w), max(1, height or h)
+    scales = [s for s in (width / w if width else 0, height / h if height else 0) if s]
+    s = min(scales) if scales else 1.0
+    return max(1, round(w * s)), max(1, round(h * s))
+
+
+def _downscale(img: Image.Image, size: Tuple[int, int]) -> Image.Image:
+    """Reducción rápida por enteros con `reduce` hasta ~2× el destino y
+    remuestreo final de calidad (LANCZOS) para llegar al tamaño exacto."""
+    factor = int(min(img.width / size[0], img.height / size[1]) / 2)
+    if factor >= 2:
+        img = img.reduce(factor)
+    if img.size != size:
+        img = img.resize(size, Image.LANCZOS)
+    return img
+
+
+def _open_for_size(data: bytes, size_hint: Optional[Tuple[int, int]] = None) -> Tuple[Image.Image, Optional[str]]:
+    """
+    Abre la imagen ya girada según EXIF. Si es JPEG y se va a reducir a
+    `size_hint`, `draft` decodifica directamente a 1/2, 1/4 u 1/8 (DCT).
+    """
+    img = Image.open(io.BytesIO(data))
+    src_format = img.format
+    if size_hint and src_format == "JPEG":
+        hint = size_hint
+        if img.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+            hint = hint[::-1]
+        img.draft(img.mode if img.mode in ("RGB", "L") else "RGB", hint)
+    return ImageOps.exif_transpose(img), src_format
+
+
+def _for_format(img: Image.Image, fmt: str) -> Image.Image:
+    if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+        return img.convert("RGB")
+    if fmt in ("PNG", "WEBP") and img.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+        return img.convert("RGB")
+    return img
+
+
+def resize_image(data: bytes, width: int, height: int, keep_ratio: bool = True,
+                 fmt: Optional[str] = None, quality: int = 90) -> Tuple[bytes, str, Dict[str, object]]:
+    """Redimensiona a width×height (0 = libre). Devuelve (bytes, formato, info)."""
+    with Image.open(io.BytesIO(data)) as probe:
+        w, h = probe.size
+        if probe.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+            w, h = h, w
+    size = _target_size(w, h, width, height, keep_ratio)
+    img, src_format = _open_for_size(data, size if size[0] < w and size[1] < h else None)
+    out_fmt = (fmt or _encode_format(src_format)).upper().replace("JPG", "JPEG")
+    img = _downscale(img, size) if size[0] <= img.width and size[1] <= img.height else img.resize(size, Image.LANCZOS)
+    out = pil_to_bytes(_for_format(img, out_fmt), out_fmt, quality)
+    return out, out_fmt, {"width": size[0], "height": size[1], "kb": round(len(out) / 1024, 1)}
+
+
+def resize_batch(files: Iterable[Tuple[str, bytes]], width: int, height: int, keep_ratio: bool = True,
+                 fmt: Optional[str] = None, quality: int = 90, workers: Optional[int] = None) -> Iterator[Dict[str, object]]:
+    def one(name: str, data: bytes):
+        out, out_fmt, info = resize_image(data, width, height, keep_ratio, fmt, quality)
+        return output_name(name, out_fmt), out, info
+    return process_batch(files, one, workers)
+
+
+# ============== Comprimir a un tamaño objetivo ==============
+# La búsqueda se hace sobre un "proxy" reducido: el peso del resultado escala
+# aproximadamente con el nº de píxeles, así que se extrapola al tamaño real.
+PROXY_MAX_SIDE = 1024
+MIN_QUALITY = 20
+MAX_QUALITY = 95
+MAX_FINAL_TRIES = 4
+
+
+def _search_quality(img: Image.Image, fmt: str, budget: float) -> Tuple[int, float]:
+    """Mayor calidad cuyo peso estimado (bytes del proxy × ratio de píxeles)
+    cabe en `budget`. Devuelve (calidad, peso estimado); si ni MIN_QUALITY
+    cabe, devuelve MIN_QUALITY y su estimación (> budget)."""
+    proxy = img
+    if max(img.size) > PROXY_MAX_SIDE:
+        s = PROXY_MAX_SIDE / max(img.size)
+        proxy = _downscale(img, (max(1, round(img.width * s)), max(1, round(img.height * s))))
+    ratio = (img.width * img.height) / (proxy.width * proxy.height)
+
+    def estimate(q: int) -> float:
+        return len(pil_to_bytes(proxy, fmt, q)) * ratio
+
+    lo, hi = MIN_QUALITY, MAX_QUALITY
+    best, best_est = MIN_QUALITY, None
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        est = estimate(mid)
+        if est <= budget:
+            best, best_est, lo = mid, est, mid + 1
+        else:
+            hi = mid - 1
+    if best_est is None:
+        best_est = estimate(MIN_QUALITY)
+    return best, best_est
+
+
+def compress_to_size(data: bytes, target_kb: int, fmt: str = "JPEG") -> Tuple[bytes, str, Dict[str, object]]:
+    """
+    Comprime para no pasar de `target_kb`: busca la calidad (búsqueda binaria
+    sobre el proxy) y, si ni con la mínima cabe, reduce también las dimensiones.
+    Tras cada codificación a tamaño real se corrige la estimación del proxy
+    con el peso obtenido (el proxy suaviza ruido y suele quedarse corto).
+    """
+    fmt = fmt.upper().replace("JPG", "JPEG")
+    budget = target_kb * 1024
+    img, _ = _open_for_size(data)
+    img = _for_format(img, fmt)
+
+    search_budget = float(budget)
+    for _ in range(MAX_FINAL_TRIES):
+        quality, est = _search_quality(img, fmt, search_budget)
+        if est > search_budget:
+            # Los bytes escalan ~ con el área: reducir lados en sqrt(budget/est).
+            s = min(1.0, (search_budget / est) ** 0.5 * 0.95)
+            img = _downscale(img, (max(1, round(img.width * s)), max(1, round(img.height * s))))
+            quality, est = _search_quality(img, fmt, search_budget)
+        out = pil_to_bytes(img, fmt, quality)
+        if len(out) <= budget:
+            break
+        search_budget = budget * est / len(out) * 0.97
+    return out, fmt, {"quality": quality, "width": img.width, "height": img.height,
+                      "kb": round(len(out) / 1024, 1), "fits": len(out) <= budget}
+
+
+def compress_batch(files: Iterable[Tuple[str, bytes]], target_kb: int, fmt: str = "JPEG",
+                   workers: Optional[int] = None) -> Iterator[Dict[str, object]]:
+    def one(name: str, data: bytes):
+        out, out_fmt, info = compress_to_size(data, target_kb, fmt)
+        return output_name(name, out_fmt), out, info
+    return process_batch(files, one, workers)
@@ -0,0 +1,265 @@
+# ficheros.py — E/S de subidas: en memoria por debajo de un umbral, volcadas a un temporal por encima
+#
+# Un PDF grande se vuelca a disco una vez y PyMuPDF lo abre por nombre: lee
+# del fichero según lo necesita en vez de trabajar sobre una copia en memoria,
+# y los procesos de rasterizado reciben la ruta en lugar de todo el PDF.
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Union
+
+import fitz  # PyMuPDF
+
+from cache_resultados import content_hash
+
+# ============== Configuración ==============
+# Subidas de más de SPOOL_MB se vuelcan a un temporal (0 = siempre).
+SPOOL_MB = int(os.environ.get("PRINTPDF_SPOOL_MB", "32"))
+# Directorio de los temporales (por defecto, el del sistema).
+SPOOL_DIR = os.environ.get("PRINTPDF_SPOOL_DIR") or None
+COPY_CHUNK = 1024 * 1024
+# Subidas distintas que una sesión mantiene abiertas a la vez.
+MAX_SOURCES_PER_SESSION = 8
+
+
+def file_digest(path: str) -> str:
+    """Hash del contenido de un fichero, leído por trozos."""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(COPY_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class PdfSource:
+    """
+    Un PDF de entrada, en memoria (`data`) o en un fichero (`path`).
+    Su repr es el hash del contenido, así cached_result lo identifica por
+    contenido igual que a unos bytes (ver cache_resultados._feed).
+    """
+
+    def __init__(self, name: str, size: int, digest: str, data: Optional[bytes] = None, path: Optional[str] = None):
+        self.name = name
+        self.size = size
+        self.digest = digest
+        self.data = data
+        self.path = path
+
+    @classmethod
+    def from_bytes(cls, data: bytes, name: str = "") -> "PdfSource":
+        return cls(name, len(data), content_hash(data), data=data)
+
+    @classmethod
+    def from_path(cls, path: str, name: str = "") -> "PdfSource":
+        """Fichero ya en disco (p.ej. el temporal de una petición de api.py)."""
+        return cls(name or os.path.basename(path), os.path.getsize(path), file_digest(path), path=path)
+
+    def open(self) -> fitz.Document:
+        if self.path is not None:
+            return fitz.open(self.path, filetype="pdf")
+        return fitz.open(stream=self.data, filetype="pdf")
+
+    def for_workers(self) -> Union[bytes, str]:
+        """Lo que se pasa a otro proceso: la ruta si la hay (no viaja el PDF)."""
+        return self.path if self.path is not None else self.data
+
+    def getvalue(self) -> bytes:
+        """Todo el contenido en memoria; evitarlo con PDFs volcados a disco."""
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as fh:
+            return fh.read()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __repr__(self) -> str:
+        return f"PdfSource({self.digest})"
+
+
+# Lo que aceptan las funciones de nucleo.py como PDF de entrada.
+PdfInput = Union[bytes, io.BytesIO, PdfSource]
+
+
+def open_pdf(src: PdfInput) -> fitz.Document:
+    if isinstance(src, PdfSource):
+        return src.open()
+    if isinstance(src, io.BytesIO):
+        # getvalue() de un BytesIO creado desde bytes devuelve ese mismo objeto, sin copia.
+        src = src.getvalue()
+    return fitz.open(stream=src, filetype="pdf")
+
+
+def input_size(src: PdfInput) -> int:
+    return src.getbuffer().nbytes if isinstance(src, io.BytesIO) else len(src)
+
+
+def input_digest(src: PdfInput) -> str:
+    """Hash del contenido; el de un PdfSource ya está calculado."""
+    return src.digest if isinstance(src, PdfSource) else content_hash(src)
+
+
+def worker_input(src: PdfInput) -> Union[bytes, str]:
+    """Bytes o ruta para compresion.rasterize_pages."""
+    if isinstance(src, PdfSource):
+        return src.for_workers()
+    return src.getvalue() if isinstance(src, io.BytesIO) else src
+
+
+def _remove(paths: List[str]) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    del paths[:]
+
+
+def _close(docs: list) -> None:
+    for _, doc in docs:
+        doc.close()
+    del docs[:]
+
+
+def _release_session(docs: list, paths: List[str]) -> None:
+    # Primero los documentos: pueden estar leyendo de los temporales.
+    _close(docs)
+    _remove(paths)
+
+
+class SessionFiles:
+    """
+    Subidas de una sesión de Streamlit. Se guarda en st.session_state; al
+    descartarse la sesión el objeto se libera y weakref.finalize borra sus
+    temporales (y, si el proceso termina antes, al salir).
+    Un trabajo en cola (trabajos.JOBS) que lee un temporal lo fija con pin():
+    mientras tanto ni el LRU ni cleanup() lo borran. document() guarda además
+    un fitz.Document abierto, que se cierra con la sesión.
+    """
+
+    def __init__(self, threshold_mb: int = SPOOL_MB):
+        self.threshold = threshold_mb * 1024 * 1024
+        self._sources: "OrderedDict[Any, PdfSource]" = OrderedDict()
+        self._paths: List[str] = []
+        # Temporales fijados por trabajos (ruta → nº de trabajos) y los ya
+        # descartados de la sesión que se borrarán al soltar el último.
+        self._pins: Dict[str, int] = {}
+        self._evicted: Set[str] = set()
+        # [(hash, documento)]: como mucho uno; lista para que el finalizer la cierre.
+        self._docs: list = []
+        self._lock = threading.Lock()
+        self._finalizer = weakref.finalize(self, _release_session, self._docs, self._paths)
+
+    def source(self, file) -> PdfSource:
+        """
+        PdfSource de una subida (UploadedFile o BytesIO). Se reutiliza entre
+        reruns: la misma subida no se vuelve a volcar ni a hashear.
+        """
+        return self.sources([file])[0]
+
+    def sources(self, files: List[Any]) -> List[PdfSource]:
+        """Como source() para varias subidas que se usan juntas (p.ej. unir):
+        ninguna de ellas se descarta aunque pasen de MAX_SOURCES_PER_SESSION."""
+        with self._lock:
+            result = []
+            for file in files:
+                key = getattr(file, "file_id", None) or (getattr(file, "name", ""), content_hash(file))
+                src = self._sources.get(key)
+                if src is None:
+                    src = self._spool(file)
+                    self._sources[key] = src
+                self._sources.move_to_end(key)
+                result.append(src)
+            while len(self._sources) > max(MAX_SOURCES_PER_SESSION, len(files)):
+                _, old = self._sources.popitem(last=False)
+                if old.path is not None:
+                    self._discard(old.path)
+            return result
+
+    def document(self, file) -> fitz.Document:
+        """
+        Documento abierto de una subida, reutilizado entre reruns (contar
+        páginas, validar rangos y extraer usan el mismo). Uno por sesión:
+        abrir otro, close_document(), cleanup() o el fin de la sesión lo cierran.
+        """
+        src = self.source(file)
+        with self._lock:
+            if self._docs and self._docs[0][0] == src.digest:
+                return self._docs[0][1]
+            _close(self._docs)
+            doc = src.open()
+            self._docs.append((src.digest, doc))
+            return doc
+
+    def close_document(self) -> None:
+        """Cierra el documento de document() (p.ej. al vaciar el uploader)."""
+        with self._lock:
+            _close(self._docs)
+
+    def pin(self, sources: List[PdfSource]) -> Callable[[], None]:
+        """
+        Fija los temporales de `sources` mientras un trabajo los usa y
+        devuelve la función que los suelta (para JOBS.submit(on_finish=...)).
+        La función mantiene viva la sesión, así weakref.finalize tampoco
+        borra nada antes de que termine el trabajo.
+        """
+        paths = [s.path for s in sources if s.path is not None]
+        with self._lock:
+            for path in paths:
+                self._pins[path] = self._pins.get(path, 0) + 1
+        released = threading.Event()
+
+        def release() -> None:
+            if released.is_set():
+                return
+            released.set()
+            with self._lock:
+                for path in paths:
+                    self._pins[path] -= 1
+                    if not self._pins[path]:
+                        del self._pins[path]
+                        if path in self._evicted:
+                            self._discard(path)
+        return release
+
+    def _discard(self, path: str) -> None:
+        """Borra un temporal que la sesión ya no usa, o lo aplaza si está fijado (llamar con el lock)."""
+        if path in self._pins:
+            self._evicted.add(path)
+            return
+        self._evicted.discard(path)
+        if path in self._paths:
+            self._paths.remove(path)
+            _remove([path])
+
+    def _spool(self, file) -> PdfSource:
+        name = getattr(file, "name", "") or ""
+        size = input_size(file)
+        if size <= self.threshold:
+            return PdfSource.from_bytes(file.getvalue(), name)
+        fd, path = tempfile.mkstemp(suffix=".pdf", prefix="printpdf_up_", dir=SPOOL_DIR)
+        self._paths.append(path)
+        h = hashlib.blake2b(digest_size=20)
+        # Copia por trozos desde el buffer de la subida: nunca un segundo PDF entero en memoria.
+        view = file.getbuffer()
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                for start in range(0, size, COPY_CHUNK):
+                    chunk = view[start:start + COPY_CHUNK]
+                    h.update(chunk)
+                    fh.write(chunk)
+        finally:
+            view.release()
+        return PdfSource(name, size, h.hexdigest(), path=path)
+
+    def cleanup(self) -> None:
+        """Cierra el documento y borra ya todos los temporales de la sesión (los fijados, al soltarlos)."""
+        with self._lock:
+            _close(self._docs)
+            self._sources.clear()
+            for path in list(self._paths):
+                self._discard(path)
@@ -0,0 +1,415 @@
+# lotes.py — Modo por lotes desde la línea de órdenes: directorios enteros con un pool de procesos
+#
+# Uso:  python lotes.py compress        ENTRADA [ENTRADA...] -o SALIDA [--quality 60]
+#       python lotes.py compress-pages  ENTRADA... -o SALIDA [--dpi 150] [--quality 85]
+#       python lotes.py to-images       ENTRADA... -o SALIDA [--format PNG] [--dpi 144] [--quality 90] [--ranges 1-3]
+#       python lotes.py split           ENTRADA... -o SALIDA --ranges "1-3;4-"
+#       python lotes.py merge           ENTRADA... -o SALIDA      (un PDF por directorio, por orden de nombre)
+#       python lotes.py convert         ENTRADA... -o SALIDA [--format JPG] [--quality 90]   (imágenes)
+#     + [--workers N] [--force] [--quiet]
+#
+# - ENTRADA son directorios (se recorren enteros) o ficheros sueltos; la
+#   salida replica la estructura relativa de cada entrada dentro de SALIDA.
+# - Reparto: las tareas se encolan de mayor a menor tamaño y cada proceso
+#   toma la siguiente en cuanto queda libre; los ficheros grandes empiezan
+#   primero y no dejan a los demás procesos parados al final del lote.
+# - Reanudable: SALIDA/printpdf_manifest.json guarda, por entrada, el hash de
+#   su contenido, los parámetros y las salidas. Lo que ya está al día se salta
+#   (--force lo rehace todo). Se guarda cada pocos segundos y al interrumpir.
+# - Al acabar se escribe SALIDA/printpdf_summary.json: ritmo, fallos y ahorro.
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+import nucleo
+from cache_resultados import RENDER_CACHE, content_hash, make_key
+from conversion import _unique_name, convert_image, output_name
+from ficheros import PdfSource, file_digest
+from paginas import parse_ranges, split_groups
+
+# ============== Configuración ==============
+# Procesos del pool (por defecto, uno por núcleo).
+BATCH_WORKERS = int(os.environ.get("PRINTPDF_BATCH_WORKERS", os.cpu_count() or 1))
+MANIFEST_NAME = "printpdf_manifest.json"
+SUMMARY_NAME = "printpdf_summary.json"
+# Cada cuánto (s) se vuelca el manifiesto durante el lote.
+MANIFEST_SAVE_SECONDS = 10
+PDF_EXTENSIONS = (".pdf",)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff", ".gif")
+
+
+# ============== Operaciones (se ejecutan en los procesos del pool) ==============
+# Cada una recibe las entradas, la ruta base de la salida (sin extensión) y
+# los parámetros; escribe sus ficheros y devuelve (rutas escritas, páginas).
+# Las funciones con caché de resultados se llaman por __wrapped__: en un lote
+# cada fichero se procesa una vez y la caché sólo ocuparía memoria.
+@contextmanager
+def _atomic(path: str) -> Iterator[IO[bytes]]:
+    # Escritura atómica: un lote interrumpido nunca deja una salida a medias
+    # que la siguiente ejecución diera por buena.
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            yield fh
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _write(path: str, data: bytes) -> str:
+    with _atomic(path) as fh:
+        fh.write(data)
+    return path
+
+
+def _pages(src: PdfSource, ranges: str) -> Optional[List[int]]:
+    if not ranges.strip():
+        return None
+    with src.open() as doc:
+        pages = parse_ranges(ranges, doc.page_count)
+    if not pages:
+        raise ValueError("ranges no selecciona ninguna página")
+    return pages
+
+
+def job_compress(srcs: List[PdfSource], stem: str, params: Dict[str, Any]) -> Tuple[List[str], int]:
+    out, _ = nucleo.compress_pdf.__wrapped__(srcs[0], params["quality"])
+    with srcs[0].open() as doc:
+        pages = doc.page_count
+    return [_write(stem + ".pdf", out)], pages
+
+
+def job_compress_pages(srcs: List[PdfSource], stem: str, params: Dict[str, Any]) -> Tuple[List[str], int]:
+    out, report = nucleo.pdf_compress.__wrapped__(srcs[0], dpi=params["dpi"], quality=params["quality"],
+                                                  pages=_pages(srcs[0], params["ranges"]))
+    return [_write(stem + ".pdf", out)], len(report)
+
+
+def job_to_images(srcs: List[PdfSource], stem: str, params: Dict[str, Any]) -> Tuple[List[str], int]:
+    # El generador de pdf_to_images: una página en memoria cada vez, directa al ZIP.
+    images = nucleo.iter_pdf_images(srcs[0], params["format"], params["dpi"],
+                                    _pages(srcs[0], params["ranges"]), params["quality"])
+    count = [0]
+    with _atomic(stem + ".zip") as fh:
+        nucleo.write_zip(images, on_progress=lambda n: count.__setitem__(0, n), out=fh)
+    return [stem + ".zip"], count[0]
+
+
+def job_split(srcs: List[PdfSource], stem: str, params: Dict[str, Any]) -> Tuple[List[str], int]:
+    with srcs[0].open() as doc:
+        groups = split_groups(params["ranges"], doc.page_count)
+    if not groups:
+        raise ValueError("ranges no selecciona ninguna página")
+    outputs = [_write(f"{stem}_{k}.pdf", nucleo.pdf_split(srcs[0], g)) for k, g in enumerate(groups, start=1)]
+    return outputs, sum(len(g) for g in groups)
+
+
+def job_merge(srcs: List[PdfSource], stem: str, params: Dict[str, Any]) -> Tuple[List[str], int]:
+    out = nucleo.pdf_merge.__wrapped__(srcs)
+    with fitz.open(stream=out, filetype="pdf") as doc:
+        pages = doc.page_count
+    return [_write(stem + ".pdf", out)], pages
+
+
+def job_convert(srcs: List[PdfSource], stem: str, params: Dict[str, Any]) -> Tuple[List[str], int]:
+    # convert_image → codificacion.pil_to_bytes, como en la app.
+    # Aquí `stem` conserva la extensión original: output_name la cambia por la del formato.
+    out = convert_image(srcs[0].getvalue(), params["format"], params["quality"])
+    return [_write(output_name(stem, params["format"]), out)], 1
+
+
+# operación → (función, extensiones de entrada, parámetros que usa)
+OPERATIONS: Dict[str, Tuple[Callable[..., Tuple[List[str], int]], Tuple[str, ...], Tuple[str, ...]]] = {
+    "compress": (job_compress, PDF_EXTENSIONS, ("quality",)),
+    "compress-pages": (job_compress_pages, PDF_EXTENSIONS, ("dpi", "quality", "ranges")),
+    "to-images": (job_to_images, PDF_EXTENSIONS, ("format", "dpi", "quality", "ranges")),
+    "split": (job_split, PDF_EXTENSIONS, ("ranges",)),
+    "merge": (job_merge, PDF_EXTENSIONS, ()),
+    "convert": (job_convert, IMAGE_EXTENSIONS, ("format", "quality")),
+}
+
+
+def _init_worker() -> None:
+    # Cada página se renderiza una sola vez en un lote: la caché de render sólo ocuparía memoria.
+    RENDER_CACHE.max_bytes = 0
+
+
+def run_task(op: str, task: Dict[str, Any], params: Dict[str, Any],
+             expected: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Procesa una tarea (un fichero, o un directorio en merge). Si `expected`
+    (su entrada del manifiesto) tiene el mismo hash y sus salidas existen,
+    no hace nada. Nunca lanza: un fichero roto no aborta el lote.
+    """
+    t0 = time.perf_counter()
+    result: Dict[str, Any] = {"key": task["key"], "status": "failed", "hash": None, "outputs": [],
+                              "bytes_in": task["size"], "bytes_out": 0, "pages": 0, "error": None}
+    try:
+        digests = [file_digest(path) for path in task["inputs"]]
+        result["hash"] = digests[0] if len(digests) == 1 else content_hash(digests)
+        if (expected is not None and expected.get("hash") == result["hash"]
+                and all(os.path.exists(os.path.join(task["out_dir"], o)) for o in expected["outputs"])):
+            result.update(status="skipped", outputs=expected["outputs"], bytes_out=expected["bytes_out"],
+                          pages=expected["pages"])
+        else:
+            srcs = [PdfSource(os.path.basename(path), os.path.getsize(path), digest, path=path)
+                    for path, digest in zip(task["inputs"], digests)]
+            outputs, pages = OPERATIONS[op][0](srcs, os.path.join(task["out_dir"], task["stem"]), params)
+            result.update(status="ok", pages=pages,
+                          outputs=[os.path.relpath(o, task["out_dir"]) for o in outputs],
+                          bytes_out=sum(os.path.getsize(o) for o in outputs))
+    except Exception as exc:
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    result["seconds"] = round(time.perf_counter() - t0, 3)
+    return result
+
+
+# ============== Descubrimiento de tareas ==============
+def _inside(path: str, directory: str) -> bool:
+    path, directory = os.path.abspath(path), os.path.abspath(directory)
+    return path == directory or path.startswith(directory + os.sep)
+
+
+def _walk(root: str, extensions: Tuple[str, ...], skip: str) -> Dict[str, List[str]]:
+    """Directorio → ficheros con esas extensiones (ordenados por nombre);
+    sin bajar a `skip` (la salida puede estar dentro de la entrada)."""
+    found: Dict[str, List[str]] = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not _inside(os.path.join(dirpath, d), skip))
+        files = sorted(f for f in filenames if f.lower().endswith(extensions))
+        if files:
+            found[dirpath] = [os.path.join(dirpath, f) for f in files]
+    return found
+
+
+def discover(op: str, inputs: List[str], out_dir: str) -> List[Dict[str, Any]]:
+    """
+    Tareas del lote: {"key", "inputs", "stem", "size", "out_dir"}. `key` es la
+    ruta relativa de la entrada (con el nombre de la raíz delante si hay
+    varias) y también la base de sus salidas dentro de `out_dir`.
+    """
+    extensions = OPERATIONS[op][1]
+    tasks = []
+    for root in inputs:
+        prefix = os.path.basename(os.path.normpath(root)) if len(inputs) > 1 else ""
+        if os.path.isfile(root):
+            groups = {os.path.dirname(root): [root]}
+            base = os.path.dirname(root)
+        else:
+            groups = _walk(root, extensions, out_dir)
+            base = root
+        for directory, files in groups.items():
+            if op == "merge":
+                rel = os.path.relpath(directory, base)
+                rel = os.path.basename(os.path.abspath(directory)) if rel == "." else rel
+                units = [(os.path.join(prefix, rel), files)]
+            else:
+                units = [(os.path.join(prefix, os.path.relpath(f, base)), [f]) for f in files]
+            for key, paths in units:
+                stem = key if op in ("merge", "convert") else os.path.splitext(key)[0]
+                tasks.append({"key": key, "inputs": paths, "stem": stem, "out_dir": out_dir,
+                              "size": sum(os.path.getsize(p) for p in paths)})
+    # De mayor a menor: el pool reparte según quedan libres los procesos.
+    tasks.sort(key=lambda t: t["size"], reverse=True)
+    return tasks
+
+
+def unique_stems(op: str, tasks: List[Dict[str, Any]], params: Dict[str, Any]) -> None:
+    """
+    Entradas que darían la misma salida (photo.png y photo.jpeg → photo.jpg al
+    convertir; a.pdf y a.PDF → a.pdf) reciben un sufijo _2, _3... Se asignan
+    por orden de ruta, no de ejecución: la misma entrada da siempre la misma salida.
+    """
+    used: set = set()
+    for task in sorted(tasks, key=lambda t: t["key"]):
+        if op == "convert":
+            task["stem"] = _unique_name(output_name(task["stem"], params["format"]), used)
+            continue
+        stem, n = task["stem"], 1
+        while stem in used:
+            n += 1
+            stem = f"{task['stem']}_{n}"
+        used.add(stem)
+        task["stem"] = stem
+
+
+# ============== Manifiesto y resumen ==============
+def load_manifest(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        return {"entries": {}}
+    return data if isinstance(data.get("entries"), dict) else {"entries": {}}
+
+
+def save_manifest(path: str, manifest: Dict[str, Any]) -> None:
+    _write(path, json.dumps(manifest, indent=1, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+
+
+def summarize(op: str, params: Dict[str, Any], workers: int, results: List[Dict[str, Any]],
+              total: int, seconds: float) -> Dict[str, Any]:
+    done = [r for r in results if r["status"] == "ok"]
+    failed = [r for r in results if r["status"] == "failed"]
+    bytes_in = sum(r["bytes_in"] for r in done)
+    bytes_out = sum(r["bytes_out"] for r in done)
+    busy = sum(r["seconds"] for r in done)
+    return {
+        "op": op,
+        "params": params,
+        "workers": workers,
+        "tasks": total,
+        "processed": len(done),
+        "skipped": sum(1 for r in results if r["status"] == "skipped"),
+        "failed": len(failed),
+        "pending": total - len(results),
+        "failures": [{"input": r["key"], "error": r["error"]} for r in failed],
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "saved_bytes": bytes_in - bytes_out,
+        "saved_ratio": round(1 - bytes_out / bytes_in, 4) if bytes_in else 0.0,
+        "pages": sum(r["pages"] for r in done),
+        "seconds": round(seconds, 3),
+        "files_per_second": round(len(done) / seconds, 3) if seconds else 0.0,
+        "mb_per_second": round(bytes_in / 1024 / 1024 / seconds, 3) if seconds else 0.0,
+        "pages_per_second": round(sum(r["pages"] for r in done) / seconds, 3) if seconds else 0.0,
+        # Tiempo de proceso sumado / (pared × procesos): 1.0 = todos ocupados todo el rato.
+        "utilization": round(busy / (seconds * workers), 3) if seconds else 0.0,
+    }
+
+
+def _mb(n: int) -> str:
+    return f"{n / 1024 / 1024:.1f} MB"
+
+
+# ============== Ejecución ==============
+def run_batch(op: str, inputs: List[str], out_dir: str, params: Dict[str, Any], workers: int = BATCH_WORKERS,
+              force: bool = False, on_result: Optional[Callable[[int, int, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Ejecuta `op` sobre todas las entradas y devuelve el resumen (también en
+    out_dir/SUMMARY_NAME). on_result(hechas, total, resultado) tras cada tarea.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    entries = manifest["entries"]
+    params_key = make_key(op, params)
+    tasks = discover(op, inputs, out_dir)
+    unique_stems(op, tasks, params)
+    workers = max(1, min(workers, len(tasks)))
+
+    def expected(task: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        entry = entries.get(task["key"])
+        return entry if entry is not None and not force and entry.get("params") == params_key else None
+
+    results: List[Dict[str, Any]] = []
+    last_save = time.monotonic()
+
+    def collect(result: Dict[str, Any]) -> None:
+        nonlocal last_save
+        results.append(result)
+        if result["status"] == "ok":
+            entries[result["key"]] = {"hash": result["hash"], "params": params_key, "outputs": result["outputs"],
+                                      "bytes_in": result["bytes_in"], "bytes_out": result["bytes_out"],
+                                      "pages": result["pages"]}
+        if time.monotonic() - last_save >= MANIFEST_SAVE_SECONDS:
+            save_manifest(manifest_path, manifest)
+            last_save = time.monotonic()
+        if on_result:
+            on_result(len(results), len(tasks), result)
+
+    t0 = time.perf_counter()
+    try:
+        if workers == 1:
+            _init_worker()
+            for task in tasks:
+                collect(run_task(op, task, params, expected(task)))
+        else:
+            # "spawn", como en compresion.py: MuPDF no es seguro tras un fork con hilos vivos.
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker) as pool:
+                # Todas encoladas de una vez y en orden de tamaño: cada proceso
+                # toma la siguiente al terminar la suya.
+                futures = {pool.submit(run_task, op, task, params, expected(task)): task for task in tasks}
+                try:
+                    for fut in as_completed(futures):
+                        try:
+                            collect(fut.result())
+                        except Exception as exc:  # el proceso murió (p.ej. sin memoria)
+                            task = futures[fut]
+                            collect({"key": task["key"], "status": "failed", "hash": None, "outputs": [],
+                                     "bytes_in": task["size"], "bytes_out": 0, "pages": 0, "seconds": 0.0,
+                                     "error": f"{type(exc).__name__}: {exc}"})
+                finally:
+                    for fut in futures:
+                        fut.cancel()
+    finally:
+        # También al interrumpir (Ctrl+C): lo hecho hasta aquí no se repite.
+        save_manifest(manifest_path, manifest)
+        summary = summarize(op, params, workers, results, len(tasks), time.perf_counter() - t0)
+        _write(os.path.join(out_dir, SUMMARY_NAME),
+               json.dumps(summary, indent=2, ensure_ascii=False).encode("utf-8"))
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Procesa directorios enteros de PDFs o imágenes en paralelo.")
+    parser.add_argument("op", choices=sorted(OPERATIONS))
+    parser.add_argument("inputs", nargs="+", help="directorios o ficheros de entrada")
+    parser.add_argument("-o", "--output", required=True, help="directorio de salida")
+    parser.add_argument("--quality", type=int, help="calidad (compress: 60, compress-pages: 85, resto: 90)")
+    parser.add_argument("--dpi", type=int, help="DPI (compress-pages: 150, to-images: 144)")
+    parser.add_argument("--format", help="to-images: PNG/JPG/WEBP (PNG); convert: JPG/PNG/WEBP (JPG)")
+    parser.add_argument("--ranges", default="", help='páginas, p.ej. "1-3,6" (split: "1-3;4-")')
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="procesos (por defecto, uno por núcleo)")
+    parser.add_argument("--force", action="store_true", help="rehacer también lo que ya está al día")
+    parser.add_argument("--quiet", action="store_true", help="sin una línea por fichero")
+    args = parser.parse_args()
+
+    if args.op == "split" and not args.ranges.strip():
+        parser.error('split necesita --ranges (p.ej. "1-3;4-")')
+    defaults = {"quality": {"compress": 60, "compress-pages": 85}.get(args.op, 90),
+                "dpi": {"compress-pages": 150}.get(args.op, 144),
+                "format": "PNG" if args.op == "to-images" else "JPG"}
+    given = {"quality": args.quality, "dpi": args.dpi, "format": args.format and args.format.upper(),
+             "ranges": args.ranges}
+    params = {name: given[name] if given[name] is not None else defaults.get(name)
+              for name in OPERATIONS[args.op][2]}
+
+    def progress(n: int, total: int, r: Dict[str, Any]) -> None:
+        if args.quiet and r["status"] != "failed":
+            return
+        detail = r["error"] if r["status"] == "failed" else f"{_mb(r['bytes_in'])} → {_mb(r['bytes_out'])}"
+        print(f"[{n}/{total}] {r['status']:<7} {r['seconds']:>7.2f}s  {r['key']}  {detail}", file=sys.stderr)
+
+    try:
+        s = run_batch(args.op, args.inputs, args.output, params, args.workers, args.force, progress)
+    except KeyboardInterrupt:
+        print("interrumpido: el manifiesto está guardado, la próxima ejecución sigue donde se quedó",
+              file=sys.stderr)
+        sys.exit(130)
+    print(f"{s['processed']} procesados, {s['skipped']} al día, {s['failed']} fallidos de {s['tasks']} "
+          f"en {s['seconds']:.1f}s ({s['workers']} procesos, ocupación {s['utilization']:.0%})")
+    print(f"{s['files_per_second']:.2f} ficheros/s • {s['mb_per_second']:.2f} MB/s • {s['pages_per_second']:.1f} pág/s • "
+          f"{_mb(s['bytes_in'])} → {_mb(s['bytes_out'])} (ahorro {s['saved_ratio']:.1%})")
+    for f in s["failures"]:
+        print(f"  ✗ {f['input']}: {f['error']}")
+    sys.exit(1 if s["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
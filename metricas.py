@@ -0,0 +1,288 @@
+# metricas.py — Trazas por etapa (parse/render/encode/insert/save) y métricas en formato Prometheus
+#
+# Uso en el código de procesado:
+#     with stage("save") as span:
+#         doc.save(out, ...)
+#         span.bytes_out = out.tell()
+#
+# Cada etapa suma su duración, bytes y páginas al registro del proceso
+# (exportable con prometheus_text) y, si hay una traza activa, a esa traza
+# (ver trace/run_traced), que es lo que la interfaz muestra por petición.
+import cProfile
+import contextvars
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# ============== Configuración ==============
+# Límites (s) de los buckets del histograma de duraciones por etapa.
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+# Puerto del endpoint /metrics para las apps de Streamlit (vacío = desactivado).
+METRICS_PORT = os.environ.get("PRINTPDF_METRICS_PORT") or None
+# Líneas del informe de cProfile que se guardan en la traza.
+PROFILE_LINES = 25
+
+
+class Span:
+    """Una ejecución de una etapa. bytes_out/pages se pueden fijar dentro del with."""
+
+    __slots__ = ("stage", "bytes_in", "bytes_out", "pages", "seconds")
+
+    def __init__(self, stage: str, bytes_in: int = 0, pages: int = 0):
+        self.stage = stage
+        self.bytes_in = bytes_in
+        self.bytes_out = 0
+        self.pages = pages
+        self.seconds = 0.0
+
+
+# ============== Registro del proceso (agregado) ==============
+class Registry:
+    """Contadores e histograma por (operación, etapa). Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    @staticmethod
+    def _empty() -> Dict[str, Any]:
+        return {"count": 0, "seconds": 0.0, "bytes_in": 0, "bytes_out": 0, "pages": 0,
+                "buckets": [0] * len(BUCKETS)}
+
+    def observe(self, op: str, span: Span) -> None:
+        with self._lock:
+            s = self._stats.setdefault((op, span.stage), self._empty())
+            s["count"] += 1
+            s["seconds"] += span.seconds
+            s["bytes_in"] += span.bytes_in
+            s["bytes_out"] += span.bytes_out
+            s["pages"] += span.pages
+            for i, limit in enumerate(BUCKETS):
+                if span.seconds <= limit:
+                    s["buckets"][i] += 1
+
+    def drain(self) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """Devuelve y vacía lo acumulado (para enviarlo desde un proceso worker)."""
+        with self._lock:
+            stats, self._stats = self._stats, {}
+        return stats
+
+    def merge(self, stats: Dict[Tuple[str, str], Dict[str, Any]]) -> None:
+        """Suma lo acumulado en otro proceso (ver drain)."""
+        with self._lock:
+            for key, other in stats.items():
+                s = self._stats.setdefault(key, self._empty())
+                for field in ("count", "seconds", "bytes_in", "bytes_out", "pages"):
+                    s[field] += other[field]
+                s["buckets"] = [a + b for a, b in zip(s["buckets"], other["buckets"])]
+
+    def snapshot(self) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        with self._lock:
+            return {k: dict(v, buckets=list(v["buckets"])) for k, v in self._stats.items()}
+
+
+REGISTRY = Registry()
+
+# Medidores extra para /metrics: prefijo → función que devuelve {nombre: valor}.
+_GAUGES: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+
+def add_gauges(prefix: str, fn: Callable[[], Dict[str, float]]) -> None:
+    """Publica en /metrics los valores de fn() como `<prefix>_<nombre>`."""
+    _GAUGES[prefix] = fn
+
+
+# ============== Trazas por petición ==============
+class Trace:
+    """Etapas de una petición, más cProfile/tracemalloc si se pidieron."""
+
+    def __init__(self, op: str):
+        self.op = op
+        self.spans: List[Span] = []
+        self.seconds = 0.0
+        self.profile: Optional[str] = None
+        self.memory_peak: Optional[int] = None
+        self.memory_top: Optional[List[str]] = None
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Una fila por etapa, ordenadas por tiempo: la primera es la que domina."""
+        rows: Dict[str, Dict[str, Any]] = {}
+        for span in self.spans:
+            row = rows.setdefault(span.stage, {"stage": span.stage, "calls": 0, "seconds": 0.0,
+                                               "bytes_in": 0, "bytes_out": 0, "pages": 0})
+            row["calls"] += 1
+            row["seconds"] += span.seconds
+            row["bytes_in"] += span.bytes_in
+            row["bytes_out"] += span.bytes_out
+            row["pages"] += span.pages
+        for row in rows.values():
+            row["share"] = round(row["seconds"] / self.seconds, 3) if self.seconds else 0.0
+            row["seconds"] = round(row["seconds"], 4)
+        return sorted(rows.values(), key=lambda r: r["seconds"], reverse=True)
+
+
+_current: "contextvars.ContextVar[Optional[Trace]]" = contextvars.ContextVar("printpdf_trace", default=None)
+# tracemalloc es del proceso entero (start/stop/reset_peak): una sola traza con memory a la vez.
+_memory_lock = threading.Lock()
+
+
+@contextmanager
+def stage(name: str, bytes_in: int = 0, pages: int = 0) -> Iterator[Span]:
+    span = Span(name, bytes_in, pages)
+    t0 = time.perf_counter()
+    try:
+        yield span
+    finally:
+        span.seconds = time.perf_counter() - t0
+        trace_ = _current.get()
+        REGISTRY.observe(trace_.op if trace_ is not None else "-", span)
+        if trace_ is not None:
+            trace_.spans.append(span)
+
+
+def record(spans: List[Span]) -> None:
+    """Registra etapas medidas en otro proceso (p.ej. los workers de
+    rasterizado) como si se hubieran ejecutado aquí."""
+    trace_ = _current.get()
+    for span in spans:
+        REGISTRY.observe(trace_.op if trace_ is not None else "-", span)
+        if trace_ is not None:
+            trace_.spans.append(span)
+
+
+@contextmanager
+def trace(op: str, profile: bool = False, memory: bool = False) -> Iterator[Trace]:
+    """
+    Recoge las etapas ejecutadas en este hilo bajo la operación `op`.
+    profile → informe de cProfile (top PROFILE_LINES por tiempo acumulado);
+    memory → pico de tracemalloc y las líneas que más memoria reservan.
+    Ambos ralentizan bastante: pensados para una petición concreta. Como los
+    dos son del proceso, si otra traza ya los usa esta sigue sin ellos.
+    """
+    tr = Trace(op)
+    token = _current.set(tr)
+    profiler = cProfile.Profile() if profile else None
+    memory = memory and _memory_lock.acquire(blocking=False)
+    own_tracemalloc = memory and not tracemalloc.is_tracing()
+    if own_tracemalloc:
+        tracemalloc.start()
+    if memory:
+        tracemalloc.reset_peak()
+    if profiler is not None:
+        try:
+            profiler.enable()
+        except ValueError:  # ya hay otro profiler activo en el proceso
+            profiler = None
+    t0 = time.perf_counter()
+    try:
+        yield tr
+    finally:
+        tr.seconds = time.perf_counter() - t0
+        if profiler is not None:
+            profiler.disable()
+        # La instantánea de memoria antes de formatear el informe de cProfile,
+        # para que no aparezcan las reservas del propio pstats.
+        if memory:
+            tr.memory_peak = tracemalloc.get_traced_memory()[1]
+            top = tracemalloc.take_snapshot().statistics("lineno")[:10]
+            tr.memory_top = [str(s) for s in top]
+            if own_tracemalloc:
+                tracemalloc.stop()
+            _memory_lock.release()
+        if profiler is not None:
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+            tr.profile = out.getvalue()
+        _current.reset(token)
+
+
+def run_traced(op: str, fn: Callable, *args, profile: bool = False, memory: bool = False, **kwargs) -> Tuple[Any, Trace]:
+    """fn(*args, **kwargs) bajo trace(op); devuelve (resultado, traza).
+    Pensado para encolarlo en trabajos.JOBS (el progress llega por kwargs)."""
+    with trace(op, profile, memory) as tr:
+        result = fn(*args, **kwargs)
+    return result, tr
+
+
+# ============== Exportación Prometheus ==============
+def _fmt(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def prometheus_text() -> str:
+    """Registro del proceso + medidores extra en formato de texto de Prometheus."""
+    stats = REGISTRY.snapshot()
+    lines = [
+        "# HELP printpdf_stage_seconds Duración de cada etapa del procesado.",
+        "# TYPE printpdf_stage_seconds histogram",
+    ]
+    for (op, name), s in sorted(stats.items()):
+        labels = f'op="{op}",stage="{name}"'
+        for limit, count in zip(BUCKETS, s["buckets"]):
+            lines.append(f'printpdf_stage_seconds_bucket{{{labels},le="{limit}"}} {count}')
+        lines.append(f'printpdf_stage_seconds_bucket{{{labels},le="+Inf"}} {s["count"]}')
+        lines.append(f"printpdf_stage_seconds_sum{{{labels}}} {_fmt(s['seconds'])}")
+        lines.append(f"printpdf_stage_seconds_count{{{labels}}} {s['count']}")
+    for field, help_ in (("bytes_in", "Bytes de entrada por etapa."),
+                         ("bytes_out", "Bytes de salida por etapa."),
+                         ("pages", "Páginas procesadas por etapa.")):
+        lines.append(f"# HELP printpdf_stage_{field}_total {help_}")
+        lines.append(f"# TYPE printpdf_stage_{field}_total counter")
+        for (op, name), s in sorted(stats.items()):
+            lines.append(f'printpdf_stage_{field}_total{{op="{op}",stage="{name}"}} {s[field]}')
+    for prefix, fn in sorted(_GAUGES.items()):
+        try:
+            values = fn()
+        except Exception:
+            continue
+        for name, value in sorted(values.items()):
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {_fmt(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server_started = False
+_server_lock = threading.Lock()
+
+
+def serve_metrics(port: Optional[str] = METRICS_PORT) -> None:
+    """
+    Arranca (una sola vez por proceso) un servidor /metrics en un hilo daemon.
+    Streamlit re-ejecuta el script en cada interacción, pero el módulo se
+    importa una vez, así que llamarlo desde la app es seguro.
+    """
+    global _server_started
+    if not port:
+        return
+    with _server_lock:
+        if _server_started:
+            return
+        _server_started = True
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+        except OSError:
+            # Puerto ocupado (p.ej. otra app en el mismo contenedor ya lo sirve).
+            return
+        threading.Thread(target=server.serve_forever, name="printpdf-metrics", daemon=True).start()
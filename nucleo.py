@@ -0,0 +1,233 @@
+# nucleo.py — Núcleo de procesado importable (sin Streamlit)
+# Lo usan las dos apps de Streamlit y el servicio HTTP (api.py); aquí no hay
+# nada de interfaz, sólo funciones bytes → bytes. La entrada puede ser
+# bytes, un BytesIO o un ficheros.PdfSource (subida volcada a disco).
+import io
+import tempfile
+import time
+import zipfile
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from cache_resultados import cached_result
+from codificacion import pil_to_bytes, pixmap_to_bytes  # noqa: F401 (re-exportado)
+from compresion import (
+    CompressionPlan, classify_page, collect_placements, page_fingerprint, plan_compression,
+    rasterize_pages, recompress_image, recompress_images, render_page, replace_page_with_image,
+)
+from ficheros import PdfInput, input_digest, input_size, open_pdf, worker_input
+from metricas import stage
+from paginas import MergeStream, extract_pages
+from salida import linearize_pdf
+
+# A partir de este tamaño el ZIP de salida pasa de memoria a un temporal en disco.
+ZIP_SPOOL_MB = 32
+
+# Callback de progreso: progress(hechas, total), en páginas.
+Progress = Callable[[int, int], None]
+
+
+# ============== Compresión (app.py) ==============
+@cached_result("compress_pdf", ignore=("progress",))
+def compress_pdf(pdf: PdfInput, quality_hint: int, linearize: bool = False, progress: Optional[Progress] = None):
+    """
+    Reescribe el PDF en memoria recomprimiendo las imágenes embebidas.
+    El slider fija el DPI objetivo y la calidad JPEG (ver compresion.py);
+    texto y vectores no se tocan. Devuelve (bytes, informe por clase de imagen).
+    linearize → salida linearizada para visores web (ver salida.py).
+    progress(página, total) se llama tras cada página (ver trabajos.py).
+    """
+    with stage("parse", bytes_in=input_size(pdf)) as span:
+        doc = open_pdf(pdf)
+        span.pages = doc.page_count
+    # try/finally: si el trabajo se cancela (JobCancelled desde progress) o
+    # falla a media página, el documento se cierra igualmente.
+    try:
+        report = recompress_images(doc, quality_hint, progress)
+        out = io.BytesIO()
+        # Flags de compresión razonables
+        # garbage=4 → limpieza profunda; deflate=True → comprimir streams; deflate_images/fonts → también imágenes y fuentes sin comprimir.
+        with stage("save", pages=doc.page_count) as span:
+            doc.save(out, garbage=4, deflate=True, deflate_images=True, deflate_fonts=True, incremental=False)
+            span.bytes_out = out.tell()
+    finally:
+        doc.close()
+    # getvalue() entrega el buffer sin copiarlo (seek+read haría otra copia entera).
+    data = out.getvalue()
+    return (linearize_pdf(data) if linearize else data), report
+
+
+@cached_result("compress_plan", ignore=("progress",))
+def compress_plan(pdf: PdfInput, progress: Optional[Progress] = None) -> CompressionPlan:
+    """
+    Previsión de compress_pdf para todo el rango del slider (ver
+    compresion.plan_compression): tamaño y tiempo estimados sin reescribir
+    el PDF, para mostrarlos en vivo y para el modo de tamaño objetivo.
+    Cuesta del orden de una compresión: las apps la encolan en trabajos.JOBS.
+    """
+    if progress:
+        progress(0, 1)
+    with stage("parse", bytes_in=input_size(pdf)) as span:
+        doc = open_pdf(pdf)
+        span.pages = doc.page_count
+    try:
+        plan = plan_compression(doc, input_size(pdf))
+    finally:
+        doc.close()
+    if progress:
+        progress(1, 1)
+    return plan
+
+
+# ============== Herramientas PDF (app_contenido.py) ==============
+@cached_result("pdf_merge")
+def pdf_merge(files: List[PdfInput]) -> bytes:
+    merger = MergeStream()
+    for f in files:
+        merger.add(f)
+    return merger.finish()
+
+
+def pdf_split(file: PdfInput, pages_0based: List[int]) -> bytes:
+    with open_pdf(file) as doc:
+        return extract_pages(doc, pages_0based)
+
+
+def iter_pdf_images(file: PdfInput, out_format: str = "PNG", dpi: int = 144,
+                    pages: Optional[Sequence[int]] = None, quality: int = 90) -> Iterator[Tuple[str, bytes]]:
+    # Una página cada vez: se renderiza, se codifica y se entrega antes de
+    # pasar a la siguiente, así la memoria no crece con el nº de páginas.
+    # `pages` (0-based, p.ej. de paginas.parse_ranges) limita las páginas; los
+    # rásteres quedan en la caché de render, así que repetir con otro formato
+    # o calidad sólo vuelve a codificar.
+    with stage("parse", bytes_in=input_size(file)):
+        doc = open_pdf(file)
+    try:
+        doc_key = input_digest(file)
+        for i in (range(doc.page_count) if pages is None else pages):
+            pix = render_page(doc[i], dpi, doc_key)
+            data = pixmap_to_bytes(pix, out_format, quality=quality)
+            del pix
+            yield f"page_{i+1}.{out_format.lower()}", data
+    finally:
+        doc.close()
+
+
+@cached_result("pdf_to_images")
+def pdf_to_images(file: PdfInput, out_format: str = "PNG", dpi: int = 144,
+                  pages: Optional[Sequence[int]] = None, quality: int = 90) -> List[Tuple[str, bytes]]:
+    return list(iter_pdf_images(file, out_format, dpi, pages, quality))
+
+
+def write_zip(items: Iterable[Tuple[str, bytes]], on_progress: Optional[Callable[[int], None]] = None,
+              out: Optional[IO[bytes]] = None) -> IO[bytes]:
+    # ZIP en un buffer "spooled": en memoria hasta ZIP_SPOOL_MB y a un temporal
+    # en disco a partir de ahí (o en `out`, si se pasa un fichero ya abierto).
+    # PNG/JPG/WEBP/PDF ya van comprimidos → ZIP_STORED.
+    spool = out if out is not None else tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MB * 1024 * 1024)
+    with zipfile.ZipFile(spool, "w", compression=zipfile.ZIP_STORED) as zf:
+        for n, (name, data) in enumerate(items, start=1):
+            zf.writestr(name, data)
+            if on_progress:
+                on_progress(n)
+    spool.seek(0)
+    return spool
+
+
+@cached_result("pdf_compress", ignore=("workers", "progress"))
+def pdf_compress(file: PdfInput, dpi: int = 150, quality: int = 85, workers: int = 1, linearize: bool = False,
+                 pages: Optional[Sequence[int]] = None, progress: Optional[Progress] = None) -> Tuple[bytes, List[dict]]:
+    # Estrategia por página (ver compresion.classify_page): las páginas de
+    # texto/vectores se conservan, en las mixtas sólo se recomprimen sus
+    # imágenes y únicamente los escaneos se rasterizan (en paralelo si workers > 1).
+    # Los escaneos repetidos (en blanco, sólo membrete) comparten una imagen.
+    # Con `pages` (0-based, p.ej. de paginas.parse_ranges) sólo se tratan y se
+    # devuelven esas páginas; el informe conserva la numeración original.
+    # Los escaneos pasan por la caché de render: si sólo cambia la calidad,
+    # se vuelven a codificar sin renderizar.
+    # Una página cuenta como hecha en progress() cuando ya no queda nada que hacerle.
+    with stage("parse", bytes_in=input_size(file)) as span:
+        doc = open_pdf(file)
+        span.pages = doc.page_count
+    # try/finally: cancelar (JobCancelled desde progress) o fallar a media
+    # página cierra igualmente el documento y los procesos de rasterizado.
+    rendered = None
+    try:
+        report = []
+        for i in (range(doc.page_count) if pages is None else pages):
+            page = doc[i]
+            t0 = time.perf_counter()
+            with stage("classify", pages=1):
+                decision = classify_page(page)
+            decision["bytes_saved"] = 0
+            decision["duplicate_of"] = None
+            decision["seconds"] = time.perf_counter() - t0
+            report.append(decision)
+        completed = sum(1 for d in report if d["strategy"] == "keep")
+        if progress:
+            progress(completed, len(report))
+
+        # Páginas mixtas: cada imagen compartida se trata una sola vez y su ahorro
+        # se atribuye a la primera página que la usa.
+        with stage("parse", pages=doc.page_count):
+            placements = collect_placements(doc)
+        done = set()
+        for decision in report:
+            if decision["strategy"] != "images":
+                continue
+            t0 = time.perf_counter()
+            for info in doc[decision["page"] - 1].get_images(full=True):
+                xref = info[0]
+                if xref in done or xref not in placements:
+                    continue
+                done.add(xref)
+                _, before, after = recompress_image(doc, xref, placements[xref], dpi, quality)
+                decision["bytes_saved"] += before - after
+            decision["seconds"] += time.perf_counter() - t0
+            completed += 1
+            if progress:
+                progress(completed, len(report))
+
+        # Escaneos: render + JPEG fuera (workers), aquí sólo se ensambla en orden.
+        # Sólo se renderiza la primera página de cada huella (compresion.page_fingerprint);
+        # las repetidas reutilizan su imagen sin renderizar ni codificar nada.
+        rows = {d["page"] - 1: d for d in report}
+        raster = [d["page"] - 1 for d in report if d["strategy"] == "raster"]
+        with stage("parse", pages=len(raster)):
+            keys = {i: page_fingerprint(doc[i]) for i in raster}
+        first_of: Dict[str, int] = {}
+        unique = [i for i in raster if first_of.setdefault(keys[i], i) == i]
+        rendered = rasterize_pages(worker_input(file), dpi, quality, workers, pages=unique, doc_key=input_digest(file))
+        by_key: Dict[str, Tuple[int, int]] = {}  # huella → (xref de la imagen, página)
+        t0 = time.perf_counter()
+        for i in raster:
+            page = doc[i]
+            xrefs = {info[0] for info in page.get_images(full=True)} - done
+            done.update(xrefs)
+            before = sum(len(doc.xref_stream_raw(x) or b"") for x in xrefs)
+            reused = by_key.get(keys[i])
+            if reused is None:
+                img_b = next(rendered)
+                by_key[keys[i]] = (replace_page_with_image(doc, page, img_b), i)
+                rows[i]["bytes_saved"] = before - len(img_b)
+            else:
+                replace_page_with_image(doc, page, None, xref=reused[0])
+                rows[i]["duplicate_of"] = reused[1] + 1
+                rows[i]["bytes_saved"] = before
+            rows[i]["seconds"] += time.perf_counter() - t0
+            completed += 1
+            if progress:
+                progress(completed, len(report))
+            t0 = time.perf_counter()
+
+        if pages is not None:
+            doc.select(list(pages))
+        out = io.BytesIO()
+        with stage("save", pages=doc.page_count) as span:
+            doc.save(out, garbage=3, deflate=True)
+            span.bytes_out = out.tell()
+    finally:
+        if rendered is not None:
+            rendered.close()
+        doc.close()
+    data = out.getvalue()
+    return (linearize_pdf(data) if linearize else data), report
@@ -0,0 +1,106 @@
+# paginas.py — Unir y dividir PDFs con PyMuPDF (objetos compartidos, todo en memoria)
+import io
+from typing import IO, List, Optional
+
+import fitz  # PyMuPDF
+
+from ficheros import PdfInput, input_size, open_pdf
+from metricas import stage
+
+
+def parse_ranges(s: str, max_page: int) -> List[int]:
+    # "1-3,6,9-" → páginas 0-based; un extremo vacío significa principio/fin.
+    pages = set()
+    s = s.replace(" ", "")
+    if not s:
+        return []
+    for part in s.split(","):
+        if "-" in part:
+            a, b = part.split("-")
+            a = int(a) if a else 1
+            b = int(b) if b else max_page
+            for p in range(a, b + 1):
+                if 1 <= p <= max_page:
+                    pages.add(p - 1)
+        else:
+            p = int(part)
+            if 1 <= p <= max_page:
+                pages.add(p - 1)
+    return sorted(pages)
+
+
+def split_groups(spec: str, max_page: int) -> List[List[int]]:
+    """"1-3;4-10;11-" → un grupo de páginas (0-based) por cada PDF de salida."""
+    groups = [parse_ranges(part, max_page) for part in spec.split(";")]
+    return [g for g in groups if g]
+
+
+def extract_pages(doc: fitz.Document, pages: List[int]) -> bytes:
+    """
+    Copia sólo las páginas pedidas a un PDF nuevo. `insert_pdf` arrastra
+    únicamente los objetos que esas páginas referencian, así que el coste
+    es proporcional a lo extraído y no al tamaño del original.
+    """
+    out = fitz.open()
+    # Tramos contiguos → una llamada a insert_pdf por tramo.
+    with stage("insert", pages=len(pages)):
+        run_start = prev = None
+        for p in pages:
+            if not 0 <= p < doc.page_count:
+                continue
+            if prev is not None and p == prev + 1:
+                prev = p
+                continue
+            if run_start is not None:
+                out.insert_pdf(doc, from_page=run_start, to_page=prev)
+            run_start = prev = p
+        if run_start is not None:
+            out.insert_pdf(doc, from_page=run_start, to_page=prev)
+    buf = io.BytesIO()
+    with stage("save") as span:
+        out.save(buf, garbage=3, deflate=True)
+        span.bytes_out = buf.tell()
+    out.close()
+    return buf.getvalue()
+
+
+class MergeStream:
+    """
+    Une PDFs a medida que llegan: cada entrada se abre, se copia con
+    `insert_pdf` (páginas, enlaces y anotaciones) y se cierra antes de
+    la siguiente, así nunca hay más de un documento de origen abierto.
+    Los marcadores de cada entrada se conservan, desplazados a su página final.
+    """
+
+    def __init__(self):
+        self.doc = fitz.open()
+        self.toc: List[list] = []
+        self.inputs = 0
+
+    def add(self, pdf: PdfInput) -> int:
+        """Añade un PDF al final y devuelve el nº de páginas acumulado."""
+        with stage("parse", bytes_in=input_size(pdf)):
+            src = open_pdf(pdf)
+        with src:
+            offset = self.doc.page_count
+            with stage("insert", pages=src.page_count):
+                self.doc.insert_pdf(src, links=True, annots=True)
+            for level, title, page in src.get_toc(simple=True):
+                self.toc.append([level, title, page + offset if page > 0 else page])
+        self.inputs += 1
+        return self.doc.page_count
+
+    def finish(self, out: Optional[IO[bytes]] = None) -> bytes:
+        """
+        Escribe el resultado. garbage=4 deduplica objetos idénticos, de modo
+        que fuentes e imágenes repetidas en varias entradas quedan una sola vez.
+        Con `out` (fichero o buffer) se escribe ahí y se devuelve b"".
+        """
+        if self.toc:
+            self.doc.set_toc(self.toc)
+        buf = out if out is not None else io.BytesIO()
+        with stage("save", pages=self.doc.page_count) as span:
+            self.doc.save(buf, garbage=4, deflate=True)
+            span.bytes_out = buf.tell()
+        self.doc.close()
+        return buf.getvalue() if out is None else b""
@@ -0,0 +1,66 @@
+# salida.py — PDF de salida para visores web/móvil: linearizado y bytes hasta la primera página
+#
+# Un PDF normal guarda la tabla xref al final: el visor tiene que descargarlo
+# entero antes de pintar nada. Linearizado ("fast web view") la primera página
+# y sus recursos van al principio y se pinta en cuanto llegan.
+# PyMuPDF ya no sabe linearizar (MuPDF lo quitó); se hace con pikepdf (qpdf),
+# que es opcional: sin él la opción no se ofrece. Se importa al usarlo, así
+# este módulo no pesa en el arranque (ver arranque.py).
+import importlib.util
+import io
+import os
+import re
+from typing import Dict
+
+from metricas import stage
+
+# ============== Configuración ==============
+# Ancho de banda de referencia (kbit/s, un móvil 3G/4G flojo) para pasar bytes a segundos.
+MOBILE_KBPS = int(os.environ.get("PRINTPDF_MOBILE_KBPS", "1600"))
+
+LINEARIZE_AVAILABLE = importlib.util.find_spec("pikepdf") is not None
+
+# El diccionario de linearización es el primer objeto del fichero; /E es
+# el final de la sección de la primera página.
+_LINEARIZED = re.compile(rb"<<[^>]*?/Linearized\s[^>]*?/E\s+(\d+)")
+_HEAD_BYTES = 1024
+
+
+def linearize_pdf(pdf_bytes: bytes) -> bytes:
+    """Reescribe el PDF linearizado. Requiere pikepdf (ver LINEARIZE_AVAILABLE)."""
+    if not LINEARIZE_AVAILABLE:
+        raise RuntimeError("linearizar requiere pikepdf (pip install pikepdf)")
+    import pikepdf
+    out = io.BytesIO()
+    with stage("save", bytes_in=len(pdf_bytes)) as span:
+        with pikepdf.open(io.BytesIO(pdf_bytes)) as pdf:
+            pdf.save(out, linearize=True)
+        span.bytes_out = out.tell()
+    return out.getvalue()
+
+
+def first_page_bytes(pdf_bytes: bytes) -> int:
+    """Bytes que un visor descarga antes de poder pintar la primera página:
+    hasta /E si el PDF está linearizado; si no, el fichero entero."""
+    m = _LINEARIZED.search(pdf_bytes[:_HEAD_BYTES])
+    if m is None:
+        return len(pdf_bytes)
+    return min(len(pdf_bytes), int(m.group(1)))
+
+
+def first_page_report(pdf_bytes: bytes, kbps: int = MOBILE_KBPS) -> Dict[str, float]:
+    """
+    Tiempo hasta la primera página a `kbps` frente a descargar el fichero
+    entero (lo que costaría sin linearizar):
+    {"bytes_total", "bytes_first_page", "seconds_total", "seconds_first_page", "seconds_saved"}.
+    """
+    total = len(pdf_bytes)
+    first = first_page_bytes(pdf_bytes)
+    bytes_per_second = kbps * 1000 / 8
+    return {
+        "bytes_total": total,
+        "bytes_first_page": first,
+        "seconds_total": round(total / bytes_per_second, 2),
+        "seconds_first_page": round(first / bytes_per_second, 2),
+        "seconds_saved": round((total - first) / bytes_per_second, 2),
+    }
@@ -0,0 +1,62 @@
+# sesion.py — Piezas de sesión comunes a las dos apps de Streamlit (app.py y app_contenido.py)
+#
+# Identidad de la sesión ante la cola de trabajos, sus subidas y el fragmento
+# que sigue un trabajo en marcha. Los textos los pone cada app en su idioma.
+import uuid
+from typing import TYPE_CHECKING, Dict
+
+import streamlit as st
+
+from trabajos import FINISHED, JOBS, QUEUED
+
+if TYPE_CHECKING:
+    from ficheros import SessionFiles
+
+# ============== Configuración ==============
+# Cada cuánto (s) se consulta el progreso del trabajo mientras está en marcha.
+JOB_POLL_SECONDS = 0.5
+
+
+def session_owner() -> str:
+    """Id de la sesión ante la cola de trabajos (reparto justo entre usuarios)."""
+    if "job_owner" not in st.session_state:
+        st.session_state["job_owner"] = uuid.uuid4().hex
+    return st.session_state["job_owner"]
+
+
+def session_files() -> "SessionFiles":
+    """Subidas de la sesión (ver ficheros.py): las grandes se vuelcan a un
+    temporal una sola vez y se borran al terminar la sesión."""
+    # Import diferido: ficheros carga PyMuPDF, que no debe retrasar la cabecera (ver arranque.py).
+    from ficheros import SessionFiles
+    if "files" not in st.session_state:
+        st.session_state["files"] = SessionFiles()
+    return st.session_state["files"]
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def job_progress(job_id: str, labels: Dict[str, str]) -> None:
+    """
+    Sólo este fragmento se re-ejecuta mientras el trabajo avanza: la página no
+    se bloquea y un rerun (slider, idioma) no pierde el trabajo, que sigue en
+    la cola bajo su id. Al terminar se relanza la app entera para mostrar el resultado.
+    `labels`: textos "queued", "pages" y "cancel" en el idioma de la app.
+    """
+    job = JOBS.get(job_id)
+    if job is None or job.status in FINISHED:
+        st.rerun()
+    if job.status == QUEUED:
+        st.progress(0.0, text="⏳ " + labels["queued"])
+    else:
+        st.progress(job.fraction, text=f"⏳ {job.done}/{job.total or '?'} {labels['pages']} • {job.seconds:.0f}s")
+    if st.button(labels["cancel"]):
+        JOBS.cancel(job_id)
+        st.rerun()
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def job_wait(job_id: str) -> None:
+    """Espera a un trabajo sin mostrar nada; al terminar relanza la app."""
+    job = JOBS.get(job_id)
+    if job is None or job.status in FINISHED:
+        st.rerun()
@@ -1 +1,96 @@
+# test_api.py — Pruebas del servicio HTTP (python -m pytest)
+#
+# Se habla ASGI directamente con la app (sin cliente HTTP): el cuerpo llega en
+# trozos y sin Content-Length, como una subida chunked.
+import asyncio
+import json
+import os
 
+import pytest
+
+import api
+
+
+def _call(path: str, chunks, content_type: str = "application/pdf", length=None, with_headers: bool = False):
+    """POST a la app con el cuerpo en `chunks` (chunked, o con Content-Length
+    si se da `length`); devuelve (status, JSON de la respuesta[, cabeceras])."""
+    framing = (b"content-length", str(length).encode()) if length is not None else (b"transfer-encoding", b"chunked")
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+             "root_path": "", "client": ("127.0.0.1", 1), "server": ("test", 80),
+             "headers": [(b"content-type", content_type.encode()), framing],
+             "app": api.app}
+    pending = list(chunks)
+    sent = []
+
+    async def receive():
+        if pending:
+            return {"type": "http.request", "body": pending.pop(0), "more_body": bool(pending)}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(api.app(scope, receive, send))
+    start = next(m for m in sent if m["type"] == "http.response.start")
+    body = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    result = (start["status"], json.loads(body) if body else None)
+    if with_headers:
+        return result + ({k.decode(): v.decode() for k, v in start["headers"]},)
+    return result
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    """Admisión sin pool (estas pruebas no llegan a ejecutar trabajos) y temporales aislados."""
+    monkeypatch.setattr(api, "API_MAX_MB", 1)
+    monkeypatch.setattr(api, "API_TMP_DIR", str(tmp_path))
+    api.app.state.admission = api.Admission(1, 0)
+    api.app.state.pool = None
+    return tmp_path
+
+
+def _multipart(size: int):
+    boundary = "limite"
+    head = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"files\"; filename=\"a.png\"\r\n"
+            f"Content-Type: image/png\r\n\r\n").encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    body = head + b"\0" * size + tail
+    return [body[i:i + 65536] for i in range(0, len(body), 65536)], f"multipart/form-data; boundary={boundary}"
+
+
+def test_chunked_body_over_limit_is_413(server):
+    status, body = _call("/pdf/compress", [b"\0" * 65536] * 20)
+    assert status == 413 and body == {"error": "máximo 1 MB"}
+    assert os.listdir(server) == []
+
+
+def test_chunked_multipart_over_limit_is_413(server):
+    chunks, content_type = _multipart(2 * 1024 * 1024)
+    status, _ = _call("/images/convert", chunks, content_type)
+    assert status == 413
+    assert os.listdir(server) == []
+
+
+def test_multipart_without_files_is_400(server):
+    status, body = _call("/pdf/merge", [b""], "text/plain")
+    assert status == 400 and "files" in body["error"]
+
+
+def test_declared_length_over_limit_is_413_before_reading(server):
+    status, body = _call("/pdf/compress", [], length=2 * 1024 * 1024)
+    assert status == 413 and body == {"error": "máximo 1 MB"}
+
+
+def test_full_queue_is_503_with_retry_after(server):
+    assert api.app.state.admission.try_enter()  # ocupa el único hueco
+    status, body, headers = _call("/pdf/compress", [b"%PDF"], with_headers=True)
+    assert status == 503 and "ocupado" in body["error"]
+    assert headers["retry-after"] == api.RETRY_AFTER
+    api.app.state.admission.leave()
+
+
+def test_admission_is_released_after_an_error(server):
+    for _ in range(3):
+        assert _call("/pdf/compress", [b"\0" * 65536] * 20)[0] == 413
+    assert api.app.state.admission.admitted == 0
@@ -0,0 +1,95 @@
+# test_cache_resultados.py — Pruebas de la caché de resultados (python -m pytest)
+import os
+import time
+
+import fitz  # PyMuPDF
+
+import cache_resultados
+import nucleo
+from cache_resultados import RESULT_CACHE, ResultCache
+
+
+def test_lru_evicts_least_recently_used_by_bytes():
+    cache = ResultCache(10, 60)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == (True, b"aaaa")  # "a" pasa a ser la más reciente
+    cache.put("c", b"cccc")
+    assert cache.get("b") == (False, None)
+    assert cache.get("a")[0] and cache.get("c")[0]
+    stats = cache.stats()
+    assert stats["bytes"] == 8 and stats["entries"] == 2 and stats["evictions"] == 1
+
+
+def test_values_larger_than_the_budget_are_not_kept():
+    cache = ResultCache(10, 60)
+    cache.put("big", b"x" * 11)
+    assert cache.get("big") == (False, None)
+    assert cache.stats()["bytes"] == 0
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_resultados.time, "time", lambda: now[0])
+    cache = ResultCache(1 << 20, 60)
+    cache.put("k", b"v")
+    now[0] += 60
+    assert cache.get("k") == (True, b"v")
+    now[0] += 1
+    assert cache.get("k") == (False, None)
+    assert cache.stats()["bytes"] == 0
+
+
+def test_disk_tier_round_trip_without_pickle(tmp_path):
+    value = (b"%PDF-1.7", {"jpeg": {"images": 2}, "files": [("a.png", b"\x89PNG"), None, 1.5]})
+    ResultCache(1 << 20, 60, str(tmp_path)).put("k", value)
+    assert sorted(os.listdir(tmp_path)) == ["k.bin", "k.json"]
+    fresh = ResultCache(1 << 20, 60, str(tmp_path))
+    assert fresh.get("k") == (True, value)
+    assert fresh.stats()["disk_hits"] == 1
+
+
+def test_unstorable_results_stay_in_memory(tmp_path):
+    cache = ResultCache(1 << 20, 60, str(tmp_path))
+    value = object()
+    cache.put("k", value)
+    assert os.listdir(tmp_path) == []
+    assert cache.get("k") == (True, value)
+
+
+def test_expired_files_are_purged_at_startup(tmp_path):
+    stale = tmp_path / "old.pkl"
+    stale.write_bytes(b"x")
+    old = time.time() - 120
+    os.utime(stale, (old, old))
+    ResultCache(1 << 20, 60, str(tmp_path))
+    assert not stale.exists()
+
+
+def test_disk_tier_is_opt_in():
+    cache = ResultCache(1 << 20, 60)
+    cache.put("k", b"data")
+    assert cache.disk_dir is None
+
+
+def test_purge_drops_expired_entries_nobody_reads(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_resultados.time, "time", lambda: now[0])
+    cache = ResultCache(1 << 20, 60)
+    cache.put("old", b"x" * 10)
+    now[0] += 30
+    cache.put("new", b"y" * 5)
+    now[0] += 31
+    cache._purge_mem()
+    assert cache.stats()["entries"] == 1 and cache.stats()["bytes"] == 5
+    assert cache.get("new") == (True, b"y" * 5)
+
+
+def test_pdf_compress_key_ignores_workers():
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "workers")
+    data = doc.tobytes()
+    first = nucleo.pdf_compress(data, dpi=72, quality=50, workers=1)
+    hits = RESULT_CACHE.stats()["hits"]
+    assert nucleo.pdf_compress(data, dpi=72, quality=50, workers=2) is first
+    assert RESULT_CACHE.stats()["hits"] == hits + 1
@@ -0,0 +1,52 @@
+# test_codificacion.py — Pruebas de la codificación de pixmaps (python -m pytest)
+import io
+import random
+
+import fitz  # PyMuPDF
+import pytest
+from PIL import Image
+
+from codificacion import pixmap_to_bytes
+
+
+def _pixmap(colorspace, alpha: bool) -> fitz.Pixmap:
+    pix = fitz.Pixmap(colorspace, fitz.IRect(0, 0, 16, 8), alpha)
+    pix.clear_with(200)
+    if alpha:
+        pix.set_alpha(bytes([128]) * (16 * 8))
+    return pix
+
+
+@pytest.mark.parametrize("colorspace, alpha, fmt, mode", [
+    (fitz.csRGB, False, "JPEG", "RGB"),
+    (fitz.csRGB, True, "JPEG", "RGB"),
+    (fitz.csCMYK, False, "JPEG", "RGB"),
+    (fitz.csCMYK, True, "JPEG", "RGB"),
+    (fitz.csGRAY, False, "JPEG", "L"),
+    (fitz.csGRAY, True, "PNG", "RGBA"),
+    (fitz.csRGB, True, "PNG", "RGBA"),
+    (fitz.csCMYK, False, "PNG", "RGB"),
+    (fitz.csRGB, True, "WEBP", "RGBA"),
+])
+def test_mode_follows_colorspace_and_alpha(colorspace, alpha, fmt, mode):
+    with Image.open(io.BytesIO(pixmap_to_bytes(_pixmap(colorspace, alpha), fmt))) as img:
+        assert img.mode == mode
+        assert img.size == (16, 8)
+
+
+def test_premultiplied_alpha_is_undone():
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 4, 4), True)
+    pix.clear_with(255)
+    pix.set_alpha(bytes([128]) * 16)  # premultiplica: los samples bajan a ~128
+    with Image.open(io.BytesIO(pixmap_to_bytes(pix, "PNG"))) as img:
+        r, g, b, a = img.getpixel((0, 0))
+        assert a == 128 and min(r, g, b) >= 250
+
+
+def test_png_is_optimized_unless_fast():
+    # Imagen de tono continuo (como una página escaneada): ahí optimize gana.
+    rnd = random.Random(0)
+    img = Image.frombytes("RGB", (40, 30), bytes(rnd.randrange(256) for _ in range(40 * 30 * 3)))
+    img = img.resize((400, 300), Image.BICUBIC)
+    pix = fitz.Pixmap(fitz.csRGB, 400, 300, img.tobytes(), False)
+    assert len(pixmap_to_bytes(pix, "PNG")) < len(pixmap_to_bytes(pix, "PNG", fast_png=True))
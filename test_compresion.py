@@ -0,0 +1,98 @@
+# test_compresion.py — Pruebas de la recompresión de imágenes y páginas (python -m pytest)
+import io
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+import compresion
+
+
+def _jpeg(color: str = "red") -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (50, 50), color).save(out, "JPEG")
+    return out.getvalue()
+
+
+def test_replace_page_keeps_shared_content_stream():
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "texto compartido")
+    doc.new_page()
+    first, second = doc[0], doc[1]
+    # La segunda página reutiliza el stream y los recursos de la primera.
+    doc.xref_set_key(second.xref, "Contents", f"{first.get_contents()[0]} 0 R")
+    doc.xref_set_key(second.xref, "Resources", doc.xref_get_key(first.xref, "Resources")[1])
+
+    compresion.replace_page_with_image(doc, first, _jpeg())
+
+    with fitz.open(stream=doc.tobytes(garbage=4, deflate=True), filetype="pdf") as out:
+        assert out[0].get_text().strip() == ""
+        assert len(out[0].get_images()) == 1
+        assert out[1].get_text().strip() == "texto compartido"
+
+
+def _photo_pdf(color_key: bool) -> fitz.Document:
+    img = Image.radial_gradient("L").convert("RGB").resize((1200, 1200))
+    out = io.BytesIO()
+    img.save(out, "PNG")
+    doc = fitz.open()
+    page = doc.new_page(width=144, height=144)
+    xref = page.insert_image(page.rect, stream=out.getvalue())
+    if color_key:
+        doc.xref_set_key(xref, "Mask", "[0 10 0 10 0 10]")
+    return doc
+
+
+def test_color_key_masked_images_are_left_alone():
+    doc = _photo_pdf(color_key=True)
+    xref = doc[0].get_images()[0][0]
+    before = doc.xref_stream_raw(xref)
+    compresion.recompress_images(doc, 30)
+    assert doc.xref_stream_raw(xref) == before
+
+    control = _photo_pdf(color_key=False)
+    xref = control[0].get_images()[0][0]
+    before = control.xref_stream_raw(xref)
+    compresion.recompress_images(control, 30)
+    assert control.xref_stream_raw(xref) != before
+
+
+def test_only_rasters_that_fit_the_render_cache_are_kept(monkeypatch):
+    doc = fitz.open()
+    for _ in range(3):
+        doc.new_page(width=72, height=72)
+    page_bytes = 101 * 101 * 3  # 1 pulgada a 100 ppp, RGB
+    monkeypatch.setattr(compresion.RENDER_CACHE, "max_bytes", 2 * page_bytes)
+    assert compresion._pages_to_keep(doc, [0, 1, 2], 100) == {0, 1}
+    monkeypatch.setattr(compresion.RENDER_CACHE, "max_bytes", page_bytes - 1)
+    assert compresion._pages_to_keep(doc, [0, 1, 2], 100) == set()
+
+
+def test_parallel_rasterization_matches_serial():
+    doc = fitz.open()
+    for i in range(8):
+        page = doc.new_page(width=144, height=144)
+        page.insert_text((20, 72), f"pagina {i + 1}", fontsize=14)
+        page.insert_image(fitz.Rect(20, 90, 60, 130), stream=_jpeg("blue" if i % 2 else "red"))
+    pdf = doc.tobytes()
+    serial = list(compresion.rasterize_pages(pdf, 72, 70, workers=1))
+    parallel = list(compresion.rasterize_pages(pdf, 72, 70, workers=2))
+    assert len(serial) == 8
+    assert parallel == serial
+
+
+def test_plan_estimate_interpolates_between_measured_levels():
+    # Una imagen de 2000×2000 px mostrada a 2" (1000 ppp); bytes/píxel = nivel/100.
+    rates = {level: (level / 100, 0.0) for level in compresion.PLAN_LEVELS}
+    plan = compresion.CompressionPlan(1_100_000, 0.01, rates, [(1_000_000, 2000, 2000, 2.0)], 1)
+    # 50 → 186 ppp → 372×372 px, a mitad de camino entre 40 (0,40) y 55 (0,55).
+    assert plan.estimate(50) == (100_000 + int(372 * 372 * 0.5), 0.01)
+    assert plan.estimate(10)[0] < plan.estimate(50)[0] < plan.estimate(100)[0]
+    assert plan.auto_quality(plan.estimate(50)[0]) == 50
+    assert plan.auto_quality(plan.estimate(50)[0] - 1) == 45
+    assert plan.auto_quality(plan.estimate(10)[0] - 1) is None
+
+
+def test_plan_without_candidates_predicts_no_change():
+    plan = compresion.CompressionPlan(5000, 0.01, {}, [], 0)
+    assert plan.estimate(30) == (5000, 0.01)
+    assert plan.auto_quality(4999) is None
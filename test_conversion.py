@@ -0,0 +1,51 @@
+# test_conversion.py — Pruebas de la conversión por lotes y de la compresión a un tamaño (python -m pytest)
+import io
+import random
+
+import pytest
+from PIL import Image
+
+from conversion import compress_to_size, convert_batch
+
+
+def _png(color: str) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(out, "PNG")
+    return out.getvalue()
+
+
+def test_batch_names_never_collide():
+    files = [("a.png", _png("red")), ("a.png", _png("green")), ("a_2.png", _png("blue")), ("a.webp", _png("white"))]
+    results = list(convert_batch(files, "PNG", workers=4))
+    names = sorted(r["name"] for r in results)
+    assert len(set(names)) == len(files)
+    assert all(r["error"] is None for r in results)
+
+
+def test_duplicate_suffixes_follow_batch_order():
+    files = [("a.png", _png(color)) for color in ("red", "green", "blue")]
+    by_name = {r["name"]: r["data"] for r in convert_batch(files, "PNG", workers=3)}
+    assert sorted(by_name) == ["a.png", "a_2.png", "a_3.png"]
+    for name, color in zip(("a.png", "a_2.png", "a_3.png"), ("red", "green", "blue")):
+        assert Image.open(io.BytesIO(by_name[name])).getpixel((0, 0)) == Image.new("RGB", (1, 1), color).getpixel((0, 0))
+
+
+def _noisy_png() -> bytes:
+    rnd = random.Random(1)
+    img = Image.frombytes("RGB", (80, 60), bytes(rnd.randrange(256) for _ in range(80 * 60 * 3))).resize((800, 600))
+    out = io.BytesIO()
+    img.save(out, "PNG")
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("target_kb", [60, 20, 5])
+def test_compress_to_size_fits_and_uses_the_budget(target_kb):
+    out, fmt, info = compress_to_size(_noisy_png(), target_kb)
+    assert fmt == "JPEG" and info["fits"]
+    assert 0.8 * target_kb * 1024 <= len(out) <= target_kb * 1024
+
+
+def test_compress_to_size_lowers_quality_before_shrinking():
+    _, _, info = compress_to_size(_noisy_png(), 60)
+    assert (info["width"], info["height"]) == (800, 600)
+    assert info["quality"] < 95
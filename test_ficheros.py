@@ -0,0 +1,62 @@
+# test_ficheros.py — Pruebas de los temporales de subida (python -m pytest)
+import io
+import os
+
+import fitz  # PyMuPDF
+
+import ficheros
+from ficheros import SessionFiles
+
+
+def _upload(text: str) -> io.BytesIO:
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), text)
+    f = io.BytesIO(doc.tobytes())
+    f.name = f"{text}.pdf"
+    return f
+
+
+def test_pinned_source_survives_eviction_until_released(monkeypatch):
+    monkeypatch.setattr(ficheros, "MAX_SOURCES_PER_SESSION", 1)
+    files = SessionFiles(threshold_mb=0)
+    first = files.source(_upload("a"))
+    release = files.pin([first])
+    files.source(_upload("b"))  # desplaza a la primera del LRU
+    assert os.path.exists(first.path)
+    release()
+    assert not os.path.exists(first.path)
+    release()  # soltar dos veces no hace nada
+    files.cleanup()
+
+
+def test_cleanup_defers_pinned_sources():
+    files = SessionFiles(threshold_mb=0)
+    src = files.source(_upload("a"))
+    release = files.pin([src])
+    files.cleanup()
+    assert os.path.exists(src.path)
+    release()
+    assert not os.path.exists(src.path)
+
+
+def test_unpinned_source_is_removed_on_eviction(monkeypatch):
+    monkeypatch.setattr(ficheros, "MAX_SOURCES_PER_SESSION", 1)
+    files = SessionFiles(threshold_mb=0)
+    first = files.source(_upload("a"))
+    files.source(_upload("b"))
+    assert not os.path.exists(first.path)
+    files.cleanup()
+
+
+def test_document_is_reused_and_closed_with_the_session():
+    files = SessionFiles(threshold_mb=0)
+    upload = _upload("a")
+    doc = files.document(upload)
+    assert files.document(upload) is doc
+    other = files.document(_upload("b"))
+    assert doc.is_closed and not other.is_closed
+    files.close_document()
+    assert other.is_closed
+    last = files.document(upload)
+    del files
+    assert last.is_closed
@@ -0,0 +1,95 @@
+# test_lotes.py — Pruebas del modo por lotes (python -m pytest)
+import json
+import os
+import sys
+
+import fitz  # PyMuPDF
+import pytest
+
+import lotes
+from cache_resultados import RENDER_CACHE
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    # run_batch con un proceso llama a _init_worker aquí mismo: que no deje la caché de render a 0.
+    monkeypatch.setattr(RENDER_CACHE, "max_bytes", RENDER_CACHE.max_bytes)
+    src = tmp_path / "in"
+    (src / "sub").mkdir(parents=True)
+    for name in ("a.pdf", "sub/b.pdf"):
+        doc = fitz.open()
+        doc.new_page().insert_text((72, 72), name)
+        doc.save(str(src / name))
+    return src, tmp_path / "out"
+
+
+def _run(src, out, **kw):
+    return lotes.run_batch("compress", [str(src)], str(out), {"quality": 60}, workers=1, **kw)
+
+
+def test_second_run_skips_up_to_date_files(tree):
+    src, out = tree
+    first = _run(src, out)
+    assert (first["processed"], first["skipped"], first["failed"]) == (2, 0, 0)
+    assert (out / "a.pdf").exists() and (out / "sub" / "b.pdf").exists()
+    second = _run(src, out)
+    assert (second["processed"], second["skipped"]) == (0, 2)
+    assert json.loads((out / lotes.SUMMARY_NAME).read_text())["skipped"] == 2
+
+
+def test_changed_input_or_missing_output_is_redone(tree):
+    src, out = tree
+    _run(src, out)
+    os.remove(out / "a.pdf")
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "b cambiado")
+    doc.save(str(src / "sub" / "b.pdf"))
+    again = _run(src, out)
+    assert (again["processed"], again["skipped"]) == (2, 0)
+    assert _run(src, out, force=True)["processed"] == 2
+
+
+def test_interrupted_batch_resumes_where_it_stopped(tree):
+    src, out = tree
+
+    def interrupt(done, total, result):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        _run(src, out, on_result=interrupt)
+    manifest = json.loads((out / lotes.MANIFEST_NAME).read_text())
+    assert len(manifest["entries"]) == 1
+    resumed = _run(src, out)
+    assert (resumed["processed"], resumed["skipped"]) == (1, 1)
+
+
+def test_failures_are_reported_and_set_the_exit_code(tree, monkeypatch, capsys):
+    src, out = tree
+    (src / "roto.pdf").write_bytes(b"esto no es un PDF")
+    monkeypatch.setattr(sys, "argv", ["lotes.py", "compress", str(src), "-o", str(out), "--workers", "1", "--quiet"])
+    with pytest.raises(SystemExit) as exit_info:
+        lotes.main()
+    assert exit_info.value.code == 1
+    assert "roto.pdf" in capsys.readouterr().out
+    summary = json.loads((out / lotes.SUMMARY_NAME).read_text())
+    assert summary["failed"] == 1 and summary["failures"][0]["input"] == "roto.pdf"
+
+    os.remove(src / "roto.pdf")
+    with pytest.raises(SystemExit) as exit_info:
+        lotes.main()
+    assert exit_info.value.code == 0
+
+
+def test_inputs_with_the_same_output_name_do_not_overwrite(tmp_path, monkeypatch):
+    from PIL import Image
+    monkeypatch.setattr(RENDER_CACHE, "max_bytes", RENDER_CACHE.max_bytes)
+    src, out = tmp_path / "img", tmp_path / "out"
+    src.mkdir()
+    Image.new("RGB", (8, 8), "red").save(src / "photo.png")
+    Image.new("RGB", (8, 8), "blue").save(src / "photo.jpeg")
+    summary = lotes.run_batch("convert", [str(src)], str(out), {"format": "JPG", "quality": 90}, workers=1)
+    assert summary["processed"] == 2
+    assert sorted(p.name for p in out.iterdir() if p.suffix == ".jpg") == ["photo.jpg", "photo_2.jpg"]
+    # Misma asignación en la siguiente ejecución: todo al día.
+    again = lotes.run_batch("convert", [str(src)], str(out), {"format": "JPG", "quality": 90}, workers=1)
+    assert again["skipped"] == 2
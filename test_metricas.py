@@ -0,0 +1,22 @@
+# test_metricas.py — Pruebas de las trazas por etapa (python -m pytest)
+import tracemalloc
+
+from metricas import stage, trace
+
+
+def test_stages_are_recorded_in_the_active_trace():
+    with trace("op") as tr:
+        with stage("render", pages=2):
+            pass
+    assert [(s.stage, s.pages) for s in tr.spans] == [("render", 2)]
+
+
+def test_overlapping_memory_traces_do_not_stop_each_other():
+    with trace("outer", memory=True) as outer:
+        with trace("inner", memory=True) as inner:
+            data = bytearray(1 << 20)
+        assert tracemalloc.is_tracing()
+        del data
+    assert inner.memory_peak is None
+    assert outer.memory_peak >= 1 << 20
+    assert not tracemalloc.is_tracing()
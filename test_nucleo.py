@@ -0,0 +1,102 @@
+# test_nucleo.py — Pruebas del núcleo de procesado (python -m pytest)
+import io
+import random
+
+import fitz  # PyMuPDF
+import pytest
+from PIL import Image
+
+import nucleo
+from trabajos import JobCancelled
+
+
+def _scan_jpeg(seed: int = 0) -> bytes:
+    rnd = random.Random(seed)
+    img = Image.frombytes("RGB", (100, 140), bytes(rnd.randrange(256) for _ in range(100 * 140 * 3)))
+    img = img.resize((400, 560))
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+
+def _scanned_pdf(pages: int, annots=None, distinct: bool = False) -> bytes:
+    """Páginas "escaneadas" (una imagen a página completa); con distinct=False todas iguales."""
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=400, height=560)
+        page.insert_image(page.rect, stream=_scan_jpeg(i if distinct else 0))
+        if annots:
+            page.add_freetext_annot(fitz.Rect(20, 20, 300, 60), annots[i], fontsize=14)
+    return doc.tobytes(garbage=3, deflate=True)
+
+
+def _compress(data: bytes, **kwargs):
+    return nucleo.pdf_compress.__wrapped__(data, dpi=72, quality=70, **kwargs)
+
+
+def test_duplicate_pages_share_image():
+    out, report = _compress(_scanned_pdf(3))
+    assert [r["strategy"] for r in report] == ["raster"] * 3
+    assert [r["duplicate_of"] for r in report] == [None, 1, 1]
+    with fitz.open(stream=out, filetype="pdf") as doc:
+        xrefs = {doc[i].get_images()[0][0] for i in range(doc.page_count)}
+    assert len(xrefs) == 1
+
+
+def test_pages_differing_only_in_annotation_are_not_duplicates():
+    out, report = _compress(_scanned_pdf(2, annots=["INVOICE #1000", "INVOICE #1001"]))
+    assert [r["duplicate_of"] for r in report] == [None, None]
+    with fitz.open(stream=out, filetype="pdf") as doc:
+        assert doc[0].get_images()[0][0] != doc[1].get_images()[0][0]
+
+
+@pytest.mark.parametrize("pages", [[1], [0, 2], [2, 0]])
+def test_page_ranges_select_pages(pages):
+    out, report = _compress(_scanned_pdf(3, distinct=True), pages=pages)
+    assert [r["page"] for r in report] == [p + 1 for p in pages]
+    with fitz.open(stream=out, filetype="pdf") as doc:
+        assert doc.page_count == len(pages)
+
+
+def test_cancelled_compress_closes_document(monkeypatch):
+    opened = []
+
+    def spy_open(pdf):
+        doc = fitz.open(stream=pdf, filetype="pdf")
+        opened.append(doc)
+        return doc
+
+    def cancel(done, total):
+        raise JobCancelled()
+
+    monkeypatch.setattr(nucleo, "open_pdf", spy_open)
+    with pytest.raises(JobCancelled):
+        nucleo.compress_pdf(_scanned_pdf(2, distinct=True), 50, progress=cancel)
+    with pytest.raises(JobCancelled):
+        _compress(_scanned_pdf(2, distinct=True), progress=cancel)
+    assert len(opened) == 2 and all(doc.is_closed for doc in opened)
+
+
+def test_pdf_compress_closes_document(monkeypatch):
+    opened = []
+
+    def spy_open(pdf):
+        doc = fitz.open(stream=pdf, filetype="pdf")
+        opened.append(doc)
+        return doc
+
+    monkeypatch.setattr(nucleo, "open_pdf", spy_open)
+    _compress(_scanned_pdf(2, distinct=True))
+    assert opened and opened[0].is_closed
+
+
+def test_plan_predicts_compress_pdf_size():
+    data = _scanned_pdf(3, distinct=True)
+    plan = nucleo.compress_plan.__wrapped__(data)
+    for q in (10, 55):
+        out, _ = nucleo.compress_pdf.__wrapped__(data, q)
+        assert abs(plan.estimate(q)[0] - len(out)) <= 0.1 * len(out)
+    target = (len(data) * 2) // 3
+    q = plan.auto_quality(target)
+    assert q is not None
+    assert len(nucleo.compress_pdf.__wrapped__(data, q)[0]) <= target * 1.05
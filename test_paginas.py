@@ -0,0 +1,45 @@
+# test_paginas.py — Pruebas de rangos de páginas y de la unión de PDFs (python -m pytest)
+import fitz  # PyMuPDF
+import pytest
+
+from paginas import MergeStream, parse_ranges, split_groups
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("1-3,6,9-", [0, 1, 2, 5, 8, 9]),
+    ("-2", [0, 1]),
+    ("8-", [7, 8, 9]),
+    (" 2 , 1 ", [0, 1]),
+    ("3,1-3", [0, 1, 2]),
+    ("0,11,5-20", [4, 5, 6, 7, 8, 9]),
+    ("", []),
+])
+def test_parse_ranges(spec, expected):
+    assert parse_ranges(spec, 10) == expected
+
+
+def test_parse_ranges_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_ranges("uno", 10)
+
+
+def test_split_groups_one_group_per_output():
+    assert split_groups("1-3;4-", 5) == [[0, 1, 2], [3, 4]]
+    assert split_groups("2;;9-;1", 5) == [[1], [0]]
+
+
+def _pdf_with_outline(pages: int, toc: list) -> bytes:
+    doc = fitz.open()
+    for _ in range(pages):
+        doc.new_page(width=100, height=100)
+    doc.set_toc(toc)
+    return doc.tobytes()
+
+
+def test_merge_shifts_each_outline_to_its_final_pages():
+    merger = MergeStream()
+    merger.add(_pdf_with_outline(2, [[1, "A", 1], [2, "A.1", 2]]))
+    merger.add(_pdf_with_outline(3, [[1, "B", 1], [1, "C", 3]]))
+    with fitz.open(stream=merger.finish(), filetype="pdf") as doc:
+        assert doc.page_count == 5
+        assert doc.get_toc(simple=True) == [[1, "A", 1], [2, "A.1", 2], [1, "B", 3], [1, "C", 5]]
@@ -0,0 +1,101 @@
+# test_trabajos.py — Pruebas de la cola de trabajos (python -m pytest)
+import threading
+import time
+
+from trabajos import CANCELLED, DONE, FINISHED, JobQueue
+
+
+def _wait(queue: JobQueue, job_id: str, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job is not None and job.status in FINISHED:
+            return job
+        time.sleep(0.01)
+    raise AssertionError("el trabajo no terminó")
+
+
+def _blocker(gate: threading.Event, progress=None):
+    gate.wait(5)
+    return "gate"
+
+
+def test_cancel_queued_job_never_runs():
+    queue = JobQueue(1, 60)
+    gate = threading.Event()
+    ran, finished = [], []
+    blocker = queue.submit("a", _blocker, gate)
+    queued = queue.submit("a", lambda progress=None: ran.append(1), on_finish=lambda: finished.append(1))
+    queue.cancel(queued)
+    assert queue.get(queued).status == CANCELLED
+    assert finished == [1]
+    gate.set()
+    _wait(queue, blocker)
+    assert ran == [] and finished == [1]
+
+
+def test_cancel_running_job_stops_at_next_progress():
+    queue = JobQueue(1, 60)
+    started = threading.Event()
+
+    def endless(progress=None):
+        n = 0
+        while True:
+            n += 1
+            progress(n, 0)
+            started.set()
+            time.sleep(0.005)
+
+    job_id = queue.submit("a", endless)
+    assert started.wait(5)
+    queue.cancel(job_id)
+    assert _wait(queue, job_id).status == CANCELLED
+
+
+def test_owners_take_turns():
+    queue = JobQueue(1, 60)
+    gate = threading.Event()
+    order = []
+
+    def record(name, progress=None):
+        order.append(name)
+
+    blocker = queue.submit("gate", _blocker, gate)
+    ids = [queue.submit("a", record, name) for name in ("a1", "a2", "a3")]
+    ids.append(queue.submit("b", record, "b1"))
+    gate.set()
+    for job_id in [blocker] + ids:
+        assert _wait(queue, job_id).status == DONE
+    assert order == ["a1", "b1", "a2", "a3"]
+
+
+def test_finished_jobs_expire_after_ttl():
+    queue = JobQueue(1, 0)
+    first = queue.submit("a", lambda progress=None: 1)
+    _wait(queue, first)
+    time.sleep(0.01)
+    second = queue.submit("a", lambda progress=None: 2)
+    assert queue.get(first) is None
+    assert _wait(queue, second).result == 2
+
+
+def test_on_finish_runs_once_after_the_job():
+    queue = JobQueue(1, 60)
+    calls = []
+    job_id = queue.submit("a", lambda progress=None: calls.append("job"), on_finish=lambda: calls.append("done"))
+    _wait(queue, job_id)
+    queue.forget(job_id)
+    assert calls == ["job", "done"]
+
+
+def test_finished_status_waits_for_on_finish():
+    queue = JobQueue(1, 60)
+    released = []
+
+    def release():
+        time.sleep(0.2)  # p.ej. soltar los temporales de la sesión
+        released.append(1)
+
+    job_id = queue.submit("a", lambda progress=None: None, on_finish=release)
+    _wait(queue, job_id)
+    assert released == [1]
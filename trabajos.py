@@ -0,0 +1,194 @@
+# trabajos.py — Cola de trabajos en segundo plano (compartida por todas las sesiones)
+#
+# La interfaz encola el trabajo y recibe un id; unos hilos worker lo ejecutan
+# fuera del hilo del script de Streamlit, así un rerun (mover un slider,
+# cambiar de idioma) no pierde el trabajo: la sesión vuelve a consultar por id.
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from metricas import add_gauges
+
+# ============== Configuración ==============
+# Trabajos ejecutándose a la vez en el proceso (el resto espera en cola). Pocos:
+# un trabajo de rasterizado ya reparte sus páginas entre procesos (ver job_cpu_share).
+JOB_WORKERS = int(os.environ.get("PRINTPDF_JOB_WORKERS", min(2, os.cpu_count() or 1)))
+# Segundos que se guarda un resultado no descargado antes de descartarlo.
+JOB_TTL = int(os.environ.get("PRINTPDF_JOB_TTL", "900"))
+
+QUEUED, RUNNING, DONE, ERROR, CANCELLED = "queued", "running", "done", "error", "cancelled"
+FINISHED = (DONE, ERROR, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """La lanza el callback de progreso cuando se ha pedido cancelar."""
+
+
+class Job:
+    """Estado de un trabajo. Sólo lo modifica el worker que lo ejecuta."""
+
+    def __init__(self, owner: str, fn: Callable, args: tuple, kwargs: Dict[str, Any],
+                 on_finish: Optional[Callable[[], None]] = None):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.status = QUEUED
+        self.done = 0
+        self.total = 0
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._cancel = threading.Event()
+        self._on_finish = on_finish
+
+    def _finish(self, status: str) -> None:
+        """Cierra el trabajo: suelta la entrada, avisa (una vez) a on_finish y
+        fija el estado final el último, así quien lo vea terminado ya puede
+        contar con que on_finish se ha llamado."""
+        self.finished = time.time()
+        self.fn = self.args = self.kwargs = None  # soltar la entrada cuanto antes
+        on_finish, self._on_finish = self._on_finish, None
+        if on_finish is not None:
+            on_finish()
+        self.status = status
+
+    def progress(self, done: int, total: int) -> None:
+        """Callback para el trabajo (p.ej. una vez por página). Es también
+        el punto de cancelación: si se pidió cancelar, corta aquí."""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.done, self.total = done, total
+
+    @property
+    def fraction(self) -> float:
+        return min(1.0, self.done / self.total) if self.total else 0.0
+
+    @property
+    def seconds(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+
+class JobQueue:
+    """
+    Cola con reparto justo: cada propietario (sesión) tiene su propia fila y
+    los workers las atienden por turnos, así un usuario que encola diez PDFs
+    no deja esperando al siguiente. Los resultados se guardan por id hasta
+    que la sesión los sustituye por otro trabajo (forget) o caducan a los
+    `ttl` segundos; descargarlos no los descarta.
+    """
+
+    def __init__(self, workers: int, ttl: float):
+        self.workers = max(1, workers)
+        self.ttl = ttl
+        self._jobs: Dict[str, Job] = {}
+        self._lanes: "OrderedDict[str, Deque[Job]]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._threads: list = []
+
+    # ---------- workers ----------
+    def _start(self) -> None:
+        # Hilos daemon creados al primer submit: importar el módulo no arranca nada.
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._loop, name=f"printpdf-job-{len(self._threads)}", daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    def _next(self) -> Job:
+        """Siguiente trabajo por turnos entre propietarios (llamar con el lock)."""
+        while True:
+            if not self._lanes:
+                self._cond.wait()
+                continue
+            owner, lane = self._lanes.popitem(last=False)
+            job = lane.popleft()
+            if lane:
+                self._lanes[owner] = lane  # vuelve al final del turno
+            if job.status == QUEUED:
+                return job
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next()
+                job.status = RUNNING
+                job.started = time.time()
+            try:
+                job.result = job.fn(*job.args, progress=job.progress, **job.kwargs)
+                status = DONE
+            except JobCancelled:
+                status = CANCELLED
+            except Exception:
+                job.error = traceback.format_exc()
+                status = ERROR
+            job._finish(status)
+
+    # ---------- API ----------
+    def submit(self, owner: str, fn: Callable, *args, on_finish: Optional[Callable[[], None]] = None, **kwargs) -> str:
+        """
+        Encola fn(*args, progress=callback, **kwargs) y devuelve el id.
+        `fn` debe aceptar `progress(done, total)` y llamarlo con frecuencia.
+        on_finish() se llama una vez al terminar el trabajo, también si se
+        cancela antes de empezar (p.ej. para soltar los temporales que usa,
+        ver ficheros.SessionFiles.pin).
+        """
+        job = Job(owner, fn, args, kwargs, on_finish)
+        with self._cond:
+            self._expire()
+            self._jobs[job.id] = job
+            self._lanes.setdefault(owner, deque()).append(job)
+            self._start()
+            self._cond.notify()
+        return job.id
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id) if job_id else None
+
+    def cancel(self, job_id: str) -> None:
+        """Un trabajo en cola no llega a empezar; uno en marcha para en su
+        siguiente llamada a progress()."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return
+            job._cancel.set()
+            if job.status == QUEUED:
+                job._finish(CANCELLED)
+
+    def forget(self, job_id: str) -> None:
+        """Descarta el trabajo y su resultado (p.ej. al encolar otro que lo sustituye)."""
+        self.cancel(job_id)
+        with self._cond:
+            self._jobs.pop(job_id, None)
+
+    def _expire(self) -> None:
+        now = time.time()
+        for job_id in [j.id for j in self._jobs.values() if j.finished and now - j.finished > self.ttl]:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            counts = {s: 0 for s in (QUEUED, RUNNING) + FINISHED}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
+
+
+def job_cpu_share(processes: int) -> int:
+    """Procesos que puede usar cada trabajo para que los JOB_WORKERS trabajos
+    simultáneos no pidan, entre todos, más de `processes`."""
+    return max(1, processes // max(1, JOB_WORKERS))
+
+
+JOBS = JobQueue(JOB_WORKERS, JOB_TTL)
+add_gauges("printpdf_jobs", JOBS.stats)